@@ -1,79 +1,159 @@
 import os
 import json
-import traceback
-import google.generativeai as genai
+import time
+import threading
 from dotenv import load_dotenv
 
+from prompt_encoder import encode_plans, FORMAT_DESCRIPTION, DEFAULT_TOKEN_BUDGET
+from ranker import local_recommendation
+import resilience
+from resilience import ResilientCaller, CircuitBreaker, CircuitOpenError, is_retryable_error, is_quota_error
+import stages
+import metrics
+from logs import get_logger, fields, log_payload
+from stream_parser import RankedPlansStreamParser, clean_model_output
+
+logger = get_logger("agent")
+
 # Load environment variables (specifically the API key)
 load_dotenv()
-google_api_key = os.getenv("GOOGLE_API_KEY")
 
-# --- Configure Gemini API ---
-if google_api_key:
-    try:
-        genai.configure(api_key=google_api_key)
-        # Select the Gemini model
-        GEMINI_MODEL = genai.GenerativeModel("gemini-1.5-flash-latest")
-        print("Gemini API configured successfully.")
-    except Exception as e:
-        print(f"Error configuring Gemini API: {e}")
-        GEMINI_MODEL = None # Ensure model is None if config fails
-else:
-    print("Error: GOOGLE_API_KEY environment variable not set. AI Agent will not function.")
-    GEMINI_MODEL = None
+DEFAULT_GEMINI_MODEL_NAME = "gemini-1.5-flash-latest"
 
-def decisionAgent(user_profile: dict, plans_data: list):
+# --- Configure Gemini API ---
+# The model is configured on first use, not at import: importing the SDK alone
+# takes most of a second, which every cold start would otherwise pay before
+# serving requests that never reach the LLM. Benchmarks and tests may assign a
+# stand-in to GEMINI_MODEL directly.
+GEMINI_MODEL = None
+_model_initialized = False
+_model_lock = threading.Lock()
+
+def get_model():
+    """Returns the Gemini model, configuring it on first call. None if it is unavailable."""
+    global GEMINI_MODEL, _model_initialized
+    if GEMINI_MODEL is not None or _model_initialized:
+        return GEMINI_MODEL
+    with _model_lock:
+        if GEMINI_MODEL is None and not _model_initialized:
+            google_api_key = os.getenv("GOOGLE_API_KEY")
+            if google_api_key:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=google_api_key)
+                    # Select the Gemini model
+                    GEMINI_MODEL = genai.GenerativeModel(os.getenv("GEMINI_MODEL_NAME", DEFAULT_GEMINI_MODEL_NAME))
+                    logger.info("Gemini API configured successfully.")
+                except Exception as e:
+                    logger.error(f"Error configuring Gemini API: {e}")
+            else:
+                logger.error("GOOGLE_API_KEY environment variable not set. AI Agent will not function.")
+            _model_initialized = True
+    return GEMINI_MODEL
+
+# Set safety_settings to allow potentially sensitive content if needed, e.g., financial info
+# Be mindful of safety implications. Adjust categories and thresholds as necessary.
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
+]
+
+REQUIRED_PLAN_KEYS = ["planId", "rank", "isBestPlan", "justification"]
+
+# --- LLM Call Resilience ---
+# Deadline, retries, optional hedging and a circuit breaker around generate_content
+llm_caller = ResilientCaller(
+    deadline_seconds=float(os.getenv("LLM_DEADLINE_SECONDS", resilience.DEFAULT_DEADLINE_SECONDS)),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", resilience.DEFAULT_MAX_RETRIES)),
+    backoff_seconds=float(os.getenv("LLM_BACKOFF_SECONDS", resilience.DEFAULT_BACKOFF_SECONDS)),
+    hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", resilience.DEFAULT_HEDGE_PERCENTILE)),
+    hedge_min_samples=int(os.getenv("LLM_HEDGE_MIN_SAMPLES", resilience.DEFAULT_HEDGE_MIN_SAMPLES)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", resilience.DEFAULT_FAILURE_THRESHOLD)),
+        reset_seconds=float(os.getenv("LLM_BREAKER_RESET_SECONDS", resilience.DEFAULT_RESET_SECONDS))
+    ),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", resilience.DEFAULT_MAX_CONCURRENCY))
+)
+# When Gemini still fails after retries, answer with the local ranking instead of
+# an error (the breaker being open always does). Set to 0 to return the error.
+LLM_FALLBACK_ON_ERROR = os.getenv("LLM_FALLBACK_ON_ERROR", "1").lower() not in ("0", "false", "no")
+
+def fallback_recommendation(user_profile: dict, plans_data: list, reason: str):
     """
-    Analyzes insurance plans based on user profile using Gemini AI.
-
-    Args:
-        user_profile: A dictionary containing user information
-                      (e.g., name, age, income, state, dependents, dentalPlanRequired).
-        plans_data: A list of dictionaries containing the filtered insurance plan data.
+    Ranks the candidate plans locally by estimated cost-sharing, for when Gemini
+    is unavailable. Same shape as a decisionAgent result, plus "fallback": true
+    and the reason, so callers (and the recommendation cache) can tell it apart.
+    """
+    metrics.LLM_FALLBACKS.inc(reason=reason)
+    result = local_recommendation(user_profile, plans_data, len(plans_data))
+    if "error" not in result:
+        result["fallback"] = True
+        result["fallback_reason"] = reason
+    return result
+
+def fallback_reason(error: Exception) -> str:
+    """The fallback reason recorded for an upstream error (see fallback_recommendation)."""
+    if isinstance(error, CircuitOpenError):
+        return "circuit_open"
+    if is_quota_error(error):
+        return "rate_limited"
+    return "timeout" if isinstance(error, TimeoutError) else "upstream_error"
+
+def _fallback_events(user_profile: dict, plans_data: list, reason: str):
+    analysis = fallback_recommendation(user_profile, plans_data, reason)
+    if "error" in analysis:
+        yield {"type": "error", "error": analysis["error"]}
+        return
+    for plan in analysis["ranked_plans"]:
+        yield {"type": "plan", "plan": plan}
+    yield {"type": "done", "analysis": analysis}
+
+def validate_ranked_plan(item, i: int):
+    """Returns an error message if a ranked_plans item is malformed, otherwise None."""
+    if not isinstance(item, dict):
+        logger.warning("Ranked plan item is not a dictionary.", extra=fields(index=i))
+        return f"Invalid item type in 'ranked_plans' at index {i}."
+    if not all(key in item for key in REQUIRED_PLAN_KEYS):
+        missing_keys = [key for key in REQUIRED_PLAN_KEYS if key not in item]
+        logger.warning("Ranked plan item is missing keys.", extra=fields(index=i, missing_keys=missing_keys))
+        return f"Ranked plan item at index {i} missing required keys: {missing_keys}."
+    if not isinstance(item.get("isBestPlan"), bool):
+        logger.warning("'isBestPlan' in ranked plan item is not a boolean.", extra=fields(index=i))
+        return f"'isBestPlan' field is not a boolean in ranked plan item at index {i}."
+    return None
+
+def encode_for_prompt(plans_data: list):
+    """
+    Encodes candidate plans for the prompt within PROMPT_TOKEN_BUDGET.
 
-    Returns:
-        A dictionary containing the AI's analysis (best plan ID, ranked list with justifications)
-        or an error dictionary.
+    Plans arrive grouped as {"PlanId", "IssuerId", "StandardComponentId", "benefits": [...]}
+    and best first, so packing whole plans up to the budget keeps the strongest candidates.
     """
-    if not GEMINI_MODEL:
-        return {"error": "Gemini AI Model is not configured. Check API Key."}
+    token_budget = int(os.getenv("PROMPT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+    encoded = encode_plans(plans_data, token_budget)
+    if encoded.dropped:
+        metrics.PROMPT_TRUNCATIONS.inc()
+        metrics.PROMPT_PLANS_DROPPED.inc(len(encoded.dropped))
+        logger.warning("Prompt token budget reached.", extra=fields(
+            token_budget=token_budget, plans_included=len(encoded.included), plans_dropped=len(encoded.dropped)))
+    return encoded
+
+def build_prompt(user_profile: dict, plans_data: list, encoded=None):
+    """
+    Builds the Gemini prompt for a user profile and its candidate plans.
+    Pass encoded (from encode_for_prompt) to reuse an encoding across profiles.
 
-    if not plans_data:
-        return {"error": "No plan data provided to the agent."}
+    Returns:
+        A (prompt, EncodedPlans) tuple; the EncodedPlans reports which plans fit.
 
+    Raises:
+        Exception: If the plan data cannot be serialized.
+    """
     # --- Prepare Data for Prompt ---
-    try:
-        # Filter and transform the plans data
-        relevant_fields = [
-            'PlanId', 'BenefitName', 'CopayInnTier1', 'CoinsInnTier1',
-            'IsCovered', 'QuantLimitOnSvc', 'LimitQty', 'LimitUnit', 'Explanation',
-            'IssuerId', 'StandardComponentId'
-        ]
-        
-        filtered_plans = []
-        for plan in plans_data:
-            filtered_plan = {}
-            for field in relevant_fields:
-                if field in plan:
-                    # Rename PlanId to planId for consistency
-                    if field == 'PlanId':
-                        filtered_plan['planId'] = plan[field]
-                    else:
-                        filtered_plan[field] = plan[field]
-            filtered_plans.append(filtered_plan)
-            
-        # Convert plans to JSON string with proper formatting
-        plans_json_str = json.dumps(filtered_plans, indent=2)
-
-        # Limit the size of the plans data sent to the model if necessary
-        max_chars = 15000 # Adjust based on model context window
-        if len(plans_json_str) > max_chars:
-             print(f"Warning: Plan data size ({len(plans_json_str)} chars) exceeds limit ({max_chars}). Truncating.")
-             plans_json_str = plans_json_str[:max_chars] + "\n... (data truncated)"
-
-    except Exception as e:
-        print(f"Error preparing plan data for prompt: {e}")
-        return {"error": f"Failed to process plan data for AI analysis: {e}"}
+    if encoded is None:
+        encoded = encode_for_prompt(plans_data)
 
     # --- Construct the Prompt ---
     user_name = user_profile.get('name', 'the user')
@@ -96,13 +176,14 @@ def decisionAgent(user_profile: dict, plans_data: list):
     * Requires Dental Coverage: {user_dental}
 
     **Available Insurance Plans (filtered for the user's state and dental preference):**
-    ```json
-    {plans_json_str}
+    {FORMAT_DESCRIPTION}
+    ```
+    {encoded.text}
     ```
 
     **Your Task:**
 
-    Analyze the provided insurance plans based *only* on the user's profile and the details given in the JSON above. Consider factors like coverage, cost-sharing, limitations, and overall suitability.
+    Analyze the provided insurance plans based *only* on the user's profile and the details given in the plan table above. Consider factors like coverage, cost-sharing, limitations, and overall suitability.
 
     **Output Requirements:**
 
@@ -116,7 +197,7 @@ def decisionAgent(user_profile: dict, plans_data: list):
                 "planId": "...", // Use camelCase
                 "rank": 1,
                 "isBestPlan": true, // Add this boolean field
-                "justification": "Concise explanation (3-5 sentences) why this plan is ranked here, referencing specific user needs and plan details (e.g., costs, coverage, limits) from the provided JSON data."
+                "justification": "Concise explanation (3-5 sentences) why this plan is ranked here, referencing specific user needs and plan details (e.g., costs, coverage, limits) from the provided plan table."
             }},
             {{
                 "planId": "...", // Use camelCase
@@ -125,7 +206,7 @@ def decisionAgent(user_profile: dict, plans_data: list):
                 "justification": "Concise explanation (3-5 sentences)..."
             }}
             // Include rankings for up to the top 5-10 most suitable plans found in the data.
-            // Only include plans mentioned in the input JSON data. Ensure all ranked plans have the "isBestPlan" field.
+            // Only include plans listed in the input plan table. Ensure all ranked plans have the "isBestPlan" field.
         ]
     }}
     ```
@@ -133,86 +214,127 @@ def decisionAgent(user_profile: dict, plans_data: list):
     **Instructions:**
     * Identify the single best plan and put its 'planId' in `best_plan_id`.
     * Create a ranked list (`ranked_plans`) starting with the best plan (rank 1). Include the Plan ID (`planId` - camelCase), the rank number (`rank`), the boolean `isBestPlan` field, and a `justification`.
-    * Base your justifications *only* on the provided user profile and plan data JSON. Explain why the chosen plan is the best in terms of the benefits provided both medically and in an cost effective manner. Be specific.
-    * Ensure the `planId` values exactly match those in the input JSON data.
+    * Base your justifications *only* on the provided user profile and plan table. Explain why the chosen plan is the best in terms of the benefits provided both medically and in an cost effective manner. Be specific.
+    * Ensure the `planId` values exactly match those in the input plan table.
     """
+    return prompt, encoded
 
-    # --- Call Gemini API ---
-    print("Sending request to Gemini API...")
+def decisionAgent(user_profile: dict, plans_data: list, encoded=None, fallback_on_error: bool = None):
+    """
+    Analyzes insurance plans based on user profile using Gemini AI.
+
+    Args:
+        user_profile: A dictionary containing user information
+                      (e.g., name, age, income, state, dependents, dentalPlanRequired).
+        plans_data: A list of plan documents, each with its benefit rows grouped
+                    under a "benefits" key (see queries.plan_summary_pipeline).
+        encoded: Optional precomputed encoding of plans_data (see encode_for_prompt).
+        fallback_on_error: Whether an upstream error that outlasts the retries, or an open
+                           circuit breaker, returns the local fallback ranking (default
+                           LLM_FALLBACK_ON_ERROR). With False, CircuitOpenError and retryable
+                           upstream errors (e.g. quota errors) are raised; batch callers pass
+                           False to handle quota errors and the breaker themselves.
+
+    Returns:
+        A dictionary containing the AI's analysis (best plan ID, ranked list with justifications)
+        or an error dictionary.
+    """
+    model = get_model()
+    if not model:
+        metrics.LLM_ERRORS.inc(reason="not_configured")
+        return {"error": "Gemini AI Model is not configured. Check API Key."}
+
+    if not plans_data:
+        return {"error": "No plan data provided to the agent."}
+
+    # --- Prepare Data and Construct the Prompt ---
     try:
-        # Set safety_settings to allow potentially sensitive content if needed, e.g., financial info
-        # Be mindful of safety implications. Adjust categories and thresholds as necessary.
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_MEDIUM_AND_ABOVE"},
-        ]
-        response = GEMINI_MODEL.generate_content(prompt, safety_settings=safety_settings)
+        with stages.stage(stages.PROMPT_BUILD):
+            prompt, encoded = build_prompt(user_profile, plans_data, encoded)
+    except Exception as e:
+        logger.error(f"Error preparing plan data for prompt: {e}")
+        return {"error": f"Failed to process plan data for AI analysis: {e}"}
 
+    # --- Call Gemini API ---
+    logger.debug("Sending request to Gemini API...")
+    try:
+        with stages.stage(stages.LLM):
+            response = llm_caller.call(lambda: model.generate_content(prompt, safety_settings=SAFETY_SETTINGS))
 
         # --- Process Response ---
         if not response.candidates or not response.candidates[0].content.parts:
              # Check for safety blocks
              if response.prompt_feedback.block_reason:
-                  print(f"Error: Gemini request blocked due to {response.prompt_feedback.block_reason}")
-                  print(f"Safety Ratings: {response.prompt_feedback.safety_ratings}")
+                  metrics.LLM_SAFETY_BLOCKS.inc()
+                  metrics.LLM_ERRORS.inc(reason="safety_block")
+                  logger.error("Gemini request blocked by safety settings.", extra=fields(
+                      block_reason=response.prompt_feedback.block_reason,
+                      safety_ratings=response.prompt_feedback.safety_ratings))
                   return {"error": f"AI request blocked due to safety settings ({response.prompt_feedback.block_reason})."}
              else:
-                  print("Error: Gemini response is empty or malformed.")
-                  print(f"Full Response: {response}")
+                  metrics.LLM_ERRORS.inc(reason="empty_response")
+                  logger.error("Gemini response is empty or malformed.")
+                  log_payload(logger, "Empty Gemini response", str(response))
                   return {"error": "Received an empty or invalid response from the AI model."}
 
 
         raw_text = response.text
-        print(f"Raw Gemini Output:\n---\n{raw_text}\n---") # Log the raw output
+        log_payload(logger, "Raw Gemini output", raw_text) # Sampled; see logs.log_payload
 
         # Attempt to parse the JSON response
-        try:
-            # Clean potential markdown code fences
-            cleaned_text = raw_text.strip().removeprefix("```json").removesuffix("```").strip()
-            json_output = json.loads(cleaned_text)
-
-            # --- Validate JSON Structure ---
-            required_top_keys = ["best_plan_id", "ranked_plans"]
-            if not all(key in json_output for key in required_top_keys):
-                print(f"Error: Gemini output is missing required top-level JSON keys: {required_top_keys}.")
-                return {"error": "AI response missing required structure.", "raw_output": raw_text}
-
-            if not isinstance(json_output["ranked_plans"], list):
-                 print("Error: 'ranked_plans' key in Gemini output is not a list.")
-                 return {"error": "AI response 'ranked_plans' is not a list.", "raw_output": raw_text}
-
-            # Validate structure of items within ranked_plans
-            required_plan_keys = ["planId", "rank", "isBestPlan", "justification"]
-            for i, item in enumerate(json_output["ranked_plans"]):
-                if not isinstance(item, dict):
-                    print(f"Error: Item at index {i} in 'ranked_plans' is not a dictionary.")
-                    return {"error": f"Invalid item type in 'ranked_plans' at index {i}.", "raw_output": raw_text}
-                if not all(key in item for key in required_plan_keys):
-                     missing_keys = [key for key in required_plan_keys if key not in item]
-                     print(f"Warning: Ranked plan item at index {i} missing keys: {missing_keys}. Item: {item}")
-                     # Return error if structure is critical
-                     return {"error": f"Ranked plan item at index {i} missing required keys: {missing_keys}.", "raw_output": raw_text}
-                if not isinstance(item.get("isBestPlan"), bool):
-                    print(f"Warning: 'isBestPlan' in item at index {i} is not a boolean. Item: {item}")
-                    # Return error or attempt to coerce/default
-                    return {"error": f"'isBestPlan' field is not a boolean in ranked plan item at index {i}.", "raw_output": raw_text}
-
-
-            print("Successfully parsed and validated JSON response from Gemini.")
-            return json_output # Return the validated and parsed JSON
-
-        except json.JSONDecodeError as json_err:
-            print(f"Error: Failed to decode Gemini response as JSON: {json_err}")
-            print(f"Problematic Text: {raw_text}") # Log the text that failed parsing
-            # Return the raw text along with the error message
-            return {"error": "AI response was not valid JSON.", "raw_output": raw_text}
+        with stages.stage(stages.PARSE_VALIDATE):
+            try:
+                # Clean potential markdown code fences
+                cleaned_text = clean_model_output(raw_text)
+                json_output = json.loads(cleaned_text)
+
+                # --- Validate JSON Structure ---
+                required_top_keys = ["best_plan_id", "ranked_plans"]
+                if not all(key in json_output for key in required_top_keys):
+                    metrics.LLM_ERRORS.inc(reason="invalid_structure")
+                    logger.error("Gemini output is missing required top-level JSON keys.",
+                                 extra=fields(required_keys=required_top_keys))
+                    return {"error": "AI response missing required structure.", "raw_output": raw_text}
+
+                if not isinstance(json_output["ranked_plans"], list):
+                     metrics.LLM_ERRORS.inc(reason="invalid_structure")
+                     logger.error("'ranked_plans' key in Gemini output is not a list.")
+                     return {"error": "AI response 'ranked_plans' is not a list.", "raw_output": raw_text}
+
+                # Validate structure of items within ranked_plans
+                for i, item in enumerate(json_output["ranked_plans"]):
+                    item_error = validate_ranked_plan(item, i)
+                    if item_error:
+                        metrics.LLM_ERRORS.inc(reason="invalid_structure")
+                        return {"error": item_error, "raw_output": raw_text}
+
+
+                logger.debug("Successfully parsed and validated JSON response from Gemini.")
+                json_output["prompt_stats"] = encoded.stats()
+                return json_output # Return the validated and parsed JSON
+
+            except json.JSONDecodeError as json_err:
+                metrics.LLM_ERRORS.inc(reason="invalid_json")
+                logger.error(f"Failed to decode Gemini response as JSON: {json_err}")
+                log_payload(logger, "Unparseable Gemini output", raw_text)
+                # Return the raw text along with the error message
+                return {"error": "AI response was not valid JSON.", "raw_output": raw_text}
+
+    except CircuitOpenError:
+        if fallback_on_error is False:
+            raise
+        logger.warning("LLM circuit breaker is open. Answering with the local ranking.")
+        return fallback_recommendation(user_profile, plans_data, "circuit_open")
 
     except Exception as e:
         # Catch potential errors from the API call itself (e.g., network issues, permission errors)
-        print(f"Error during Gemini API call or processing: {e}")
-        print(traceback.format_exc())
+        metrics.LLM_ERRORS.inc(reason="api_error")
+        logger.exception(f"Error during Gemini API call or processing: {e}")
+        if is_retryable_error(e):
+            if fallback_on_error is False:
+                raise
+            if fallback_on_error or (fallback_on_error is None and LLM_FALLBACK_ON_ERROR):
+                return fallback_recommendation(user_profile, plans_data, fallback_reason(e))
         # Check if it's a specific Google API error
         if hasattr(e, 'message'):
             error_message = e.message
@@ -220,3 +342,111 @@ def decisionAgent(user_profile: dict, plans_data: list):
             error_message = str(e)
         return {"error": f"An unexpected error occurred during AI analysis: {error_message}"}
 
+def stream_ranked_plans(user_profile: dict, plans_data: list):
+    """
+    Streams the Gemini analysis, yielding each ranked plan as soon as it is complete.
+
+    Args:
+        user_profile: Same as decisionAgent.
+        plans_data: Same as decisionAgent.
+
+    Yields:
+        Event dictionaries:
+        {"type": "plan", "plan": {...}} for every validated ranked_plans item,
+        then {"type": "done", "analysis": {...}} with the full analysis,
+        or {"type": "error", "error": "..."} after which the stream ends.
+        While the LLM circuit breaker is open, or if Gemini fails or misses the
+        LLM deadline before the first plan, the local fallback ranking is streamed
+        in the same format.
+    """
+    model = get_model()
+    if not model:
+        metrics.LLM_ERRORS.inc(reason="not_configured")
+        yield {"type": "error", "error": "Gemini AI Model is not configured. Check API Key."}
+        return
+    if not plans_data:
+        yield {"type": "error", "error": "No plan data provided to the agent."}
+        return
+
+    try:
+        with stages.stage(stages.PROMPT_BUILD):
+            prompt, encoded = build_prompt(user_profile, plans_data)
+    except Exception as e:
+        logger.error(f"Error preparing plan data for prompt: {e}")
+        yield {"type": "error", "error": f"Failed to process plan data for AI analysis: {e}"}
+        return
+
+    if not llm_caller.breaker.allow():
+        logger.warning("LLM circuit breaker is open. Streaming the local ranking.")
+        yield from _fallback_events(user_profile, plans_data, "circuit_open")
+        return
+
+    logger.debug("Sending streaming request to Gemini API...")
+    parser = RankedPlansStreamParser()
+    ranked_plans = []
+    responded = False
+    llm_started = time.perf_counter()
+    try:
+        # Read through llm_caller so streams share its deadline and concurrency cap
+        chunks = llm_caller.stream(
+            lambda: model.generate_content(prompt, safety_settings=SAFETY_SETTINGS, stream=True))
+        for chunk in chunks:
+            if not responded:
+                # The upstream is answering; later problems are about the content
+                responded = True
+                llm_caller.breaker.record_success()
+            try:
+                text = chunk.text
+            except ValueError:
+                # .text raises when the chunk has no parts, e.g. after a safety block
+                block_reason = getattr(chunk.prompt_feedback, 'block_reason', None)
+                if block_reason:
+                    metrics.LLM_SAFETY_BLOCKS.inc()
+                    metrics.LLM_ERRORS.inc(reason="safety_block")
+                    logger.error("Gemini request blocked by safety settings.", extra=fields(block_reason=block_reason))
+                    yield {"type": "error", "error": f"AI request blocked due to safety settings ({block_reason})."}
+                    return
+                continue
+
+            for i, item in parser.feed(text):
+                item_error = validate_ranked_plan(item, i)
+                if item_error:
+                    metrics.LLM_ERRORS.inc(reason="invalid_structure")
+                    yield {"type": "error", "error": item_error}
+                    return
+                ranked_plans.append(item)
+                yield {"type": "plan", "plan": item}
+
+    except Exception as e:
+        metrics.LLM_ERRORS.inc(reason="api_error")
+        logger.exception(f"Error during streaming Gemini API call: {e}")
+        retryable = is_retryable_error(e)
+        if retryable and not is_quota_error(e):
+            llm_caller.breaker.record_failure()
+        if retryable and LLM_FALLBACK_ON_ERROR and not ranked_plans:
+            yield from _fallback_events(user_profile, plans_data, fallback_reason(e))
+            return
+        error_message = e.message if hasattr(e, 'message') else str(e)
+        yield {"type": "error", "error": f"An unexpected error occurred during AI analysis: {error_message}"}
+        return
+    # Includes the time the client spent consuming plan events
+    stages.record(stages.LLM, time.perf_counter() - llm_started)
+
+    if not parser.array_closed:
+        metrics.LLM_ERRORS.inc(reason="incomplete_stream")
+        yield {"type": "error", "error": "AI response ended before 'ranked_plans' was complete."}
+        return
+
+    # The plans were already validated one by one; the full parse only supplies best_plan_id
+    try:
+        best_plan_id = parser.result().get("best_plan_id")
+    except (ValueError, AttributeError):
+        best_plan_id = None
+    if not best_plan_id:
+        best_plan_id = next((item["planId"] for item in ranked_plans if item.get("isBestPlan")), None)
+    logger.info("Streamed ranked plans from Gemini.", extra=fields(plans=len(ranked_plans)))
+    yield {"type": "done", "analysis": {
+        "best_plan_id": best_plan_id,
+        "ranked_plans": ranked_plans,
+        "prompt_stats": encoded.stats()
+    }}
@@ -0,0 +1,183 @@
+# --- Data Access ---
+# The handlers in api/index.py read benefit rows, plan summaries and eligibility
+# rows through a data store, so the storage backend can be swapped. MongoDataStore
+# queries the collections loaded by api/ingest.py; SnapshotDataStore reads the
+# memory-mapped columnar snapshot built by api/snapshot.py, with no network.
+# DATA_BACKEND selects one: "mongo" (default) or "snapshot" (with SNAPSHOT_PATH).
+#
+# Both backends take the MongoDB-style queries built by filters.compile_filters
+# and queries.keyset_query, and return rows in queries.PAGE_SORT order.
+import os
+import json
+import threading
+
+import numpy as np
+from bson import json_util
+
+import mongo
+from queries import plan_summary_pipeline, stored_summary_pipeline, PAGE_SORT, PLAN_FIELDS, BENEFIT_FIELDS
+from filters import explain_summary, filter_shape, recommended_index
+from logs import get_logger, fields
+
+logger = get_logger("datastore")
+
+DEFAULT_BACKEND = "mongo"
+
+
+class MongoDataStore:
+    """Reads from the MongoDB collections written by api/ingest.py."""
+
+    name = "mongodb"
+
+    def dataset_version(self):
+        """Reads the dataset version recorded by api/ingest.py (None if never ingested)."""
+        meta = mongo.meta_collection().find_one({"_id": mongo.BENEFITS_COLLECTION}, {"dataset_version": 1})
+        return meta.get("dataset_version") if meta else None
+
+    def find_rows(self, query: dict, limit: int) -> list:
+        return list(mongo.benefits_collection().find(query).sort(PAGE_SORT).limit(limit))
+
+    def iter_rows(self, query: dict, batch_size: int):
+        return mongo.benefits_collection().find(query).sort(PAGE_SORT).batch_size(batch_size)
+
+    def plan_summaries(self, query: dict, plan_limit: int) -> list:
+        """
+        Benefit rows grouped into one document per plan (see queries.plan_summary_pipeline).
+        State and benefit filters read the summary collection built by api/ingest.py;
+        any other filter groups the benefit rows.
+        """
+        pipeline = stored_summary_pipeline(query, plan_limit)
+        if pipeline is not None:
+            return list(mongo.plan_summaries_collection().aggregate(pipeline))
+        return list(mongo.benefits_collection().aggregate(plan_summary_pipeline(query, plan_limit), allowDiskUse=True))
+
+    def eligibility_rows(self) -> list:
+        return json.loads(json_util.dumps(mongo.eligibility_collection().find({})))
+
+    def explain(self, query: dict, paged_query: dict, limit: int) -> dict:
+        """
+        Explains the page query (paged_query, i.e. the filters in query plus the
+        cursor position) and compares the plan with the recommended index for query.
+        """
+        collection = mongo.benefits_collection()
+        explain = collection.find(paged_query).sort(PAGE_SORT).limit(limit).explain()
+        summary = explain_summary(explain, query)
+        recommended = [field for field, _ in recommended_index(query)]
+        summary["recommendedIndexExists"] = any(
+            [field for field, _ in index["key"]] == recommended
+            for index in collection.index_information().values()
+        )
+        return summary
+
+    def ping(self):
+        mongo.ping()
+
+    def reload(self):
+        """Nothing to reload; every query reads the current collections."""
+
+
+class SnapshotDataStore:
+    """
+    Reads from a snapshot directory built by api/snapshot.py. The snapshot is
+    opened on first use and reopened when its manifest reports a new dataset
+    version, e.g. after a rebuild into the same path.
+    """
+
+    name = "snapshot"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        if self._snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    # Imported here so the Mongo backend never loads the snapshot reader
+                    from snapshot import Snapshot
+                    self._snapshot = Snapshot(self.path)
+                    logger.info("Opened data snapshot.", extra=fields(
+                        path=self.path, rows=self._snapshot.rows,
+                        dataset_version=self._snapshot.dataset_version))
+        return self._snapshot
+
+    def dataset_version(self):
+        from snapshot import read_dataset_version
+        version = read_dataset_version(self.path)
+        if self._snapshot is not None and version != self._snapshot.dataset_version:
+            self.reload()
+        return version
+
+    def find_rows(self, query: dict, limit: int) -> list:
+        snapshot = self.snapshot()
+        return snapshot.documents(snapshot.select(query)[:limit])
+
+    def iter_rows(self, query: dict, batch_size: int):
+        snapshot = self.snapshot()
+        positions = snapshot.select(query)
+        for start in range(0, len(positions), batch_size):
+            yield from snapshot.documents(positions[start:start + batch_size])
+
+    def plan_summaries(self, query: dict, plan_limit: int) -> list:
+        """Same documents as MongoDataStore.plan_summaries, grouped from contiguous plan rows."""
+        snapshot = self.snapshot()
+        positions = snapshot.select(query)
+        plan_codes = snapshot.columns['PlanId'].codes[positions]
+        # Rows come back in PlanId order, so each plan is one run of equal codes
+        starts = np.flatnonzero(np.diff(plan_codes)) + 1
+        bounds = list(zip([0, *starts], [*starts, len(positions)])) if len(positions) else []
+        plans = []
+        bounds = bounds[:plan_limit or None]
+        documents = snapshot.documents(positions[:bounds[-1][1]] if bounds else positions[:0])
+        for start, end in bounds:
+            rows = documents[start:end]
+            plans.append({
+                'PlanId': rows[0].get('PlanId'),
+                **{field: rows[0].get(field) for field in PLAN_FIELDS},
+                'benefits': [{field: row[field] for field in BENEFIT_FIELDS if field in row} for row in rows],
+            })
+        return plans
+
+    def eligibility_rows(self) -> list:
+        return self.snapshot().eligibility_rows()
+
+    def explain(self, query: dict, paged_query: dict, limit: int) -> dict:
+        """Reports the row range scanned for paged_query, the snapshot's analogue of an index scan."""
+        snapshot = self.snapshot()
+        start, end = snapshot.candidate_range(paged_query)
+        return {
+            "backend": self.name,
+            "query": query,
+            "filterShape": filter_shape(query),
+            "rowRange": [start, end],
+            "rowsExamined": end - start,
+            "rowsMatched": int(len(snapshot.select(paged_query))),
+            "datasetVersion": snapshot.dataset_version,
+        }
+
+    def ping(self):
+        self.snapshot()
+
+    def reload(self):
+        """Reopens the snapshot on next use; requests already running keep the old mapping."""
+        with self._lock:
+            self._snapshot = None
+
+
+def create_data_store():
+    """
+    Builds the data store selected by DATA_BACKEND.
+
+    Raises:
+        ValueError: For an unknown backend, or a snapshot backend without SNAPSHOT_PATH.
+    """
+    backend = os.getenv("DATA_BACKEND", DEFAULT_BACKEND).strip().lower()
+    if backend == "mongo":
+        return MongoDataStore()
+    if backend == "snapshot":
+        path = os.getenv("SNAPSHOT_PATH")
+        if not path:
+            raise ValueError("DATA_BACKEND=snapshot requires SNAPSHOT_PATH to point at a snapshot directory.")
+        return SnapshotDataStore(path)
+    raise ValueError(f"Unknown DATA_BACKEND '{backend}'. Use 'mongo' or 'snapshot'.")
@@ -0,0 +1,231 @@
+# --- Medicaid/CHIP Eligibility Index ---
+# The eligibility table has roughly one row per state, so it is loaded once per
+# worker into an in-memory index with dollar income thresholds precomputed by
+# household size. Profiles can then be checked in microseconds, before any plan
+# retrieval or LLM call.
+import re
+import json
+import time
+import hashlib
+import threading
+
+from logs import get_logger
+
+logger = get_logger("eligibility")
+
+# 2025 HHS poverty guidelines: (base for 1 person, amount per additional person)
+FPL_GUIDELINES = {
+    'default': (15650, 5500),
+    'AK': (19550, 6880),
+    'HI': (17990, 6330),
+}
+MAX_HOUSEHOLD_SIZE = 10
+# A profile is "clearly" eligible when its income is at or below this share of the limit
+CLEAR_ELIGIBILITY_MARGIN = 0.9
+# Adults this age or older are covered by Medicare, not the Medicaid adult groups
+MEDICARE_AGE = 65
+DEFAULT_REFRESH_SECONDS = 24 * 60 * 60
+# How long a failed load is remembered before the loader is called again
+DEFAULT_RETRY_SECONDS = 30
+
+STATE_CODES = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'District of Columbia': 'DC',
+    'Florida': 'FL', 'Georgia': 'GA', 'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL',
+    'Indiana': 'IN', 'Iowa': 'IA', 'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA',
+    'Maine': 'ME', 'Maryland': 'MD', 'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN',
+    'Mississippi': 'MS', 'Missouri': 'MO', 'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV',
+    'New Hampshire': 'NH', 'New Jersey': 'NJ', 'New Mexico': 'NM', 'New York': 'NY',
+    'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH', 'Oklahoma': 'OK', 'Oregon': 'OR',
+    'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC', 'South Dakota': 'SD',
+    'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 'Vermont': 'VT', 'Virginia': 'VA',
+    'Washington': 'WA', 'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY',
+}
+
+# The sign may sit before a dollar sign ("-$3"); a hyphen between numbers ("30-39") is not one
+_NUMBER_RE = re.compile(r'(-)?\s*\$?\s*(\d+(?:\.\d+)?)')
+
+
+def parse_amount(value):
+    """
+    Parses "138%", "$52,000" or 52000 into a float. Returns None for "N/A" and blanks.
+
+    Raises:
+        ValueError: If the amount is negative.
+    """
+    match = _NUMBER_RE.search(str(value if value is not None else '').replace(',', ''))
+    if not match:
+        return None
+    if match.group(1):
+        raise ValueError(f"Amount must not be negative: {value!r}")
+    return float(match.group(2))
+
+
+def normalize_state(value) -> str:
+    """Maps a state name or code to its two-letter code."""
+    text = str(value or '').strip()
+    return STATE_CODES.get(text, text.upper())
+
+
+def poverty_line(state_code: str, household_size: int) -> float:
+    """Returns the federal poverty guideline for a household in a state."""
+    base, per_person = FPL_GUIDELINES.get(state_code, FPL_GUIDELINES['default'])
+    return base + per_person * (max(household_size, 1) - 1)
+
+
+def _limit_percentages(row: dict) -> dict:
+    """
+    Picks the %FPL limits out of an eligibility row by column name, so slightly
+    different column headers between releases are still recognized.
+    """
+    limits = {'adult': None, 'parent': None, 'child': None}
+    for column, value in row.items():
+        name = column.lower()
+        try:
+            percent = parse_amount(value)
+        except ValueError:
+            continue
+        if percent is None or 'pregnan' in name:
+            continue
+        if 'expansion' in name or ('adult' in name and 'parent' not in name):
+            limits['adult'] = max(limits['adult'] or 0, percent)
+        elif 'parent' in name or 'caretaker' in name:
+            limits['parent'] = max(limits['parent'] or 0, percent)
+        elif 'chip' in name or 'child' in name or 'ages' in name:
+            limits['child'] = max(limits['child'] or 0, percent)
+    return limits
+
+
+class EligibilityIndex:
+    """
+    In-memory Medicaid/CHIP eligibility table keyed by two-letter state code.
+    """
+
+    def __init__(self, loader, refresh_seconds: float = DEFAULT_REFRESH_SECONDS,
+                 retry_seconds: float = DEFAULT_RETRY_SECONDS):
+        """
+        Args:
+            loader: Callable returning the eligibility rows (JSON-ready dictionaries).
+            refresh_seconds: How long loaded rows are used before loader() is called again.
+            retry_seconds: How long a failed load is re-raised before loader() is retried.
+        """
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        self.retry_seconds = retry_seconds
+        self.rows = []
+        self.thresholds = {}  # state -> {"adult"|"parent"|"child": {household_size: dollars}}
+        self.version = None  # Hash of the loaded rows, for HTTP ETags
+        self._loaded_at = None
+        self._failed_at = None
+        self._load_error = None
+        self._lock = threading.Lock()
+
+    def ensure_loaded(self):
+        """
+        Loads the table on first use and after refresh_seconds. Stale rows are
+        kept if a refresh fails.
+
+        Raises:
+            Exception: The loader's error, re-raised without calling it again
+                       for retry_seconds after a failed first load.
+        """
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.refresh_seconds:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is not None and now - self._loaded_at < self.refresh_seconds:
+                return
+            if self._failed_at is not None and now - self._failed_at < self.retry_seconds:
+                if self._loaded_at is not None:
+                    return
+                raise self._load_error
+            try:
+                rows = self.loader()
+            except Exception as e:
+                self._failed_at, self._load_error = now, e
+                logger.warning(f"Failed to load Medicaid/CHIP eligibility, retrying in {self.retry_seconds:.0f}s: {e}")
+                if self._loaded_at is not None:
+                    return
+                raise
+            self._failed_at = self._load_error = None
+            self._build(rows)
+
+    def invalidate(self):
+        """Forces a reload on next use."""
+        with self._lock:
+            self._loaded_at = None
+            self._failed_at = None
+
+    def find_rows(self, state=None) -> list:
+        """Returns the raw rows, optionally only those whose State equals state."""
+        self.ensure_loaded()
+        if not state:
+            return self.rows
+        return [row for row in self.rows if row.get('State') == state]
+
+    def check(self, form_data: dict):
+        """
+        Checks a profile against its state's limits.
+
+        Returns:
+            None if the state is unknown, income is missing or negative or the table could not
+            be loaded (the check is skipped rather than failing the request), otherwise a dict with
+            the household size, the dollar limits that apply, and whether the adult
+            ("adultLikelyEligible") and children ("childrenLikelyEligible") are clearly eligible.
+            Adults aged MEDICARE_AGE or older get no adult limit; "medicareEligible" is set instead.
+        """
+        try:
+            self.ensure_loaded()
+        except Exception:
+            # Already logged by ensure_loaded; plan recommendations work without it
+            return None
+        state = normalize_state(form_data.get('state'))
+        try:
+            income = parse_amount(form_data.get('income'))
+            dependents = int(parse_amount(form_data.get('dependents')) or 0)
+            age = parse_amount(form_data.get('age'))
+        except ValueError:
+            return None
+        limits = self.thresholds.get(state)
+        if not limits or income is None:
+            return None
+
+        household_size = min(1 + dependents, MAX_HOUSEHOLD_SIZE)
+        medicare_eligible = age is not None and age >= MEDICARE_AGE
+
+        adult_limit = None
+        if not medicare_eligible:
+            adult_limit = limits['adult'].get(household_size)
+            if adult_limit is None and dependents > 0:
+                # Non-expansion states only cover adults as parents/caretakers
+                adult_limit = limits['parent'].get(household_size)
+        child_limit = limits['child'].get(household_size) if dependents > 0 else None
+
+        return {
+            "state": state,
+            "income": income,
+            "householdSize": household_size,
+            "adultIncomeLimit": adult_limit,
+            "childIncomeLimit": child_limit,
+            "adultLikelyEligible": adult_limit is not None and income <= adult_limit * CLEAR_ELIGIBILITY_MARGIN,
+            "childrenLikelyEligible": child_limit is not None and income <= child_limit * CLEAR_ELIGIBILITY_MARGIN,
+            "medicareEligible": medicare_eligible,
+        }
+
+    def _build(self, rows):
+        thresholds = {}
+        for row in rows:
+            state = normalize_state(row.get('State'))
+            percentages = _limit_percentages(row)
+            thresholds[state] = {
+                group: {
+                    size: round(percent / 100 * poverty_line(state, size), 2)
+                    for size in range(1, MAX_HOUSEHOLD_SIZE + 1)
+                } if percent is not None else {}
+                for group, percent in percentages.items()
+            }
+        self.rows = rows
+        self.thresholds = thresholds
+        self.version = hashlib.sha256(json.dumps(rows, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+        self._loaded_at = time.monotonic()
+        logger.info(f"Loaded Medicaid/CHIP eligibility for {len(thresholds)} states.")
@@ -0,0 +1,208 @@
+# --- Benefit Row Filters ---
+# Compiles typed GET parameters into one MongoDB query over the benefit rows, so
+# filtering happens in the database. Every filter shape maps to an index
+# recommendation, and explain_summary() reports what the planner actually used.
+import re
+
+from ranker import parse_copay, parse_coinsurance
+
+# Benefit names that make up dental coverage, shared by the GET and POST handlers
+DENTAL_BENEFITS = [
+    "Routine Dental Services (Adult)", "Dental Check-Up for Children",
+    "Basic Dental Care - Child", "Orthodontia - Child", "Major Dental Care - Child",
+    "Basic Dental Care - Adult", "Orthodontia - Adult", "Major Dental Care - Adult",
+    "Accidental Dental"
+]
+
+# Numeric copies of the cost-sharing columns, written by api/ingest.py
+COPAY_AMOUNT_FIELD = "CopayInnTier1Amount"      # dollars
+COINSURANCE_PERCENT_FIELD = "CoinsInnTier1Percent"  # 0-100
+
+# Query parameter -> (field, operator) for numeric ranges
+RANGE_PARAMS = {
+    'minCopay': (COPAY_AMOUNT_FIELD, '$gte'),
+    'maxCopay': (COPAY_AMOUNT_FIELD, '$lte'),
+    'minCoinsurance': (COINSURANCE_PERCENT_FIELD, '$gte'),
+    'maxCoinsurance': (COINSURANCE_PERCENT_FIELD, '$lte'),
+}
+
+# Sort used by the paginated GET endpoint (see queries.PAGE_SORT)
+SORT_FIELDS = ['PlanId', '_id']
+
+_TRUE_VALUES = ('1', 'true', 'yes')
+
+
+class InvalidFilterError(ValueError):
+    """Raised when a filter parameter has an invalid value."""
+
+
+def normalized_fields(row: dict) -> dict:
+    """
+    Numeric cost-sharing fields for a CSV row. Blank values stay absent, so
+    range filters never match a benefit with no cost-sharing data.
+    """
+    fields = {}
+    if row.get('CopayInnTier1'):
+        fields[COPAY_AMOUNT_FIELD] = parse_copay(row['CopayInnTier1'])
+    if row.get('CoinsInnTier1'):
+        fields[COINSURANCE_PERCENT_FIELD] = round(parse_coinsurance(row['CoinsInnTier1']) * 100, 4)
+    return fields
+
+
+def _values(args, name: str) -> list:
+    # Accepts repeated parameters (?issuer=1&issuer=2) and comma-separated lists
+    # for identifiers; benefit names may contain commas, so they are only repeated
+    raw = args.getlist(name) if hasattr(args, 'getlist') else args.get(name)
+    if not isinstance(raw, (list, tuple)):
+        raw = [raw]
+    values = []
+    for value in raw:
+        if value is None or str(value).strip() == '':
+            continue
+        parts = [str(value)] if name == 'benefit' else str(value).split(',')
+        values.extend(part.strip() for part in parts if part.strip())
+    return values
+
+
+def _number(args, name: str):
+    value = args.get(name)
+    if value is None or str(value).strip() == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise InvalidFilterError(f"{name} must be a number.")
+
+
+def compile_filters(args) -> dict:
+    """
+    Builds the MongoDB query for the benefit row filters in args.
+
+    Args:
+        args: request.args or a plain dict. Supported keys:
+              state, issuer (IssuerId, repeatable or comma-separated),
+              component (StandardComponentId prefix), benefit (BenefitName, repeatable),
+              dentalRequired=yes (dental benefits only), coveredOnly=1,
+              minCopay/maxCopay (dollars), minCoinsurance/maxCoinsurance (percent).
+
+    Returns:
+        The query dictionary ({} when no filters are given).
+
+    Raises:
+        InvalidFilterError: If a numeric or prefix parameter is malformed.
+    """
+    query = {}
+
+    state = str(args.get('state') or '').strip()
+    if state:
+        query['StateCode'] = state.upper()
+
+    issuers = _values(args, 'issuer')
+    if issuers:
+        query['IssuerId'] = issuers[0] if len(issuers) == 1 else {'$in': issuers}
+
+    component = str(args.get('component') or '').strip()
+    if component:
+        if not re.fullmatch(r'[A-Za-z0-9-]+', component):
+            raise InvalidFilterError("component must be a StandardComponentId prefix.")
+        # An anchored, case-sensitive prefix regex is answered with an index range scan
+        query['StandardComponentId'] = {'$regex': f'^{re.escape(component)}'}
+
+    benefits = _values(args, 'benefit')
+    if str(args.get('dentalRequired') or '').lower() == 'yes':
+        # The dental filter and an explicit benefit list intersect; an empty
+        # intersection ($in: []) matches nothing
+        benefits = [name for name in benefits if name in DENTAL_BENEFITS] if benefits else list(DENTAL_BENEFITS)
+        query['BenefitName'] = {'$in': benefits}
+    elif benefits:
+        query['BenefitName'] = benefits[0] if len(benefits) == 1 else {'$in': benefits}
+
+    if str(args.get('coveredOnly') or '').lower() in _TRUE_VALUES:
+        query['IsCovered'] = 'Covered'
+
+    for name, (field, operator) in RANGE_PARAMS.items():
+        value = _number(args, name)
+        if value is not None:
+            query.setdefault(field, {})[operator] = value
+
+    return query
+
+
+def filter_shape(query: dict) -> dict:
+    """Classifies the filtered fields as equality or range predicates."""
+    equality, ranges = [], []
+    for field, condition in query.items():
+        if field.startswith('$'):
+            continue
+        is_range = isinstance(condition, dict) and any(
+            operator in condition for operator in ('$gt', '$gte', '$lt', '$lte', '$regex'))
+        (ranges if is_range else equality).append(field)
+    return {"equality": equality, "range": ranges}
+
+
+def recommended_index(query: dict, sort_fields: list = None) -> list:
+    """
+    Recommends an index for query following the equality, sort, range rule:
+    equality fields first, then the sort keys, then range fields.
+
+    Returns:
+        A list of (field, 1) pairs, as passed to create_index.
+    """
+    sort_fields = SORT_FIELDS if sort_fields is None else sort_fields
+    shape = filter_shape(query)
+    # StateCode first: every deployment query and every FILTER_INDEXES entry starts with it
+    equality = sorted(shape['equality'], key=lambda field: (field != 'StateCode', field))
+    keys = equality + [field for field in sort_fields if field not in equality]
+    keys += [field for field in shape['range'] if field not in keys]
+    return [(field, 1) for field in keys]
+
+
+def _plan_stages(plan: dict):
+    """Yields every stage in an explain plan tree."""
+    if not isinstance(plan, dict):
+        return
+    yield plan
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from _plan_stages(child)
+
+
+def explain_summary(explain: dict, query: dict, sort_fields: list = None) -> dict:
+    """
+    Condenses a MongoDB explain() result into the parts that matter for tuning:
+    the winning plan's stages and index, and how many keys/documents were examined.
+    """
+    query_planner = explain.get('queryPlanner', {})
+    stages = list(_plan_stages(query_planner.get('winningPlan', {})))
+    index_names = [stage['indexName'] for stage in stages if stage.get('indexName')]
+    stats = explain.get('executionStats', {})
+    return {
+        "query": query,
+        "filterShape": filter_shape(query),
+        "recommendedIndex": [field for field, _ in recommended_index(query, sort_fields)],
+        "winningPlan": {
+            "stages": [stage.get('stage') for stage in stages if stage.get('stage')],
+            "indexes": index_names,
+            "collectionScan": any(stage.get('stage') == 'COLLSCAN' for stage in stages),
+            "inMemorySort": any(stage.get('stage') == 'SORT' for stage in stages),
+        },
+        "executionStats": {
+            "nReturned": stats.get('nReturned'),
+            "totalKeysExamined": stats.get('totalKeysExamined'),
+            "totalDocsExamined": stats.get('totalDocsExamined'),
+            "executionTimeMillis": stats.get('executionTimeMillis'),
+        } if stats else None,
+    }
+
+
+# Representative filter shapes; api/ingest.py creates their recommended indexes,
+# in addition to the (StateCode, BenefitName) and (StateCode, PlanId, _id) ones
+FILTER_SHAPES = [
+    {'state': 'XX', 'issuer': '0'},
+    {'state': 'XX', 'component': '0'},
+    {'state': 'XX', 'benefit': 'x', 'coveredOnly': '1', 'maxCopay': '0'},
+    {'state': 'XX', 'benefit': 'x', 'coveredOnly': '1', 'maxCoinsurance': '0'},
+]
+FILTER_INDEXES = [recommended_index(compile_filters(shape)) for shape in FILTER_SHAPES]
@@ -0,0 +1,133 @@
+# --- HTTP Caching and Compression ---
+# Plan rows and eligibility tables only change when a new dataset is loaded, so
+# GET responses carry a strong ETag built from the dataset version and the query
+# parameters. A matching If-None-Match is answered with 304 before any query
+# runs. Large responses are compressed with Brotli (if installed) or gzip,
+# whichever the client prefers in Accept-Encoding.
+import gzip
+import hashlib
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional; gzip is always available
+    brotli = None
+
+DEFAULT_MAX_AGE_SECONDS = 300
+DEFAULT_MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+# Quality 11 (the default) is meant for static assets and too slow per request
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/x-ndjson", "text/plain", "text/html", "text/event-stream"}
+
+
+def supported_encodings() -> list:
+    """Encodings this process can produce, in server preference order."""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def make_etag(dataset_version, path: str, args) -> str:
+    """
+    Builds a strong ETag value (without quotes) for a GET response.
+
+    Args:
+        dataset_version: Version of the data behind the response.
+        path: Request path.
+        args: request.args; parameter order does not change the tag.
+    """
+    items = sorted(args.items(multi=True)) if hasattr(args, "items") else []
+    payload = repr((str(dataset_version), path, items)).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:32]
+
+
+def matching_etag(request, etag: str):
+    """
+    Returns the tag from the request's If-None-Match that matches etag, or None.
+    Besides the base tag, only the variant compress_response would produce for
+    this request's Accept-Encoding (e.g. "<etag>-gzip") matches, so a client
+    never keeps a cached body in an encoding it no longer accepts.
+    """
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return None
+    candidates = [etag]
+    encoding = choose_encoding(request.headers.get("Accept-Encoding"))
+    if encoding is not None:
+        candidates.append(f"{etag}-{encoding}")
+    for candidate in candidates:
+        if if_none_match.contains_weak(candidate):
+            return candidate
+    return None
+
+
+def cache_headers(response: Response, etag: str, max_age: int = DEFAULT_MAX_AGE_SECONDS) -> Response:
+    """Adds the ETag and Cache-Control headers to a response (200 or 304)."""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={max_age}"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def not_modified(etag: str, max_age: int = DEFAULT_MAX_AGE_SECONDS) -> Response:
+    """Builds a 304 response; etag is the matched tag, so a cached compressed variant keeps its tag."""
+    return cache_headers(Response(status=304), etag, max_age)
+
+
+def choose_encoding(accept_encoding: str):
+    """
+    Picks the best supported encoding from an Accept-Encoding header, honouring
+    q-values; returns None if the client accepts none of them.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in supported_encodings():
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response: Response, accept_encoding: str,
+                      min_bytes: int = DEFAULT_MIN_COMPRESS_BYTES) -> Response:
+    """
+    Compresses a buffered response body when the client accepts a supported
+    encoding and the body is at least min_bytes. Streamed responses, non-200
+    responses and already-encoded bodies are left unchanged.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < min_bytes:
+        return response
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    # A strong ETag identifies exact bytes, so each encoding gets its own tag
+    etag, is_weak = response.get_etag()
+    if etag and not is_weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
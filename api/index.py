@@ -1,61 +1,219 @@
 import os
+import hmac
 import json
-import traceback
-from flask import Flask, request, jsonify
+import time
+# Start of this module's import, for the cold start time reported by create_app()
+MODULE_IMPORT_STARTED = time.perf_counter()
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlencode
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context, g
 from flask_cors import CORS
-from pymongo import MongoClient
-import certifi
 from bson import json_util
 from dotenv import load_dotenv
 
 # Import the agent function
-from agent import decisionAgent
+from agent import (
+    decisionAgent, stream_ranked_plans, encode_for_prompt, get_model, llm_caller,
+    fallback_recommendation, fallback_reason, LLM_FALLBACK_ON_ERROR
+)
+from resilience import CircuitOpenError, is_retryable_error
+from queries import DEFAULT_RANKING_PLAN_LIMIT, keyset_query, encode_cursor, InvalidCursorError
+from filters import compile_filters, InvalidFilterError
+from datastore import create_data_store
+from plan_cache import PlanCache, DEFAULT_MAX_BYTES, DEFAULT_TTL_SECONDS
+from ranker import PlanSet, top_k_plans, local_recommendation, DEFAULT_TOP_K
+import recommendation_cache as rec_cache
+import stages
+from stages import stage
+import metrics
+import http_cache
+from logs import get_logger, fields, log_payload
+from eligibility import EligibilityIndex, parse_amount, DEFAULT_REFRESH_SECONDS, DEFAULT_RETRY_SECONDS
+import rate_limit
+from rate_limit import RateLimiter, call_with_rate_limit
+from jobs import JobManager, SqliteJobStore, QueueFullError, DEFAULT_MAX_WORKERS, DEFAULT_MAX_QUEUE_DEPTH, DEFAULT_JOB_TTL_SECONDS
+
+logger = get_logger("index")
 
 # --- Flask App Setup ---
-app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+# Routes live on a blueprint; create_app() (bottom of this file) builds the app
+api = Blueprint("api", __name__)
 
 # Load environment variables from .env file
 load_dotenv()
 
-# --- MongoDB Connection ---
-uri = os.getenv("MONGO_URI")
-google_api_key = os.getenv("GOOGLE_API_KEY") # Ensure you have GOOGLE_API_KEY in your .env
-
-if not uri:
-    print("Error: MONGO_URI environment variable not set.")
-    # Consider raising an exception or exiting if the DB connection is critical
-    exit("MongoDB URI not found. Please set MONGO_URI in your .env file.")
-if not google_api_key:
-    print("Warning: GOOGLE_API_KEY environment variable not set.")
-    # Decide if the app can run without the API key or exit
-    # exit("Google API Key not found. Please set GOOGLE_API_KEY in your .env file.")
-
-try:
-    print("Attempting to connect to MongoDB...")
-    client = MongoClient(uri, tlsCAFile=certifi.where())
-    # The ismaster command is cheap and does not require auth.
-    client.admin.command('ismaster')
-    print("Successfully connected to MongoDB")
-    db = client.benefits_and_cost_sharing # Use your actual database name
-    benefits_collection = db.data # Use your actual collection name for benefits
-    eligibility_collection = client.medicaid_and_chip_eligibility_levels.data # Use your actual eligibility DB/collection
-except Exception as e:
-    print(f"Error connecting to MongoDB: {e}")
-    print(traceback.format_exc())
-    # Exit if DB connection fails
-    exit(f"Failed to connect to MongoDB: {e}")
-
+# --- Data Access ---
+# DATA_BACKEND selects MongoDB (default) or a local columnar snapshot (see api/datastore.py).
+# Neither connects or opens files here, so nothing touches the network at import
+data_store = create_data_store()
+if data_store.name == "mongodb" and not os.getenv("MONGO_URI"):
+    logger.error("MONGO_URI environment variable not set. Database endpoints will fail until it is.")
+if not os.getenv("GOOGLE_API_KEY"):
+    logger.warning("GOOGLE_API_KEY environment variable not set.")
+
+
+# --- Plan Cache ---
+# One cache per worker process, shared by the GET and POST handlers
+plan_cache = PlanCache(
+    max_bytes=int(os.getenv("PLAN_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+    ttl_seconds=float(os.getenv("PLAN_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+    version_loader=data_store.dataset_version
+)
+
+# --- Recommendation Cache ---
+# Set RECOMMENDATION_CACHE_PATH to a SQLite file to keep recommendations across restarts
+recommendation_cache_path = os.getenv("RECOMMENDATION_CACHE_PATH")
+recommendation_cache = rec_cache.RecommendationCache(
+    max_entries=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", rec_cache.DEFAULT_MAX_ENTRIES)),
+    ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", rec_cache.DEFAULT_TTL_SECONDS)),
+    backend=rec_cache.SqliteBackend(recommendation_cache_path) if recommendation_cache_path else None
+)
+
+# --- Medicaid/CHIP Eligibility Index ---
+# The whole table (~50 rows) is loaded once per worker and refreshed daily
+eligibility_index = EligibilityIndex(
+    loader=data_store.eligibility_rows,
+    refresh_seconds=float(os.getenv("ELIGIBILITY_REFRESH_SECONDS", DEFAULT_REFRESH_SECONDS)),
+    retry_seconds=float(os.getenv("ELIGIBILITY_RETRY_SECONDS", DEFAULT_RETRY_SECONDS))
+)
+
+# The frontend reads analysis.ranked_plans, so by default eligibility is added to
+# the recommendation rather than replacing it
+DEFAULT_ELIGIBILITY_MODE = "include"
+
+# --- LLM Rate Limiting ---
+# Shared by all batch runs in this worker so together they stay under the quota
+llm_rate_limiter = RateLimiter(float(os.getenv("LLM_REQUESTS_PER_MINUTE", rate_limit.DEFAULT_REQUESTS_PER_MINUTE)))
+# Quota errors are retried after LLM_RATE_LIMIT_BACKOFF_SECONDS, doubled per retry
+LLM_RATE_LIMIT_MAX_RETRIES = int(os.getenv("LLM_RATE_LIMIT_MAX_RETRIES", rate_limit.DEFAULT_MAX_RETRIES))
+LLM_RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("LLM_RATE_LIMIT_BACKOFF_SECONDS", rate_limit.DEFAULT_BACKOFF_SECONDS))
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", 1000))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 4))
+
+# --- Recommendation Jobs ---
+# Jobs run on this process's threads, so they need long-lived workers, not a
+# serverless runtime. With more than one worker process, set JOB_STORE_PATH to a
+# SQLite file so a status poll can reach any worker
+job_store_path = os.getenv("JOB_STORE_PATH")
+job_manager = JobManager(
+    max_workers=int(os.getenv("JOB_MAX_WORKERS", DEFAULT_MAX_WORKERS)),
+    max_queue_depth=int(os.getenv("JOB_MAX_QUEUE_DEPTH", DEFAULT_MAX_QUEUE_DEPTH)),
+    ttl_seconds=float(os.getenv("JOB_TTL_SECONDS", DEFAULT_JOB_TTL_SECONDS)),
+    store=SqliteJobStore(job_store_path) if job_store_path else None
+)
+
+# --- Admin Endpoints ---
+# POST /api/cache/invalidate needs ADMIN_TOKEN, sent as "Authorization: Bearer <token>"
+# or X-Admin-Token. Without ADMIN_TOKEN the endpoint is disabled (404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+def admin_token_valid() -> bool:
+    """True if the request carries ADMIN_TOKEN; always False when it is not configured."""
+    if not ADMIN_TOKEN:
+        return False
+    authorization = request.headers.get("Authorization", "")
+    token = authorization[7:] if authorization.startswith("Bearer ") else request.headers.get("X-Admin-Token", "")
+    return hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+# --- HTTP Caching ---
+# GET plan and eligibility responses get ETags and Cache-Control; bodies of at
+# least COMPRESS_MIN_BYTES are compressed (Brotli if installed, else gzip)
+HTTP_CACHE_MAX_AGE = int(os.getenv("HTTP_CACHE_MAX_AGE", http_cache.DEFAULT_MAX_AGE_SECONDS))
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", http_cache.DEFAULT_MIN_COMPRESS_BYTES))
+
+# --- Metrics ---
+# Stage timings (query, serialization, prompt build, LLM, validation) feed histograms
+stages.add_sink(metrics.observe_stage)
+
+def collect_cache_metrics():
+    """Exposes the cache and job counters, which the caches already keep, as metrics."""
+    plan_stats = plan_cache.stats()
+    rec_stats = recommendation_cache.stats()
+    job_stats = job_manager.stats()
+    return [
+        ("plans4you_cache_hits_total", "counter", "Cache hits by cache.", [
+            ({"cache": "plan"}, plan_stats["hits"]),
+            ({"cache": "recommendation"}, rec_stats["hits"]),
+            ({"cache": "recommendation_disk"}, rec_stats["disk_hits"]),
+        ]),
+        ("plans4you_cache_misses_total", "counter", "Cache misses by cache.", [
+            ({"cache": "plan"}, plan_stats["misses"]),
+            ({"cache": "recommendation"}, rec_stats["misses"]),
+        ]),
+        ("plans4you_recommendations_coalesced_total", "counter",
+         "Requests that waited for an identical in-flight recommendation.", [({}, rec_stats["coalesced"])]),
+        ("plans4you_plan_cache_bytes", "gauge", "Approximate plan cache size.", [({}, plan_stats["bytes"])]),
+        ("plans4you_llm_circuit_open", "gauge", "1 while the LLM circuit breaker is open or half-open.",
+         [({}, 0 if llm_caller.breaker.state == "closed" else 1)]),
+        ("plans4you_jobs_pending", "gauge", "Queued and running recommendation jobs.", [({}, job_stats["pending"])]),
+        ("plans4you_startup_seconds", "gauge", "Time from importing api/index.py to the app being ready.",
+         [({}, STARTUP_SECONDS)] if STARTUP_SECONDS is not None else []),
+    ]
+
+metrics.REGISTRY.add_collector(collect_cache_metrics)
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@api.after_app_request
+def observe_request(response):
+    # For streamed responses this measures the time until streaming starts
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint,
+                                        method=request.method, status=response.status_code)
+    return response
+
+@api.after_app_request
+def compress_response(response):
+    return http_cache.compress_response(response, request.headers.get("Accept-Encoding", ""), COMPRESS_MIN_BYTES)
 
 
 # --- API Routes ---
 
-@app.route("/api/test")
+DEFAULT_PAGE_SIZE = 200
+MAX_PAGE_SIZE = 1000
+NDJSON_BATCH_SIZE = 1000
+
+@api.route("/api/test")
 def hello_world():
     """A simple test route."""
     return "<p>Hello, World!</p>"
 
-@app.route("/api/benefits_and_cost_sharing", methods=["GET", "POST"])
+@api.route("/api/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint for this worker's metrics."""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@api.route("/api/health/live")
+def liveness():
+    """Liveness probe: the process is up and serving. Never touches MongoDB or Gemini."""
+    return jsonify({"status": "ok"})
+
+@api.route("/api/health/ready")
+def readiness():
+    """
+    Readiness probe: returns 200 once the data store (MongoDB ping, or the
+    snapshot opening) answers, 503 otherwise.
+    Also configures the Gemini model if needed; local ranking works without it,
+    so a missing model is reported but does not fail the check.
+    """
+    checks = {}
+    try:
+        started = time.perf_counter()
+        data_store.ping()
+        checks[data_store.name] = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+    except Exception as e:
+        logger.warning(f"Readiness check failed to reach the {data_store.name} data store: {e}")
+        checks[data_store.name] = {"ok": False, "error": str(e)}
+    checks["gemini"] = {"ok": get_model() is not None}
+    ready = checks[data_store.name]["ok"]
+    return jsonify({"status": "ready" if ready else "unavailable", "checks": checks}), 200 if ready else 503
+
+@api.route("/api/benefits_and_cost_sharing", methods=["GET", "POST"])
 def handle_benefits_and_cost_sharing():
     """
     Handles GET requests to fetch plan data and POST requests
@@ -66,164 +224,550 @@ def handle_benefits_and_cost_sharing():
     elif request.method == "GET":
         return get_filtered_benefits()
 
+REQUIRED_FIELDS = ['name', 'age', 'state', 'income', 'dentalPlanRequired', 'consentGiven']
+
+def validate_form_data(form_data):
+    """Returns an error message if the form data is unusable, otherwise None."""
+    if not form_data:
+        return "No JSON data received"
+    missing_fields = [field for field in REQUIRED_FIELDS if field not in form_data]
+    if missing_fields:
+        return f"Missing required fields: {', '.join(missing_fields)}"
+    if not isinstance(form_data['state'], str) or not form_data['state'].strip():
+        return "state must be a state code such as 'TX'"
+    for field in ('age', 'income', 'dependents'):
+        try:
+            parse_amount(form_data.get(field))
+        except ValueError:
+            return f"{field} must not be negative"
+    return None
+
 def process_user_request():
     """Processes POST request with user data to get AI plan recommendations."""
     try:
         form_data = request.json
-        if not form_data:
-            return jsonify({"error": "No JSON data received"}), 400
-        print("Received form data:", form_data)
+        log_payload(logger, "Received form data", form_data)
 
         # --- Validate Input Data ---
-        required_fields = ['name', 'age', 'state', 'income', 'dentalPlanRequired', 'consentGiven']
-        missing_fields = [field for field in required_fields if field not in form_data]
-        if missing_fields:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
-
-        state = form_data.get('state')
-        dental_required = str(form_data.get('dentalPlanRequired', 'no')).lower() # Ensure lowercase 'yes'/'no'
-
-        # --- Query MongoDB ---
-        query = {"StateCode": state}
-        # Define dental benefit names consistently
-        dental_benefits = [
-            "Routine Dental Services (Adult)", "Dental Check-Up for Children",
-            "Basic Dental Care - Child", "Orthodontia - Child", "Major Dental Care - Child",
-            "Basic Dental Care - Adult", "Orthodontia - Adult", "Major Dental Care - Adult",
-            "Accidental Dental"
-        ]
-        if dental_required == 'yes':
-            query['BenefitName'] = {'$in': dental_benefits}
-            print(f"Querying for plans in {state} INCLUDING dental benefits.")
-        elif dental_required == 'no':
-             # If dental is not required, we don't need to filter based on BenefitName,
-             # as we want plans regardless of their dental coverage.
-             # query['BenefitName'] = {'$nin': dental_benefits} # This would EXCLUDE plans with ONLY dental
-             print(f"Querying for all plans in {state} (dental not required).")
-        else:
-             # Handle cases where dentalPlanRequired is neither 'yes' nor 'no' if necessary
-             print(f"Querying for all plans in {state} (dental requirement unclear: '{dental_required}').")
+        error = validate_form_data(form_data)
+        if error:
+            return jsonify({"error": error}), 400
 
+        mode = str(request.args.get('mode') or form_data.get('mode') or 'ai').lower()
+        payload, status_code = build_recommendation(form_data, mode)
+        return jsonify(payload), status_code
 
-        # Fetch data - consider adding a limit if datasets are huge
-        # Limit added for safety, adjust as needed
-        plan_data_cursor = benefits_collection.find(query).limit(500)
-        plan_data_list = list(plan_data_cursor)
+    except Exception as e:
+        logger.exception(f"Error processing form data: {str(e)}")
+        return jsonify({"error": "An internal server error occurred.", "details": str(e)}), 500
 
-        # Convert MongoDB BSON/ObjectId to JSON serializable format
-        json_serializable_data = json.loads(json_util.dumps(plan_data_list))
+def fetch_plans(form_data: dict) -> list:
+    """
+    Returns the grouped plan documents for the profile's state and dental
+    preference, as a cached ranker.PlanSet.
+    """
+    state = form_data.get('state')
+    dental_required = str(form_data.get('dentalPlanRequired', 'no')).lower() # Ensure lowercase 'yes'/'no'
+
+    # --- Query the Data Store ---
+    # Same filter compiler as GET; dentalRequired=yes keeps only the dental benefit rows
+    query = compile_filters({"state": state, "dentalRequired": dental_required})
+    if dental_required == 'yes':
+        logger.debug(f"Querying for plans in {state} INCLUDING dental benefits.")
+    elif dental_required == 'no':
+         # If dental is not required, we don't need to filter based on BenefitName,
+         # as we want plans regardless of their dental coverage.
+         # query['BenefitName'] = {'$nin': dental_benefits} # This would EXCLUDE plans with ONLY dental
+         logger.debug(f"Querying for all plans in {state} (dental not required).")
+    else:
+         # Handle cases where dentalPlanRequired is neither 'yes' nor 'no' if necessary
+         logger.debug(f"Querying for all plans in {state} (dental requirement unclear: '{dental_required}').")
+
+
+    # Group benefit rows into one document per plan in the data store and
+    # limit by plans, so no plan is cut off partway through its benefits.
+    # Every caller ranks the result (top_k_plans or local_recommendation), so
+    # the limit is a safety cap rather than a page size
+    plan_limit = int(os.getenv("PLAN_LIMIT", DEFAULT_RANKING_PLAN_LIMIT))
+    cache_key = ("plans", state, 'dental' if dental_required == 'yes' else 'all')
+    def load_plans():
+        with stage(stages.QUERY):
+            plans = data_store.plan_summaries(query, plan_limit)
+        if plan_limit and len(plans) >= plan_limit:
+            logger.warning("Plan limit reached; some plans were not ranked.",
+                           extra=fields(state=state, plan_limit=plan_limit))
+        # Parse the cost-sharing matrices once; every request reuses them from the cache
+        return PlanSet(plans)
+
+    return plan_cache.get_or_load(cache_key, load_plans)
+
+def build_recommendation(form_data: dict, mode: str = 'ai', plans: list = None, agent=decisionAgent):
+    """
+    Builds the response for a validated profile. Independent of the Flask
+    request, so it can also run in background jobs.
 
-        if not json_serializable_data:
-            print(f"No plans found for state: {state} with dental preference: {dental_required}")
-            return jsonify({
-                "status": "info",
-                "message": f"No matching plans found for state {state} based on your criteria.",
-                "plans": []
-            }), 200 # Return 200 OK, but with info message
-
-        print(f"Found {len(json_serializable_data)} plan entries for state: {state} matching criteria.")
-
-        # --- Process data without Pandas ---
-        # Remove '_id' field from all items in the list if it exists
-        for item in json_serializable_data:
-            if '_id' in item:
-                del item['_id']
-
-        # --- Call AI Agent ---
-        print("Calling AI Agent for analysis...")
-        # Pass the list of plans directly
-        ai_response = decisionAgent(form_data, json_serializable_data)
-
-        if not ai_response or "error" in ai_response:
-            print(f"AI Agent error: {ai_response.get('error', 'Unknown error')}")
-            # Return raw output if available and it was a JSON decode error
-            if "raw_output" in ai_response:
-                 return jsonify({
-                    "status": "error",
-                    "message": "AI analysis failed to produce valid JSON.",
-                    "raw_agent_output": ai_response["raw_output"]
-                 }), 500
-            return jsonify({
-                "status": "error",
-                "message": f"AI analysis failed: {ai_response.get('error', 'Unknown error')}"
-            }), 500
+    The Medicaid/CHIP eligibility index is checked first. The eligibilityCheck
+    form field (or ELIGIBILITY_MODE) selects what happens for likely-eligible users:
+    "include" (default) adds the eligibility result to the normal recommendation,
+    "short_circuit" answers immediately without fetching plans or calling the LLM
+    (the response then has a message but no analysis), and "off" skips the check.
 
-        print("AI Agent analysis complete.")
-        # --- Return Response ---
-        return jsonify({
+    plans and agent let batch callers pass prefetched plans and a wrapped
+    decisionAgent; by default the plans are fetched here.
+
+    Returns:
+        A (response dict, HTTP status code) tuple.
+    """
+    eligibility_mode = str(form_data.get('eligibilityCheck') or os.getenv("ELIGIBILITY_MODE", DEFAULT_ELIGIBILITY_MODE)).lower()
+    eligibility = None
+    if eligibility_mode != 'off':
+        eligibility = eligibility_index.check(form_data)
+        if eligibility and eligibility["adultLikelyEligible"] and eligibility_mode == 'short_circuit':
+            logger.info("Profile is likely Medicaid eligible. Skipping plan analysis.",
+                        extra=fields(state=eligibility['state']))
+            return {
+                "status": "success",
+                "mode": "eligibility",
+                "message": (f"Based on your income and household size of {eligibility['householdSize']}, "
+                            f"you likely qualify for Medicaid in {eligibility['state']}. "
+                            f"Contact your state Medicaid agency to apply."),
+                "eligibility": eligibility
+            }, 200
+
+    payload, status_code = rank_plans_for_profile(form_data, mode, plans, agent)
+    if eligibility and (eligibility["adultLikelyEligible"] or eligibility["childrenLikelyEligible"]
+                        or eligibility["medicareEligible"]):
+        payload["eligibility"] = eligibility
+    return payload, status_code
+
+def rank_plans_for_profile(form_data: dict, mode: str = 'ai', plans: list = None, agent=decisionAgent):
+    """
+    Fetches the plans for a validated profile and ranks them, either locally
+    or with the AI agent.
+
+    Returns:
+        A (response dict, HTTP status code) tuple.
+    """
+    state = form_data.get('state')
+    dental_required = str(form_data.get('dentalPlanRequired', 'no')).lower() # Ensure lowercase 'yes'/'no'
+    if plans is None:
+        plans = fetch_plans(form_data)
+
+    if not plans:
+        logger.info("No plans found.", extra=fields(state=state, dental_required=dental_required))
+        return {
+            "status": "info",
+            "message": f"No matching plans found for state {state} based on your criteria.",
+            "plans": []
+        }, 200 # Return 200 OK, but with info message
+
+    logger.debug("Found plans.", extra=fields(state=state, plans=len(plans)))
+
+    # --- Local Ranking ---
+    top_k = int(os.getenv("RANKER_TOP_K", DEFAULT_TOP_K))
+    if mode == 'local':
+        # Deterministic ranking with no LLM call
+        local_response = local_recommendation(form_data, plans, top_k)
+        return {
             "status": "success",
-            "message": f"Processed {len(json_serializable_data)} plan entries for state: {state}. AI analysis complete.",
-            "analysis": ai_response # Return the structured JSON from the agent
-        })
+            "message": f"Ranked {len(plans)} plans for state: {state} locally.",
+            "mode": "local",
+            "analysis": local_response
+        }, 200
+
+    # --- Call AI Agent ---
+    # The model sees the bucketed profile (no name, age/income bands) so the
+    # result can be reused for every user in the same bucket
+    profile = rec_cache.profile_bucket(form_data)
+    # Only the best top_k plans by local score are sent to the model
+    candidate_plans = top_k_plans(profile, plans, top_k)
+    cache_key = rec_cache.recommendation_key(profile, candidate_plans)
+    ai_response = recommendation_cache.get_or_compute(
+        cache_key, lambda: agent(profile, candidate_plans)
+    )
+
+    if not ai_response or "error" in ai_response:
+        logger.warning("AI Agent error.", extra=fields(error=ai_response.get('error', 'Unknown error')))
+        # Return raw output if available and it was a JSON decode error
+        if "raw_output" in ai_response:
+             return {
+                "status": "error",
+                "message": "AI analysis failed to produce valid JSON.",
+                "raw_agent_output": ai_response["raw_output"]
+             }, 500
+        return {
+            "status": "error",
+            "message": f"AI analysis failed: {ai_response.get('error', 'Unknown error')}"
+        }, 500
+
+    # --- Return Response ---
+    return {
+        "status": "success",
+        "message": f"Processed {len(plans)} plans for state: {state}. AI analysis of the top {len(candidate_plans)} complete.",
+        "analysis": ai_response # Return the structured JSON from the agent
+    }, 200
+
+@api.route("/api/benefits_and_cost_sharing/stream", methods=["POST"])
+def stream_recommendations():
+    """
+    Streams AI recommendations as each ranked plan is generated.
 
+    Sends NDJSON (one JSON event per line) by default, or Server-Sent Events
+    when the client accepts text/event-stream or passes ?format=sse.
+    Events are {"type": "plan"|"done"|"error"|"info", ...}.
+    """
+    try:
+        form_data = request.get_json(silent=True)
+        error = validate_form_data(form_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        use_sse = (request.args.get('format') == 'sse'
+                   or 'text/event-stream' in request.headers.get('Accept', ''))
+        plans = fetch_plans(form_data)
+        profile = rec_cache.profile_bucket(form_data)
+        candidate_plans = top_k_plans(profile, plans, int(os.getenv("RANKER_TOP_K", DEFAULT_TOP_K)))
+        cache_key = rec_cache.recommendation_key(profile, candidate_plans)
     except Exception as e:
-        print(f"Error processing form data: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error preparing streamed recommendations: {str(e)}")
         return jsonify({"error": "An internal server error occurred.", "details": str(e)}), 500
 
+    def events():
+        if not plans:
+            yield {"type": "info", "message": f"No matching plans found for state {form_data.get('state')} based on your criteria."}
+            return
+        cached = recommendation_cache.get(cache_key)
+        if cached:
+            # Replay a cached analysis in the same event format
+            for plan in cached.get("ranked_plans", []):
+                yield {"type": "plan", "plan": plan}
+            yield {"type": "done", "analysis": cached}
+            return
+        for event in stream_ranked_plans(profile, candidate_plans):
+            if event["type"] == "done":
+                recommendation_cache.put(cache_key, event["analysis"])
+            yield event
+
+    def encode():
+        for event in events():
+            if use_sse:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+            else:
+                yield json.dumps(event) + "\n"
+
+    mimetype = "text/event-stream" if use_sse else "application/x-ndjson"
+    # Disable proxy buffering so each event reaches the client immediately
+    return Response(stream_with_context(encode()), mimetype=mimetype,
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api.route("/api/benefits_and_cost_sharing/batch", methods=["POST"])
+def batch_recommendations():
+    """
+    Processes many profiles in one request, e.g. for brokers.
+
+    Body: {"profiles": [{...form data...}, ...]}. Each profile is validated like
+    process_user_request. Results come back per profile, in input order, and
+    failures do not affect the other profiles. With ?async=1 the batch runs as a
+    recommendation job and 202 is returned with the job id.
+    """
+    try:
+        body = request.get_json(silent=True)
+        profiles = body.get("profiles") if isinstance(body, dict) else body
+        if not isinstance(profiles, list) or not profiles:
+            return jsonify({"error": "Expected a non-empty 'profiles' list."}), 400
+        if len(profiles) > BATCH_MAX_PROFILES:
+            return jsonify({"error": f"At most {BATCH_MAX_PROFILES} profiles per batch."}), 400
+
+        mode = str(request.args.get('mode') or 'ai').lower()
+        if request.args.get('async') in ('1', 'true'):
+            job_id = job_manager.submit(run_batch, profiles, mode)
+            return jsonify({
+                "status": "queued",
+                "jobId": job_id,
+                "statusUrl": f"/api/recommendation_jobs/{job_id}"
+            }), 202
+
+        payload, status_code = run_batch(profiles, mode)
+        return jsonify(payload), status_code
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        logger.exception(f"Error processing batch: {str(e)}")
+        return jsonify({"error": "An internal server error occurred.", "details": str(e)}), 500
+
+def run_batch(profiles: list, mode: str = 'ai'):
+    """
+    Runs build_recommendation for every profile. Profiles are grouped by
+    (state, dentalPlanRequired) so each plan set is fetched once, candidate plan
+    sets are encoded once, and LLM calls run BATCH_CONCURRENCY at a time
+    through the shared rate limiter.
+
+    Quota errors reach the rate limiter's back-off instead of turning into a
+    fallback ranking. Profiles answered with the local fallback (quota still
+    exhausted, or the LLM unavailable) count as "degraded" in the summary.
+
+    Returns:
+        A (response dict, HTTP status code) tuple.
+    """
+    results = [None] * len(profiles)
+    groups = {}
+    for i, form_data in enumerate(profiles):
+        error = validate_form_data(form_data) if isinstance(form_data, dict) else "Profile must be a JSON object"
+        if error:
+            results[i] = {"index": i, "httpStatus": 400, "status": "error", "error": error}
+            continue
+        group_key = (form_data.get('state'), str(form_data.get('dentalPlanRequired', 'no')).lower())
+        groups.setdefault(group_key, []).append(i)
+
+    encodings = {}
+    encodings_lock = threading.Lock()
+
+    def batch_agent(profile, candidate_plans):
+        # Profiles whose top-K candidates are the same share one prompt encoding
+        encoding_key = tuple(plan.get('PlanId') for plan in candidate_plans)
+        with encodings_lock:
+            if encoding_key not in encodings:
+                encodings[encoding_key] = encode_for_prompt(candidate_plans)
+            encoded = encodings[encoding_key]
+        try:
+            return call_with_rate_limit(
+                lambda: decisionAgent(profile, candidate_plans, encoded, fallback_on_error=False),
+                llm_rate_limiter, LLM_RATE_LIMIT_MAX_RETRIES, LLM_RATE_LIMIT_BACKOFF_SECONDS)
+        except Exception as e:
+            # Quota still exhausted after the back-off, the breaker open, or the LLM down
+            if not (LLM_FALLBACK_ON_ERROR and (isinstance(e, CircuitOpenError) or is_retryable_error(e))):
+                raise
+            return fallback_recommendation(profile, candidate_plans, fallback_reason(e))
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+        futures = {}
+        for (state, dental_required), indexes in groups.items():
+            try:
+                plans = fetch_plans(profiles[indexes[0]])
+            except Exception as e:
+                logger.exception(f"Error fetching plans for batch group {state}/{dental_required}: {e}")
+                for i in indexes:
+                    results[i] = {"index": i, "httpStatus": 500, "status": "error",
+                                  "error": f"Failed to retrieve plans: {e}"}
+                continue
+            logger.info("Batch group.", extra=fields(
+                state=state, dental_required=dental_required, profiles=len(indexes), plans=len(plans)))
+            for i in indexes:
+                futures[executor.submit(build_recommendation, profiles[i], mode, plans, batch_agent)] = i
+
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                payload, status_code = future.result()
+                results[i] = {"index": i, "httpStatus": status_code, **payload}
+            except Exception as e:
+                logger.exception(f"Error in batch profile {i}: {e}")
+                results[i] = {"index": i, "httpStatus": 500, "status": "error", "error": str(e)}
+
+    failed = sum(1 for result in results if result["httpStatus"] >= 400)
+    degraded = sum(1 for result in results
+                   if result["httpStatus"] < 400 and (result.get("analysis") or {}).get("fallback"))
+    return {
+        "status": "success" if failed == 0 and degraded == 0 else "partial",
+        "summary": {"total": len(profiles), "succeeded": len(profiles) - failed - degraded,
+                    "degraded": degraded, "failed": failed},
+        "results": results
+    }, 200
+
+@api.route("/api/recommendation_jobs", methods=["POST"])
+def create_recommendation_job():
+    """
+    Validates the form data and enqueues a recommendation job.
+    Returns 202 with the job id immediately; poll GET /api/recommendation_jobs/<job_id>.
+    """
+    try:
+        form_data = request.get_json(silent=True)
+        error = validate_form_data(form_data)
+        if error:
+            return jsonify({"error": error}), 400
+
+        mode = str(request.args.get('mode') or form_data.get('mode') or 'ai').lower()
+        job_id = job_manager.submit(build_recommendation, form_data, mode)
+        logger.info("Queued recommendation job.", extra=fields(job_id=job_id))
+        return jsonify({
+            "status": "queued",
+            "jobId": job_id,
+            "statusUrl": f"/api/recommendation_jobs/{job_id}"
+        }), 202
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        logger.exception(f"Error creating recommendation job: {str(e)}")
+        return jsonify({"error": "An internal server error occurred.", "details": str(e)}), 500
+
+@api.route("/api/recommendation_jobs/<job_id>", methods=["GET"])
+def get_recommendation_job(job_id):
+    """Returns the status of a recommendation job, and its result once finished."""
+    job = job_manager.get(job_id)
+    if not job:
+        return jsonify({"error": f"Job {job_id} not found or expired."}), 404
+    return jsonify(job)
+
 def get_filtered_benefits():
-    """Handles GET request to fetch plan data based on query parameters."""
+    """
+    Handles GET request to fetch plan data based on query parameters.
+
+    Rows are returned in (PlanId, _id) order, DEFAULT_PAGE_SIZE per page
+    (?limit= up to MAX_PAGE_SIZE). When more rows exist, the X-Next-Cursor
+    header holds an opaque token to pass back as ?cursor=. With ?format=ndjson
+    every matching row is streamed as newline-delimited JSON.
+
+    Filters (see filters.compile_filters) are applied by the data store: state, issuer,
+    component (StandardComponentId prefix), benefit (repeatable), dentalRequired=yes,
+    coveredOnly=1, minCopay/maxCopay and minCoinsurance/maxCoinsurance.
+    With ?explain=1 the query plan summary is returned instead of rows.
+
+    Responses carry an ETag for the dataset version and query parameters; a
+    matching If-None-Match is answered with 304 without querying the data store.
+    """
     try:
-        print("Attempting to query data collection (GET)")
-        query = {}
         # --- Extract Query Parameters ---
-        state_code = request.args.get('state')
-        # Add other potential filters from your original GET logic if needed
-        # plan_type = request.args.get('planType')
-        # min_premium = request.args.get('minPremium', type=float)
-        # max_premium = request.args.get('maxPremium', type=float)
-        dental_required = request.args.get('dentalRequired')
-
-        if state_code:
-            query["StateCode"] = state_code
-        # Add logic for other filters like plan_type, premium range etc. here
-
-        # Handle dental filter for GET request (similar to POST)
-        if dental_required:
-            dental_benefits = [
-                "Routine Dental Services (Adult)", "Dental Check-Up for Children",
-                "Basic Dental Care - Child", "Orthodontia - Child", "Major Dental Care - Child",
-                "Basic Dental Care - Adult", "Orthodontia - Adult", "Major Dental Care - Adult",
-                "Accidental Dental"
-            ]
-            if dental_required.lower() == 'yes':
-                query['BenefitName'] = {'$in': dental_benefits}
-            elif dental_required.lower() == 'no':
-                # Decide if 'no' means exclude dental-only plans or include all
-                 pass # Currently includes all if 'no'
-
-        print("Executing query (GET):", query)
-        # Add a limit to prevent overwhelming responses
-        data = list(benefits_collection.find(query).limit(200))
-        # Convert BSON/ObjectId to JSON serializable format
-        json_data = json.loads(json_util.dumps(data))
-        print(f"Successfully retrieved {len(json_data)} records (GET)")
-        return jsonify(json_data)
+        try:
+            query = compile_filters(request.args)
+        except InvalidFilterError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # --- Pagination ---
+        cursor_token = request.args.get('cursor')
+        page_size = request.args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+        if page_size < 1 or page_size > MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_PAGE_SIZE}."}), 400
+        try:
+            paged_query = keyset_query(query, cursor_token)
+        except InvalidCursorError as e:
+            return jsonify({"error": str(e)}), 400
+
+        if request.args.get('explain') in ('1', 'true'):
+            response = jsonify(data_store.explain(query, paged_query, page_size))
+            response.headers["Cache-Control"] = "no-store"
+            return response
+
+        # --- Conditional GET ---
+        # The dataset version is re-read at most once a minute (see PlanCache)
+        dataset_version = plan_cache.current_version()
+        etag = http_cache.make_etag(dataset_version, request.path, request.args) if dataset_version else None
+        matched = http_cache.matching_etag(request, etag) if etag else None
+        if matched:
+            return http_cache.not_modified(matched, HTTP_CACHE_MAX_AGE)
+
+        logger.debug("Executing query (GET).", extra=fields(query=paged_query))
+        if request.args.get('format') == 'ndjson':
+            # Whole-state export: one BSON -> JSON encode per row while iterating
+            # the cursor, so memory stays constant regardless of result size
+            def stream_rows():
+                for row in data_store.iter_rows(paged_query, NDJSON_BATCH_SIZE):
+                    yield json_util.dumps(row) + "\n"
+            response = Response(stream_with_context(stream_rows()), mimetype="application/x-ndjson")
+            return http_cache.cache_headers(response, etag, HTTP_CACHE_MAX_AGE) if etag else response
+
+        def load_page():
+            with stage(stages.QUERY):
+                rows = data_store.find_rows(paged_query, page_size)
+            next_cursor = encode_cursor(rows[-1]) if len(rows) == page_size else None
+            # Encode once; cached pages are served without re-serializing
+            with stage(stages.BSON_TO_JSON):
+                body = json_util.dumps(rows)
+            return body, len(rows), next_cursor
+
+        if cursor_token or page_size != DEFAULT_PAGE_SIZE:
+            body, row_count, next_cursor = load_page()
+        else:
+            # Cache the encoded first page so hits skip the query and the BSON encode
+            cache_key = ("rows", json_util.dumps(query, sort_keys=True))
+            body, row_count, next_cursor = plan_cache.get_or_load(cache_key, load_page)
+        logger.debug("Retrieved records (GET).", extra=fields(rows=row_count))
+
+        response = Response(body, mimetype="application/json")
+        if next_cursor:
+            # The body stays a plain list; the continuation token travels in headers
+            response.headers["X-Next-Cursor"] = next_cursor
+            next_args = request.args.to_dict()
+            next_args["cursor"] = next_cursor
+            response.headers["Link"] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+        return http_cache.cache_headers(response, etag, HTTP_CACHE_MAX_AGE) if etag else response
 
     except Exception as e:
-        print(f"Error querying MongoDB (GET): {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error querying benefit rows (GET): {str(e)}")
         return jsonify({"error": "Failed to retrieve data.", "details": str(e)}), 500
 
 
-@app.route("/api/medicaid_and_chip_eligibility", methods=["GET"])
+@api.route("/api/medicaid_and_chip_eligibility", methods=["GET"])
 def get_medicaid_and_chip_eligibility():
-    """Fetches Medicaid/CHIP eligibility data based on state."""
-    # This route remains largely the same as your original code
+    """
+    Returns Medicaid/CHIP eligibility data based on state, from the in-memory index.
+    The ETag follows the loaded table, so If-None-Match is answered from memory.
+    """
     try:
-        print("Attempting to query Medicaid/CHIP data")
-        query = {}
         state_code = request.args.get('state')
-
-        if state_code:
-            # Ensure the field name matches your MongoDB collection
-            query["State"] = state_code # Or "StateCode" if that's the field name
-
-        data = list(eligibility_collection.find(query))
-        json_data = json.loads(json_util.dumps(data))
-        print(f"Successfully retrieved {len(json_data)} Medicaid/CHIP data")
-        return jsonify(json_data)
+        eligibility_index.ensure_loaded()
+        etag = http_cache.make_etag(eligibility_index.version, request.path, request.args)
+        matched = http_cache.matching_etag(request, etag)
+        if matched:
+            return http_cache.not_modified(matched, HTTP_CACHE_MAX_AGE)
+        # Rows are matched on the collection's "State" field, as stored
+        json_data = eligibility_index.find_rows(state_code)
+        logger.debug("Retrieved Medicaid/CHIP data.", extra=fields(rows=len(json_data)))
+        return http_cache.cache_headers(jsonify(json_data), etag, HTTP_CACHE_MAX_AGE)
     except Exception as e:
-        print(f"Error querying Medicaid/CHIP data: {str(e)}")
-        print(traceback.format_exc())
+        logger.exception(f"Error querying Medicaid/CHIP data: {str(e)}")
         return jsonify({"error": "Failed to retrieve eligibility data.", "details": str(e)}), 500
+
+
+@api.route("/api/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """Returns hit/miss counters for this worker's plan and recommendation caches."""
+    return jsonify({
+        "plan_cache": plan_cache.stats(),
+        "recommendation_cache": recommendation_cache.stats(),
+        "jobs": job_manager.stats(),
+        "llm": llm_caller.stats()
+    })
+
+@api.route("/api/cache/invalidate", methods=["POST"])
+def invalidate_cache():
+    """
+    Drops this worker's plan cache and eligibility index, and reopens a snapshot data store.
+    An optional JSON body {"datasetVersion": "..."} records the new dataset version; otherwise
+    it is re-read from the data store (the meta collection, or the snapshot manifest).
+    Requires the admin token (see ADMIN_TOKEN).
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Not found."}), 404
+    if not admin_token_valid():
+        logger.warning("Rejected cache invalidation without a valid admin token.")
+        return jsonify({"error": "A valid admin token is required."}), 401
+    body = request.get_json(silent=True) or {}
+    dataset_version = body.get("datasetVersion")
+    data_store.reload()
+    if dataset_version is None:
+        dataset_version = data_store.dataset_version()
+    plan_cache.invalidate(dataset_version)
+    eligibility_index.invalidate()
+    return jsonify({"status": "success", "dataset_version": dataset_version})
+
+
+# --- App Factory ---
+STARTUP_SECONDS = None
+
+def create_app():
+    """
+    Builds the Flask app. Cheap by design: no MongoDB connection or Gemini
+    configuration happens here, both are set up on first use.
+    """
+    global STARTUP_SECONDS
+    flask_app = Flask(__name__)
+    CORS(flask_app)  # Enable CORS for all routes
+    flask_app.register_blueprint(api)
+    if STARTUP_SECONDS is None:
+        STARTUP_SECONDS = time.perf_counter() - MODULE_IMPORT_STARTED
+        logger.info("App ready.", extra=fields(startup_ms=round(STARTUP_SECONDS * 1000, 2)))
+    return flask_app
+
+# Module-level app for `flask --app api/index` and serverless runtimes; the
+# MongoClient and job threads are shared by every app created in this process
+app = create_app()
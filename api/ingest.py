@@ -0,0 +1,213 @@
+"""
+Bulk loader for the CMS public-use files queried by api/index.py.
+
+Usage:
+    python api/ingest.py benefits benefits-and-cost-sharing-puf.csv --dataset-version 2025
+    python api/ingest.py eligibility medicaid-and-chip-eligibility-levels.csv
+    python api/ingest.py indexes
+
+The CSV is streamed in fixed-size chunks, so memory stays bounded regardless
+of file size. Point MONGO_URI (or --uri) at a local mongod to test a load.
+"""
+import os
+import csv
+import sys
+import time
+import argparse
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, ReplaceOne, ASCENDING
+
+from queries import plan_summaries_pipeline
+from filters import normalized_fields, FILTER_INDEXES
+from mongo import (
+    BENEFITS_DB, BENEFITS_COLLECTION, PLAN_SUMMARIES_COLLECTION, META_COLLECTION,
+    ELIGIBILITY_DB, ELIGIBILITY_COLLECTION, client_options,
+)
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# Each load is built here, then renamed over the live collection(s)
+STAGING_SUFFIX = "_staging"
+
+
+def connect(uri: str):
+    """Creates a MongoClient with the same pool, timeout and TLS options as the API (see mongo.client_options)."""
+    return MongoClient(uri, **client_options(uri))
+
+
+def read_chunks(path: str, chunk_size: int, encoding: str):
+    """Yields lists of at most chunk_size cleaned CSV rows."""
+    with open(path, newline="", encoding=encoding) as csv_file:
+        reader = csv.DictReader(csv_file)
+        chunk = []
+        for row in reader:
+            # Strip header/value whitespace and drop empty columns to keep documents small
+            cleaned = {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and value is not None and value.strip() != ""
+            }
+            chunk.append(cleaned)
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def create_indexes(client):
+    """Creates the indexes the API endpoints filter on. Safe to run repeatedly."""
+    create_benefit_indexes(client[BENEFITS_DB][BENEFITS_COLLECTION])
+    create_summary_indexes(client[BENEFITS_DB][PLAN_SUMMARIES_COLLECTION])
+    client[ELIGIBILITY_DB][ELIGIBILITY_COLLECTION].create_index([("State", ASCENDING)], unique=True)
+    print("Indexes created.")
+
+
+def create_benefit_indexes(benefits):
+    """Creates the benefit row indexes on the given collection (live or staging)."""
+    # Upsert key for repeated (PlanId, BenefitName) rows within a load
+    benefits.create_index([("PlanId", ASCENDING), ("BenefitName", ASCENDING)], unique=True)
+    # StateCode (+ dental BenefitName $in) filters from GET/POST /api/benefits_and_cost_sharing
+    benefits.create_index([("StateCode", ASCENDING), ("BenefitName", ASCENDING)])
+    # Per-plan grouping within a state; the trailing _id also serves the
+    # (PlanId, _id) keyset pagination of GET /api/benefits_and_cost_sharing
+    benefits.create_index([("StateCode", ASCENDING), ("PlanId", ASCENDING), ("_id", ASCENDING)])
+    # Recommended indexes for the GET filter shapes (see filters.FILTER_SHAPES)
+    for keys in FILTER_INDEXES:
+        benefits.create_index(keys)
+
+
+def create_summary_indexes(summaries):
+    """Creates the plan summary index on the given collection (live or staging)."""
+    # One state's plans in PlanId order for POST /api/benefits_and_cost_sharing
+    summaries.create_index([("StateCode", ASCENDING), ("PlanId", ASCENDING)], unique=True)
+
+
+def ingest_benefits(client, path: str, chunk_size: int, encoding: str, dataset_version: str = None):
+    """
+    Loads the Benefits & Cost Sharing PUF into a staging collection, keyed on
+    (PlanId, BenefitName), builds the plan summaries from it, then renames both
+    over the live collections. Readers see either the old or the new release,
+    and plans or cells missing from the new file do not survive the load.
+
+    Returns:
+        The number of CSV rows processed.
+    """
+    database = client[BENEFITS_DB]
+    benefits = database[BENEFITS_COLLECTION + STAGING_SUFFIX]
+    # Left over from an interrupted load
+    benefits.drop()
+    # The unique (PlanId, BenefitName) index makes each upsert an index lookup;
+    # the rename keeps every index, so the live collection is ready immediately
+    create_benefit_indexes(benefits)
+
+    total_rows = 0
+    started = time.perf_counter()
+    for chunk in read_chunks(path, chunk_size, encoding):
+        operations = [
+            ReplaceOne(
+                {"PlanId": row.get("PlanId"), "BenefitName": row.get("BenefitName")},
+                # Numeric copay/coinsurance copies back the GET range filters.
+                # A repeated row replaces the earlier one, so no stale field survives
+                {**row, **normalized_fields(row)},
+                upsert=True
+            )
+            for row in chunk
+            if row.get("PlanId") and row.get("BenefitName")
+        ]
+        if operations:
+            benefits.bulk_write(operations, ordered=False)
+        total_rows += len(chunk)
+        elapsed = time.perf_counter() - started
+        print(f"Upserted {total_rows} rows ({total_rows / max(elapsed, 1e-9):.0f} rows/s)")
+
+    print("Building plan summaries...")
+    summaries = database[PLAN_SUMMARIES_COLLECTION + STAGING_SUFFIX]
+    summaries.drop()
+    benefits.aggregate(plan_summaries_pipeline(summaries.name), allowDiskUse=True)
+    create_summary_indexes(summaries)
+
+    benefits.rename(BENEFITS_COLLECTION, dropTarget=True)
+    summaries.rename(PLAN_SUMMARIES_COLLECTION, dropTarget=True)
+    print("Swapped in the new benefits and plan summary collections.")
+
+    database[META_COLLECTION].update_one(
+        {"_id": BENEFITS_COLLECTION},
+        {"$set": {
+            "dataset_version": dataset_version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+            "rows": total_rows,
+            "ingested_at": datetime.now(timezone.utc)
+        }},
+        upsert=True
+    )
+    print(f"Finished benefits ingest: {total_rows} rows in {time.perf_counter() - started:.1f}s")
+    return total_rows
+
+
+def ingest_eligibility(client, path: str, chunk_size: int, encoding: str):
+    """
+    Loads the Medicaid/CHIP eligibility levels into a staging collection, keyed
+    on State, then renames it over the live collection, so states and cells
+    missing from the new file do not keep stale thresholds.
+
+    Returns:
+        The number of CSV rows processed.
+    """
+    eligibility = client[ELIGIBILITY_DB][ELIGIBILITY_COLLECTION + STAGING_SUFFIX]
+    eligibility.drop()
+    eligibility.create_index([("State", ASCENDING)], unique=True)
+
+    total_rows = 0
+    for chunk in read_chunks(path, chunk_size, encoding):
+        operations = [
+            ReplaceOne({"State": row["State"]}, row, upsert=True)
+            for row in chunk
+            if row.get("State")
+        ]
+        if operations:
+            eligibility.bulk_write(operations, ordered=False)
+        total_rows += len(chunk)
+    if not eligibility.estimated_document_count():
+        # An empty or malformed file must not wipe the live table
+        eligibility.drop()
+        raise ValueError(f"No eligibility rows with a State found in {path}.")
+    eligibility.rename(ELIGIBILITY_COLLECTION, dropTarget=True)
+    print(f"Finished eligibility ingest: {total_rows} rows")
+    return total_rows
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Load CMS public-use files into MongoDB.")
+    parser.add_argument("--uri", default=os.getenv("MONGO_URI"), help="MongoDB URI (defaults to MONGO_URI)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per bulk_write batch")
+    parser.add_argument("--encoding", default="utf-8-sig", help="CSV file encoding")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    benefits_parser = subparsers.add_parser("benefits", help="Load the Benefits & Cost Sharing PUF")
+    benefits_parser.add_argument("path")
+    benefits_parser.add_argument("--dataset-version", help="Version tag recorded in the meta collection")
+
+    eligibility_parser = subparsers.add_parser("eligibility", help="Load the Medicaid/CHIP eligibility levels")
+    eligibility_parser.add_argument("path")
+
+    subparsers.add_parser("indexes", help="Only create the indexes")
+
+    args = parser.parse_args(argv)
+    if not args.uri:
+        parser.error("MongoDB URI not found. Pass --uri or set MONGO_URI in your .env file.")
+
+    client = connect(args.uri)
+    if args.command == "benefits":
+        ingest_benefits(client, args.path, args.chunk_size, args.encoding, args.dataset_version)
+    elif args.command == "eligibility":
+        ingest_eligibility(client, args.path, args.chunk_size, args.encoding)
+    elif args.command == "indexes":
+        create_indexes(client)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
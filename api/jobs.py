@@ -0,0 +1,192 @@
+# --- Asynchronous Recommendation Jobs ---
+# Runs the Mongo fetch plus decisionAgent on a bounded thread pool so a slow
+# Gemini round-trip no longer pins a gunicorn worker for the whole request.
+#
+# Jobs run on threads of the process that accepted them, so they need long-lived
+# worker processes (e.g. gunicorn); on serverless platforms the threads stop
+# when the response is sent. Job state is kept in memory unless a SqliteJobStore
+# is given, which lets any worker of a multi-worker server answer status polls.
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logs import get_logger
+
+logger = get_logger("jobs")
+
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE_DEPTH = 100
+DEFAULT_JOB_TTL_SECONDS = 15 * 60
+
+
+class QueueFullError(Exception):
+    """Raised when the number of queued and running jobs has reached the limit."""
+
+
+class SqliteJobStore:
+    """On-disk job state shared by all worker processes on a host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs "
+                "(job_id TEXT PRIMARY KEY, value TEXT NOT NULL, finished_at REAL)"
+            )
+
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads
+        return sqlite3.connect(self.path, timeout=5)
+
+    def put(self, job: dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, value, finished_at) VALUES (?, ?, ?)",
+                (job["jobId"], json.dumps(job, default=str), job["finishedAt"])
+            )
+
+    def get(self, job_id: str):
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_finished_before(self, cutoff: float):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+
+
+class JobManager:
+    """
+    Tracks recommendation jobs run on a bounded worker pool.
+
+    Each job moves through "queued" -> "running" -> "done" | "failed".
+    Finished jobs are kept for ttl_seconds so clients can poll for the result.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS, max_queue_depth: int = DEFAULT_MAX_QUEUE_DEPTH,
+                 ttl_seconds: float = DEFAULT_JOB_TTL_SECONDS, store: SqliteJobStore = None):
+        """
+        Args:
+            max_workers: Number of jobs run concurrently (concurrent LLM calls).
+            max_queue_depth: Maximum jobs queued or running in this process before submit() refuses new ones.
+            ttl_seconds: How long a finished job's result stays available.
+            store: Optional shared store (e.g. SqliteJobStore) so other processes can read job state.
+        """
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recommendation-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args) -> str:
+        """
+        Enqueues func(*args), which must return a (result dict, HTTP status code) tuple.
+
+        Returns:
+            The new job id.
+
+        Raises:
+            QueueFullError: If max_queue_depth jobs are already queued or running.
+        """
+        with self._lock:
+            self._expire_jobs()
+            if self._pending() >= self.max_queue_depth:
+                raise QueueFullError(f"Job queue is full ({self.max_queue_depth} jobs pending).")
+            job_id = uuid.uuid4().hex
+            job = self._jobs[job_id] = {
+                "jobId": job_id,
+                "status": "queued",
+                "createdAt": time.time(),
+                "finishedAt": None,
+                "result": None,
+                "httpStatus": None,
+            }
+        # Written before the job can run, so a poll on another worker never misses it
+        self._save(dict(job))
+        self._executor.submit(self._run, job_id, func, args)
+        return job_id
+
+    def get(self, job_id: str):
+        """
+        Returns a copy of the job's state, or None if it is unknown or expired.
+        Jobs submitted to another process are read from the store.
+        """
+        with self._lock:
+            self._expire_jobs()
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        if not self.store:
+            return None
+        try:
+            job = self.store.get(job_id)
+        except Exception as e:
+            logger.warning(f"Job store read failed: {e}")
+            return None
+        if not job:
+            return None
+        if job["finishedAt"] and time.time() - job["finishedAt"] >= self.ttl_seconds:
+            return None
+        return job
+
+    def stats(self) -> dict:
+        """Returns queue depth and concurrency settings."""
+        with self._lock:
+            return {
+                "pending": self._pending(),
+                "jobs": len(self._jobs),
+                "shared_store": self.store is not None,
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+    def _pending(self) -> int:
+        # Must be called with the lock held
+        return sum(1 for job in self._jobs.values() if job["status"] in ("queued", "running"))
+
+    def _run(self, job_id, func, args):
+        self._update(job_id, status="running")
+        try:
+            result, http_status = func(*args)
+            status = "done" if http_status < 400 else "failed"
+        except Exception as e:
+            logger.exception(f"Error in recommendation job {job_id}: {e}")
+            result, http_status, status = {"error": "An internal server error occurred.", "details": str(e)}, 500, "failed"
+        self._update(job_id, status=status, result=result, httpStatus=http_status, finishedAt=time.time())
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.update(fields)
+            job = dict(job)
+        self._save(job)
+
+    def _save(self, job):
+        if not self.store:
+            return
+        try:
+            self.store.put(job)
+        except Exception as e:
+            logger.warning(f"Job store write failed: {e}")
+
+    def _expire_jobs(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finishedAt"] and now - job["finishedAt"] >= self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if expired and self.store:
+            try:
+                self.store.delete_finished_before(now - self.ttl_seconds)
+            except Exception as e:
+                logger.warning(f"Job store cleanup failed: {e}")
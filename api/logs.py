@@ -0,0 +1,92 @@
+# --- Structured Logging ---
+# One JSON object per line on stderr, filtered by LOG_LEVEL. Large payloads
+# (form data, raw model output) are only written for a sample of requests and
+# truncated, so they don't dominate I/O under load.
+import os
+import json
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+DEFAULT_LOG_LEVEL = "INFO"
+DEFAULT_PAYLOAD_SAMPLE_RATE = 0.01
+DEFAULT_PAYLOAD_MAX_CHARS = 2000
+ROOT_LOGGER = "plans4you"
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON, merging in the fields passed with extra=fields(...)."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure():
+    """
+    Sets up the plans4you logger from LOG_LEVEL and LOG_FORMAT ("json" or "text").
+    Safe to call repeatedly; only the first call has an effect.
+
+    The first get_logger call runs this while the API modules are still being
+    imported, before index.py and agent.py call load_dotenv(), so the .env file
+    is loaded here first. Variables already set in the environment win.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        load_dotenv()
+        handler = logging.StreamHandler()
+        if os.getenv("LOG_FORMAT", "json").lower() == "text":
+            handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        else:
+            handler.setFormatter(JsonFormatter())
+        root = logging.getLogger(ROOT_LOGGER)
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", DEFAULT_LOG_LEVEL).upper())
+        root.propagate = False
+        _configured = True
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Returns the logger for a module, e.g. get_logger("agent")."""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def fields(**values) -> dict:
+    """Structured fields for a log call: logger.info("...", extra=fields(state=state))."""
+    return {"fields": values}
+
+
+def log_payload(logger: logging.Logger, message: str, payload, **values):
+    """
+    Logs a large payload. With DEBUG enabled every payload is written; at INFO only
+    a LOG_PAYLOAD_SAMPLE_RATE fraction is. Payloads are cut to LOG_PAYLOAD_MAX_CHARS.
+    """
+    if logger.isEnabledFor(logging.DEBUG):
+        level = logging.DEBUG
+    elif logger.isEnabledFor(logging.INFO) and \
+            random.random() < float(os.getenv("LOG_PAYLOAD_SAMPLE_RATE", DEFAULT_PAYLOAD_SAMPLE_RATE)):
+        level = logging.INFO
+    else:
+        return
+    text = payload if isinstance(payload, str) else json.dumps(payload, default=str)
+    max_chars = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", DEFAULT_PAYLOAD_MAX_CHARS))
+    if len(text) > max_chars:
+        text = f"{text[:max_chars]}... ({len(text)} chars)"
+    logger.log(level, message, extra=fields(payload=text, **values))
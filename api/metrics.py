@@ -0,0 +1,166 @@
+# --- Prometheus Metrics ---
+# Minimal in-process counters and histograms rendered in the Prometheus text
+# format by GET /api/metrics. Values are per worker process; Prometheus adds
+# them up across workers when scraping each one.
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Unlabeled counters are reported as 0 before their first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            series_by_key = {key: list(series) for key, series in self._series.items()}
+        samples = []
+        for key, series in sorted(series_by_key.items()):
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series):
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), count))
+            samples.append((f"{self.name}_bucket", dict(labels, le="+Inf"), series[-1]))
+            samples.append((f"{self.name}_sum", labels, series[-2]))
+            samples.append((f"{self.name}_count", labels, series[-1]))
+        return samples
+
+
+class Registry:
+    """Holds the metrics of this process and renders them for scraping."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """
+        Registers collector(), called on every render. It returns a list of
+        (name, kind, documentation, [(labels, value), ...]) tuples, for values that
+        are already counted elsewhere (e.g. the cache stats()).
+        """
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Returns all metrics in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "plans4you_stage_duration_seconds", "Time spent in each request stage (see stages.py).", ["stage"])
+REQUEST_SECONDS = REGISTRY.histogram(
+    "plans4you_request_duration_seconds", "HTTP request latency by endpoint.", ["endpoint", "method", "status"])
+LLM_ERRORS = REGISTRY.counter(
+    "plans4you_llm_errors_total", "Failed Gemini analyses by reason.", ["reason"])
+LLM_SAFETY_BLOCKS = REGISTRY.counter(
+    "plans4you_llm_safety_blocks_total", "Gemini requests blocked by safety settings.")
+LLM_RETRIES = REGISTRY.counter(
+    "plans4you_llm_retries_total", "Gemini requests retried after a retryable error.")
+LLM_HEDGES = REGISTRY.counter(
+    "plans4you_llm_hedged_requests_total", "Second Gemini requests sent because the first was slow.")
+LLM_FALLBACKS = REGISTRY.counter(
+    "plans4you_llm_fallbacks_total", "Recommendations answered by the local ranker instead of Gemini.", ["reason"])
+PROMPT_TRUNCATIONS = REGISTRY.counter(
+    "plans4you_prompt_truncations_total", "Prompts that dropped plans to fit the token budget.")
+PROMPT_PLANS_DROPPED = REGISTRY.counter(
+    "plans4you_prompt_plans_dropped_total", "Plans left out of prompts by the token budget.")
+
+
+def observe_stage(name: str, seconds: float):
+    """stages sink feeding STAGE_SECONDS."""
+    STAGE_SECONDS.observe(seconds, stage=name)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,107 @@
+# --- MongoDB Connection ---
+# The MongoClient is created on first use rather than at import, so a cold start
+# does not wait on DNS/TLS before serving, and a database blip no longer kills
+# the process. The client lives at module level and is reused by every request
+# (and every warm serverless invocation) in this process.
+import os
+import threading
+
+import certifi
+from pymongo import MongoClient
+
+from logs import get_logger
+
+logger = get_logger("mongo")
+
+# Connection pool settings, overridable through the matching MONGO_* variables
+DEFAULT_MAX_POOL_SIZE = 10
+DEFAULT_MIN_POOL_SIZE = 0
+DEFAULT_MAX_IDLE_TIME_MS = 60000
+DEFAULT_SERVER_SELECTION_TIMEOUT_MS = 5000
+DEFAULT_CONNECT_TIMEOUT_MS = 5000
+DEFAULT_SOCKET_TIMEOUT_MS = 30000
+
+# Database and collection names, matching api/ingest.py
+BENEFITS_DB = "benefits_and_cost_sharing"
+BENEFITS_COLLECTION = "data"
+PLAN_SUMMARIES_COLLECTION = "plan_summaries"
+META_COLLECTION = "meta"
+ELIGIBILITY_DB = "medicaid_and_chip_eligibility_levels"
+ELIGIBILITY_COLLECTION = "data"
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class MongoNotConfiguredError(RuntimeError):
+    """Raised when MONGO_URI is not set."""
+
+
+def client_options(uri: str) -> dict:
+    """MongoClient keyword arguments for uri, read from the environment."""
+    options = {
+        "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", DEFAULT_MAX_POOL_SIZE)),
+        "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", DEFAULT_MIN_POOL_SIZE)),
+        "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_TIME_MS", DEFAULT_MAX_IDLE_TIME_MS)),
+        "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", DEFAULT_SERVER_SELECTION_TIMEOUT_MS)),
+        "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", DEFAULT_CONNECT_TIMEOUT_MS)),
+        "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", DEFAULT_SOCKET_TIMEOUT_MS)),
+    }
+    lowered = uri.lower()
+    if lowered.startswith("mongodb+srv://") or "tls=true" in lowered or "ssl=true" in lowered:
+        options["tlsCAFile"] = certifi.where()
+    return options
+
+
+def get_client() -> MongoClient:
+    """
+    Returns the shared MongoClient, creating it on first call.
+
+    Raises:
+        MongoNotConfiguredError: If MONGO_URI is not set.
+    """
+    global _client
+    if _client is not None:
+        return _client
+    with _client_lock:
+        if _client is None:
+            uri = os.getenv("MONGO_URI")
+            if not uri:
+                raise MongoNotConfiguredError("MongoDB URI not found. Please set MONGO_URI in your .env file.")
+            logger.info("Creating MongoDB client...")
+            _client = MongoClient(uri, **client_options(uri))
+    return _client
+
+
+def benefits_db():
+    return get_client()[BENEFITS_DB]
+
+
+def benefits_collection():
+    return benefits_db()[BENEFITS_COLLECTION]
+
+
+def plan_summaries_collection():
+    return benefits_db()[PLAN_SUMMARIES_COLLECTION]
+
+
+def meta_collection():
+    return benefits_db()[META_COLLECTION]
+
+
+def eligibility_collection():
+    return get_client()[ELIGIBILITY_DB][ELIGIBILITY_COLLECTION]
+
+
+def ping():
+    """Round-trips to the server; raises if MongoDB is unreachable."""
+    get_client().admin.command('ping')
+
+
+def close():
+    """Closes the shared client; the next get_client() call creates a new one."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
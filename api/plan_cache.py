@@ -0,0 +1,145 @@
+# --- In-Process Plan Cache ---
+# The PUF only changes once a year and is partitioned by ~50 StateCodes, so
+# each worker keeps recently used (state, dental filter) results in memory
+# instead of going back to MongoDB on every request.
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from logs import get_logger
+
+logger = get_logger("plan_cache")
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+# How often the dataset version is re-read to detect a new ingest
+DEFAULT_VERSION_CHECK_SECONDS = 60
+
+
+def estimate_size(value) -> int:
+    """
+    Approximates the memory footprint of a cached value by its JSON length, plus
+    the arrays of a ranker.PlanSet's matrix.
+    """
+    matrix = getattr(value, "matrix", None)
+    return len(json.dumps(value, default=str)) + (matrix.nbytes if matrix is not None else 0)
+
+
+class PlanCache:
+    """
+    Thread-safe LRU cache with a memory budget, a TTL and dataset versioning.
+
+    Keys are tuples such as ("plans", state, dental_filter). Cached values are
+    shared between requests and must be treated as read-only by callers.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 version_loader=None, version_check_seconds: float = DEFAULT_VERSION_CHECK_SECONDS):
+        """
+        Args:
+            max_bytes: Approximate memory budget for all entries combined.
+            ttl_seconds: Maximum age of an entry before it is reloaded.
+            version_loader: Optional callable returning the current dataset version.
+                            When the version changes, the whole cache is dropped.
+            version_check_seconds: Minimum interval between version_loader calls.
+        """
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.version_loader = version_loader
+        self.version_check_seconds = version_check_seconds
+        self.dataset_version = None
+        self._last_version_check = 0.0
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """Returns the cached value for key, calling loader() to fill it on a miss."""
+        self._check_dataset_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[2] < self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry:
+                self._remove(key)
+            self.misses += 1
+
+        # Load outside the lock so a slow query doesn't block other partitions
+        value = loader()
+        self.put(key, value)
+        return value
+
+    def current_version(self):
+        """Returns the dataset version, re-read at most every version_check_seconds."""
+        self._check_dataset_version()
+        return self.dataset_version
+
+    def put(self, key, value):
+        """Stores a value, evicting least recently used entries to stay within budget."""
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, dataset_version=None):
+        """
+        Drops every entry. If dataset_version is given, it becomes the current version.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+            self.invalidations += 1
+            if dataset_version is not None:
+                self.dataset_version = dataset_version
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters and current usage."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "dataset_version": self.dataset_version,
+            }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._size -= size
+
+    def _check_dataset_version(self):
+        if not self.version_loader:
+            return
+        now = time.monotonic()
+        if now - self._last_version_check < self.version_check_seconds:
+            return
+        self._last_version_check = now
+        try:
+            version = self.version_loader()
+        except Exception as e:
+            logger.warning(f"Failed to read dataset version: {e}")
+            return
+        if version != self.dataset_version:
+            if self.dataset_version is not None:
+                logger.info(f"Dataset version changed ({self.dataset_version} -> {version}). Invalidating plan cache.")
+            self.invalidate(version)
@@ -0,0 +1,109 @@
+# --- Compact Prompt Encoder ---
+# Encodes candidate plans as a dictionary-encoded, columnar text table instead of
+# indented JSON. Repeated BenefitName/Explanation/LimitUnit strings are written
+# once, and whole plans are packed until a token budget is reached, so the
+# prompt is never cut mid-plan.
+from queries import PLAN_FIELDS
+
+DEFAULT_TOKEN_BUDGET = 8000
+# Rough tokens-per-character ratio for English text and identifiers
+CHARS_PER_TOKEN = 4
+
+# Benefit columns in table order; dictionary-encoded ones are written as s<id>
+BENEFIT_COLUMNS = [
+    ('BenefitName', True), ('CopayInnTier1', False), ('CoinsInnTier1', False),
+    ('IsCovered', False), ('QuantLimitOnSvc', False), ('LimitQty', False),
+    ('LimitUnit', True), ('Explanation', True)
+]
+
+FORMAT_DESCRIPTION = (
+    "Plans are encoded as a compact table. Lines under STRINGS map an id (s0, s1, ...) "
+    "to a text value that is referenced elsewhere by that id. Each plan starts with a "
+    "line 'PLAN <planId> | IssuerId | StandardComponentId', followed by one line per "
+    "benefit with the columns: " + " | ".join(name for name, _ in BENEFIT_COLUMNS) + ". "
+    "Empty cells mean the value was not provided."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximates the token count of text."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _cell(value) -> str:
+    # Keep the column separator and line breaks out of cell values
+    return str(value if value is not None else '').replace('|', '/').replace('\n', ' ').strip()
+
+
+class EncodedPlans:
+    """Result of encode_plans: the table text plus what did and did not fit."""
+
+    def __init__(self, text: str, included: list, dropped: list, estimated_tokens: int):
+        self.text = text
+        self.included = included
+        self.dropped = dropped
+        self.estimated_tokens = estimated_tokens
+
+    def stats(self) -> dict:
+        return {
+            "plans_included": len(self.included),
+            "plans_dropped": len(self.dropped),
+            "estimated_tokens": self.estimated_tokens,
+        }
+
+
+def encode_plans(plans_data: list, token_budget: int = DEFAULT_TOKEN_BUDGET) -> EncodedPlans:
+    """
+    Packs whole plans, in the given (best first) order, into a compact table.
+
+    Args:
+        plans_data: Grouped plan documents from queries.plan_summary_pipeline.
+        token_budget: Maximum estimated tokens for the encoded table.
+
+    Returns:
+        An EncodedPlans. Packing stops at the first plan that does not fit, so the
+        included plans are always a prefix of the ranked input. The top plan is
+        always included, even if it alone exceeds the budget.
+    """
+    strings = {}          # text -> id
+    string_lines = []
+    plan_blocks = []
+    included, dropped = [], []
+    used_tokens = estimate_tokens("STRINGS\n")
+
+    for position, plan in enumerate(plans_data):
+        new_strings = {}
+        new_string_lines = []
+
+        def ref(value):
+            text = _cell(value)
+            if not text:
+                return ''
+            string_id = strings.get(text, new_strings.get(text))
+            if string_id is None:
+                string_id = len(strings) + len(new_strings)
+                new_strings[text] = string_id
+                new_string_lines.append(f"s{string_id}={text}")
+            return f"s{string_id}"
+
+        lines = ["PLAN " + " | ".join([_cell(plan.get('PlanId'))] + [_cell(plan.get(f)) for f in PLAN_FIELDS])]
+        for benefit in plan.get('benefits', []):
+            cells = [ref(benefit.get(name)) if encoded else _cell(benefit.get(name))
+                     for name, encoded in BENEFIT_COLUMNS]
+            lines.append(" | ".join(cells))
+        block = "\n".join(lines)
+
+        cost = estimate_tokens(block + "\n") + sum(estimate_tokens(line + "\n") for line in new_string_lines)
+        # The model needs at least one plan to rank
+        if included and used_tokens + cost > token_budget:
+            dropped = [p.get('PlanId') for p in plans_data[position:]]
+            break
+
+        used_tokens += cost
+        strings.update(new_strings)
+        string_lines.extend(new_string_lines)
+        plan_blocks.append(block)
+        included.append(plan.get('PlanId'))
+
+    text = "STRINGS\n" + "\n".join(string_lines) + "\n\n" + "\n\n".join(plan_blocks)
+    return EncodedPlans(text, included, dropped, used_tokens)
@@ -0,0 +1,176 @@
+# --- MongoDB Query Builders ---
+# The Benefits & Cost Sharing PUF stores one row per (plan, benefit). These
+# helpers build server-side aggregation pipelines that collapse those rows
+# into one compact document per plan, so limits apply to plans, not rows.
+import base64
+
+from bson import ObjectId, json_util
+
+# Plan-level fields, identical on every row of a plan
+PLAN_FIELDS = ['IssuerId', 'StandardComponentId']
+
+# Benefit-level fields the AI agent actually reads
+BENEFIT_FIELDS = [
+    'BenefitName', 'CopayInnTier1', 'CoinsInnTier1', 'IsCovered',
+    'QuantLimitOnSvc', 'LimitQty', 'LimitUnit', 'Explanation'
+]
+
+# Default number of plans (not rows) returned to the agent
+DEFAULT_PLAN_LIMIT = 100
+
+# Plans fetched for ranking. The pre-ranker must see every plan in the state to
+# pick the best ones, so this is only a safety cap, far above any state's plan count
+DEFAULT_RANKING_PLAN_LIMIT = 5000
+
+
+def plan_summary_pipeline(query: dict, plan_limit: int = DEFAULT_PLAN_LIMIT, plan_fields: list = None):
+    """
+    Builds an aggregation pipeline that groups benefit rows into plans.
+
+    Args:
+        query: A MongoDB filter applied to the benefit rows (e.g. StateCode, BenefitName).
+        plan_limit: Maximum number of plans to return. None returns every plan.
+        plan_fields: Plan-level fields to keep (defaults to PLAN_FIELDS).
+
+    Returns:
+        A list of pipeline stages. Each output document looks like
+        {"PlanId": ..., "IssuerId": ..., "StandardComponentId": ..., "benefits": [{...}, ...]}
+    """
+    plan_fields = plan_fields or PLAN_FIELDS
+    projection = {'_id': 0, 'PlanId': 1}
+    for field in plan_fields + BENEFIT_FIELDS:
+        projection[field] = 1
+
+    group = {'_id': '$PlanId'}
+    for field in plan_fields:
+        group[field] = {'$first': f'${field}'}
+    group['benefits'] = {'$push': {field: f'${field}' for field in BENEFIT_FIELDS}}
+
+    pipeline = [
+        {'$match': query},
+        {'$project': projection},
+        {'$group': group},
+        # Sort on the group key so the plan limit is deterministic between calls
+        {'$sort': {'_id': 1}},
+    ]
+    if plan_limit:
+        pipeline.append({'$limit': plan_limit})
+    pipeline.append({'$project': {
+        '_id': 0,
+        'PlanId': '$_id',
+        **{field: 1 for field in plan_fields},
+        'benefits': 1
+    }})
+    return pipeline
+
+
+# --- Plan Summary Collection ---
+# api/ingest.py stores the output of plan_summary_pipeline per state, so the
+# POST handler reads one document per plan instead of grouping rows per request.
+
+def plan_summaries_pipeline(output_collection: str):
+    """
+    Builds the pipeline that (re)writes the per-state, per-plan summary collection.
+
+    The output uses the same document shape as plan_summary_pipeline, plus StateCode,
+    and replaces the target collection atomically via $out.
+    """
+    pipeline = plan_summary_pipeline({}, plan_limit=None, plan_fields=['StateCode'] + PLAN_FIELDS)
+    # Push each plan's benefits in file (_id) order; the sort is served by the
+    # (StateCode, PlanId, _id) index
+    pipeline.insert(1, {'$sort': {'StateCode': 1, 'PlanId': 1, '_id': 1}})
+    pipeline.append({'$out': output_collection})
+    return pipeline
+
+
+def stored_summary_pipeline(query: dict, plan_limit: int = DEFAULT_PLAN_LIMIT):
+    """
+    Builds the pipeline that answers plan_summary_pipeline(query, plan_limit) from
+    the summary collection. A BenefitName filter keeps only the matching benefits
+    and drops plans without any, as grouping the filtered rows would.
+
+    Returns:
+        A list of pipeline stages, or None if query filters on anything other
+        than StateCode and BenefitName (group the benefit rows instead).
+    """
+    if not set(query) <= {'StateCode', 'BenefitName'}:
+        return None
+    match = {'StateCode': query['StateCode']} if 'StateCode' in query else {}
+    benefit_names = None
+    if 'BenefitName' in query:
+        benefit_names = query['BenefitName']
+        if isinstance(benefit_names, dict):
+            if set(benefit_names) != {'$in'}:
+                return None
+            benefit_names = list(benefit_names['$in'])
+        else:
+            benefit_names = [benefit_names]
+        match['benefits.BenefitName'] = {'$in': benefit_names}
+
+    pipeline = [{'$match': match}, {'$sort': {'PlanId': 1}}]
+    if plan_limit:
+        pipeline.append({'$limit': plan_limit})
+    benefits = 1
+    if benefit_names is not None:
+        benefits = {'$filter': {
+            'input': '$benefits',
+            'as': 'benefit',
+            'cond': {'$in': ['$$benefit.BenefitName', benefit_names]}
+        }}
+    pipeline.append({'$project': {
+        '_id': 0,
+        'PlanId': 1,
+        **{field: 1 for field in PLAN_FIELDS},
+        'benefits': benefits
+    }})
+    return pipeline
+
+
+# --- Keyset Pagination ---
+# GET /api/benefits_and_cost_sharing pages through rows ordered by (PlanId, _id),
+# so a plan's benefit rows stay adjacent and every page is an index range scan.
+PAGE_SORT = [('PlanId', 1), ('_id', 1)]
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a continuation token cannot be decoded."""
+
+
+def encode_cursor(row: dict) -> str:
+    """Builds the opaque continuation token pointing just past row."""
+    payload = json_util.dumps({'p': row.get('PlanId'), 'i': row.get('_id')})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    """
+    Decodes a continuation token into {"p": PlanId, "i": _id}.
+
+    Raises:
+        InvalidCursorError: If the token is not one encode_cursor produced: both
+            keys must be present, PlanId a string and _id an ObjectId (MongoDB)
+            or a row position (snapshot).
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    except Exception as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}")
+    if not isinstance(position, dict) or not isinstance(position.get('p'), str):
+        raise InvalidCursorError("Invalid cursor: missing or malformed PlanId position.")
+    row_id = position.get('i')
+    if not (isinstance(row_id, ObjectId) or (isinstance(row_id, int) and not isinstance(row_id, bool))):
+        raise InvalidCursorError("Invalid cursor: missing or malformed row position.")
+    return {'p': position['p'], 'i': row_id}
+
+
+def keyset_query(query: dict, token: str = None) -> dict:
+    """Restricts query to rows after the position in token (if any)."""
+    if not token:
+        return query
+    position = decode_cursor(token)
+    after = {'$or': [
+        {'PlanId': {'$gt': position['p']}},
+        {'PlanId': position['p'], '_id': {'$gt': position['i']}},
+    ]}
+    return {'$and': [query, after]} if query else after
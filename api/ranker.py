@@ -0,0 +1,222 @@
+# --- Deterministic Plan Pre-Ranker ---
+# Scores every candidate plan locally from its cost-sharing fields so only the
+# top-K plans are sent to Gemini, and so a ranking can be produced with no
+# LLM call at all (mode=local).
+import re
+from functools import lru_cache
+
+import numpy as np
+
+DEFAULT_TOP_K = 10
+
+# Assumed allowed amount of a single service, used to turn coinsurance into dollars
+REFERENCE_SERVICE_COST = 200.0
+# Expected out-of-pocket cost of a benefit the plan does not cover
+UNCOVERED_COST = 500.0
+# Extra expected cost when cost-sharing only applies after the deductible
+AFTER_DEDUCTIBLE_PENALTY = 75.0
+# Extra expected cost per benefit with a quantity limit on the service
+LIMIT_PENALTY = 10.0
+
+_AMOUNT_RE = re.compile(r'(\d+(?:,\d{3})*(?:\.\d+)?)')
+
+
+@lru_cache(maxsize=4096)
+def parse_copay(value: str) -> float:
+    """Parses CopayInnTier1 (e.g. "$25.00 Copay after deductible", "No Charge") into dollars."""
+    text = (value or '').strip().lower()
+    if not text or text.startswith('not applicable') or text.startswith('no charge'):
+        return 0.0
+    match = _AMOUNT_RE.search(text)
+    return float(match.group(1).replace(',', '')) if match else 0.0
+
+
+@lru_cache(maxsize=4096)
+def parse_coinsurance(value: str) -> float:
+    """Parses CoinsInnTier1 (e.g. "20.00% Coinsurance after deductible") into a 0-1 fraction."""
+    text = (value or '').strip().lower()
+    if not text or text.startswith('not applicable') or text.startswith('no charge'):
+        return 0.0
+    match = _AMOUNT_RE.search(text)
+    return float(match.group(1).replace(',', '')) / 100.0 if match else 0.0
+
+
+def parse_is_covered(value: str) -> float:
+    """Parses IsCovered into 1.0 (covered) or 0.0."""
+    return 1.0 if str(value or '').strip().lower() == 'covered' else 0.0
+
+
+def parse_limit_qty(value) -> float:
+    """Parses LimitQty into a number, 0.0 when there is no limit."""
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _after_deductible(*values) -> float:
+    return 1.0 if any('after deductible' in str(v or '').lower() for v in values) else 0.0
+
+
+def _to_number(value, default: float) -> float:
+    """Reads the first number in value, so "$52,000" and age bands like "30-39" both parse."""
+    match = _AMOUNT_RE.search(str(value if value is not None else ''))
+    return float(match.group(1).replace(',', '')) if match else default
+
+
+def benefit_weight(benefit_name: str, user_profile: dict) -> float:
+    """
+    Weights a benefit by how relevant it is to the user's profile
+    (dental preference, dependents and age).
+    """
+    name = benefit_name.lower()
+    age = _to_number(user_profile.get('age'), 40.0)
+    dependents = _to_number(user_profile.get('dependents'), 0.0)
+    wants_dental = str(user_profile.get('dentalPlanRequired', 'no')).lower() == 'yes'
+
+    weight = 1.0
+    if 'dental' in name or 'orthodontia' in name:
+        weight *= 2.0 if wants_dental else 0.25
+    if 'child' in name or 'pediatric' in name or 'well baby' in name:
+        # Child benefits only matter with dependents, more so for larger families
+        weight *= 0.5 * dependents if dependents > 0 else 0.1
+    if age >= 50 and ('drug' in name or 'specialist' in name or 'imaging' in name):
+        weight *= 1.5
+    if age < 30 and ('emergency' in name or 'urgent care' in name):
+        weight *= 1.25
+    return weight
+
+
+class PlanMatrix:
+    """
+    The profile-independent part of scoring: each plan's parsed expected cost
+    per benefit (one column per distinct benefit name) and its coverage.
+    Parsing every benefit row is the expensive step, so it runs once per plan set.
+    """
+
+    def __init__(self, plans: list):
+        # Column per distinct benefit name across all plans
+        benefit_index = {}
+        for plan in plans:
+            for benefit in plan.get('benefits', []):
+                benefit_index.setdefault(benefit.get('BenefitName', ''), len(benefit_index))
+
+        shape = (len(plans), len(benefit_index))
+        copay = np.zeros(shape)
+        coins = np.zeros(shape)
+        covered = np.zeros(shape)
+        limited = np.zeros(shape)
+        deductible = np.zeros(shape)
+        present = np.zeros(shape, dtype=bool)
+
+        for row, plan in enumerate(plans):
+            for benefit in plan.get('benefits', []):
+                col = benefit_index[benefit.get('BenefitName', '')]
+                copay_text = benefit.get('CopayInnTier1')
+                coins_text = benefit.get('CoinsInnTier1')
+                copay[row, col] = parse_copay(copay_text)
+                coins[row, col] = parse_coinsurance(coins_text)
+                covered[row, col] = parse_is_covered(benefit.get('IsCovered'))
+                limited[row, col] = parse_limit_qty(benefit.get('LimitQty')) > 0
+                deductible[row, col] = _after_deductible(copay_text, coins_text)
+                present[row, col] = True
+
+        # Expected cost per benefit; missing or uncovered benefits cost UNCOVERED_COST
+        cost = (copay + coins * REFERENCE_SERVICE_COST
+                + deductible * AFTER_DEDUCTIBLE_PENALTY + limited * LIMIT_PENALTY)
+        is_covered = present & (covered > 0)
+        self.benefit_names = list(benefit_index)
+        self.cost = np.where(is_covered, cost, UNCOVERED_COST)
+        self.coverage = is_covered.mean(axis=1) if shape[1] else np.zeros(len(plans))
+        self.plan_ids = np.array([str(plan.get('PlanId', '')) for plan in plans])
+
+    @property
+    def nbytes(self) -> int:
+        return self.cost.nbytes + self.coverage.nbytes + self.plan_ids.nbytes
+
+    def score(self, user_profile: dict):
+        """Returns (scores, coverage) arrays for user_profile; see score_plans."""
+        weights = np.array([benefit_weight(name, user_profile) for name in self.benefit_names])
+        total_weight = weights.sum() or 1.0
+        return self.cost @ weights / total_weight, self.coverage
+
+
+class PlanSet(list):
+    """
+    A list of grouped plan documents that carries its PlanMatrix. The plan cache
+    stores plans as a PlanSet, so each request only computes its profile weights.
+    Slices are plain lists.
+    """
+
+    def __init__(self, plans):
+        super().__init__(plans)
+        self.matrix = PlanMatrix(self)
+
+
+def plan_matrix(plans: list) -> PlanMatrix:
+    """The cached matrix of a PlanSet, or a new one for a plain list."""
+    return plans.matrix if isinstance(plans, PlanSet) else PlanMatrix(plans)
+
+
+def score_plans(user_profile: dict, plans: list):
+    """
+    Scores all plans in one batched NumPy pass.
+
+    Args:
+        user_profile: The POSTed form data (age, dependents, dentalPlanRequired, ...).
+        plans: Grouped plan documents from queries.plan_summary_pipeline, ideally
+               a PlanSet so the parsed matrices are reused.
+
+    Returns:
+        A tuple (scores, coverage) of arrays aligned with plans. Scores are the
+        profile-weighted expected out-of-pocket cost per service (lower is better);
+        coverage is the fraction of the state's benefits each plan covers.
+    """
+    if not plans:
+        return np.zeros(0), np.zeros(0)
+    return plan_matrix(plans).score(user_profile)
+
+
+def rank_plans(user_profile: dict, plans: list, top_k: int = None):
+    """
+    Returns (plan, score, coverage) tuples sorted best first, optionally cut to top_k.
+    Ties are broken by PlanId so the ranking is deterministic.
+    """
+    if not plans:
+        return []
+    matrix = plan_matrix(plans)
+    scores, coverage = matrix.score(user_profile)
+    # np.lexsort sorts by the last key first
+    order = np.lexsort((matrix.plan_ids, scores))
+    if top_k:
+        order = order[:top_k]
+    return [(plans[i], float(scores[i]), float(coverage[i])) for i in order]
+
+
+def top_k_plans(user_profile: dict, plans: list, top_k: int = DEFAULT_TOP_K) -> list:
+    """Returns the top_k plan documents, best first."""
+    return [plan for plan, _, _ in rank_plans(user_profile, plans, top_k)]
+
+
+def local_recommendation(user_profile: dict, plans: list, top_k: int = DEFAULT_TOP_K) -> dict:
+    """
+    Produces a ranking in the same format as decisionAgent without calling the LLM.
+    """
+    ranked = rank_plans(user_profile, plans, top_k)
+    if not ranked:
+        return {"error": "No plan data provided to the local ranker."}
+
+    ranked_plans = []
+    for rank, (plan, score, coverage) in enumerate(ranked, start=1):
+        ranked_plans.append({
+            "planId": plan.get('PlanId'),
+            "rank": rank,
+            "isBestPlan": rank == 1,
+            "score": round(score, 2),
+            "justification": (
+                f"Estimated out-of-pocket cost of ${score:.2f} per service, weighted for your "
+                f"age, dependents and dental preference. Covers {coverage:.0%} of the "
+                f"benefits offered by plans in your state."
+            )
+        })
+    return {"best_plan_id": ranked_plans[0]["planId"], "ranked_plans": ranked_plans}
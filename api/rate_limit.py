@@ -0,0 +1,63 @@
+# --- LLM Rate Limiting ---
+# Batch runs fire many decisionAgent calls. A shared token bucket keeps them under
+# the Gemini per-minute quota, and quota errors are retried with backoff instead
+# of failing the profile.
+import time
+import random
+import threading
+
+from resilience import is_quota_error
+from logs import get_logger
+
+logger = get_logger("rate_limit")
+
+DEFAULT_REQUESTS_PER_MINUTE = 60
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_SECONDS = 2.0
+
+
+class RateLimiter:
+    """Thread-safe token bucket allowing requests_per_minute calls, with small bursts."""
+
+    def __init__(self, requests_per_minute: float = DEFAULT_REQUESTS_PER_MINUTE, burst: int = None):
+        self.rate = requests_per_minute / 60.0
+        self.capacity = burst or max(1, int(requests_per_minute // 10))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a request may be made."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def call_with_rate_limit(func, limiter: RateLimiter, max_retries: int = DEFAULT_MAX_RETRIES,
+                         backoff_seconds: float = DEFAULT_BACKOFF_SECONDS):
+    """
+    Calls func() through the limiter and returns its result, retrying with jittered
+    exponential backoff while it raises a quota error (see resilience.is_quota_error).
+
+    Raises:
+        Exception: The quota error once max_retries is used up, or any other error at once.
+    """
+    attempt = 0
+    while True:
+        limiter.acquire()
+        try:
+            return func()
+        except Exception as e:
+            if not is_quota_error(e) or attempt >= max_retries:
+                raise
+            delay = backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5)
+            logger.warning(f"LLM rate limit hit, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,257 @@
+# --- Recommendation Cache ---
+# Many users share the same state, dental choice, age band, income band and
+# dependent count. AI recommendations are cached per normalized profile bucket
+# plus a hash of the plan data sent, so equivalent requests reuse one LLM call.
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from logs import get_logger
+
+logger = get_logger("recommendation_cache")
+
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+# How long a coalesced request waits for the in-flight call before giving up
+DEFAULT_WAIT_SECONDS = 120
+
+AGE_BAND_WIDTH = 10
+INCOME_BAND_WIDTH = 10000
+MAX_DEPENDENTS_BUCKET = 5
+
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+
+
+def _parse_number(value) -> float:
+    """Parses numbers such as 34, "34" or "$52,000.00". Returns None if there is none."""
+    match = _NUMBER_RE.search(str(value if value is not None else '').replace(',', ''))
+    return float(match.group()) if match else None
+
+
+def profile_bucket(form_data: dict) -> dict:
+    """
+    Normalizes a user profile into the bucket used for caching and for the prompt.
+
+    The name is dropped and age/income are replaced by bands, so a cached
+    justification never quotes another user's exact details.
+    """
+    age = _parse_number(form_data.get('age'))
+    income = _parse_number(form_data.get('income'))
+    dependents = _parse_number(form_data.get('dependents'))
+
+    if age is not None:
+        age_low = int(age) // AGE_BAND_WIDTH * AGE_BAND_WIDTH
+        age_band = f"{age_low}-{age_low + AGE_BAND_WIDTH - 1}"
+    else:
+        age_band = 'unknown age'
+    if income is not None:
+        income_low = int(income) // INCOME_BAND_WIDTH * INCOME_BAND_WIDTH
+        income_band = f"${income_low:,}-${income_low + INCOME_BAND_WIDTH - 1:,}"
+    else:
+        income_band = 'unknown income'
+    if dependents is not None:
+        dependents = min(int(dependents), MAX_DEPENDENTS_BUCKET)
+
+    return {
+        'name': 'the user',
+        'age': age_band,
+        'income': income_band,
+        'dependents': dependents if dependents is not None else 'unknown number of',
+        'state': str(form_data.get('state', '')).upper(),
+        'dentalPlanRequired': 'yes' if str(form_data.get('dentalPlanRequired', 'no')).lower() == 'yes' else 'no',
+    }
+
+
+def recommendation_key(bucket: dict, plans: list) -> str:
+    """Hashes a profile bucket together with the exact plan data sent to the model."""
+    payload = json.dumps({'profile': bucket, 'plans': plans}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SqliteBackend:
+    """On-disk store so cached recommendations survive restarts and are shared by workers."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        # A short-lived connection per call keeps this safe across threads
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key: str, ttl_seconds: float):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, stored_at FROM recommendations WHERE key = ?", (key,)
+            ).fetchone()
+        if not row or time.time() - row[1] >= ttl_seconds:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: dict):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO recommendations (key, value, stored_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time())
+            )
+
+
+class _InFlight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _cacheable(result) -> bool:
+    # Fallback rankings stand in for an unavailable LLM and must not outlive the outage
+    return bool(result) and "error" not in result and not result.get("fallback")
+
+
+class RecommendationCache:
+    """
+    LRU/TTL cache of AI recommendations with single-flight coalescing:
+    concurrent misses for the same key share one computation.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS,
+                 backend=None, wait_seconds: float = DEFAULT_WAIT_SECONDS):
+        """
+        Args:
+            max_entries: Maximum entries kept in memory.
+            ttl_seconds: Maximum age of a cached recommendation.
+            backend: Optional persistent store (e.g. SqliteBackend) behind the memory layer.
+            wait_seconds: How long coalesced callers wait for the in-flight call.
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend
+        self.wait_seconds = wait_seconds
+        self._entries = OrderedDict()  # key -> (value, stored_at)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key: str, compute):
+        """
+        Returns the cached recommendation for key, or runs compute() once for all
+        concurrent callers. Errors and fallback rankings (see _cacheable) are never cached.
+        """
+        with self._lock:
+            cached = self._get_memory(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            in_flight = self._in_flight.get(key)
+            is_leader = in_flight is None
+            if is_leader:
+                in_flight = self._in_flight[key] = _InFlight()
+            else:
+                self.coalesced += 1
+
+        if not is_leader:
+            if not in_flight.event.wait(self.wait_seconds):
+                return {"error": "Timed out waiting for an identical in-flight AI request."}
+            if in_flight.error:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            result = self._get_backend(key)
+            if result is None:
+                with self._lock:
+                    self.misses += 1
+                result = compute()
+                if _cacheable(result):
+                    self._store(key, result)
+            in_flight.result = result
+            return result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            in_flight.event.set()
+
+    def get(self, key: str):
+        """Returns the cached recommendation for key, or None. Does not coalesce."""
+        with self._lock:
+            cached = self._get_memory(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        value = self._get_backend(key)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+        return value
+
+    def put(self, key: str, value: dict):
+        """Stores a recommendation computed outside get_or_compute (e.g. a streamed one)."""
+        if _cacheable(value):
+            self._store(key, value)
+
+    def stats(self) -> dict:
+        """Returns hit/miss/coalescing counters."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "persistent": self.backend is not None,
+            }
+
+    def _get_memory(self, key):
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        if time.time() - entry[1] >= self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def _get_backend(self, key):
+        if not self.backend:
+            return None
+        try:
+            value = self.backend.get(key, self.ttl_seconds)
+        except Exception as e:
+            logger.warning(f"Recommendation cache backend read failed: {e}")
+            return None
+        if value is not None:
+            with self._lock:
+                self.disk_hits += 1
+                self._put_memory(key, value)
+        return value
+
+    def _store(self, key, value):
+        with self._lock:
+            self._put_memory(key, value)
+        if self.backend:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                logger.warning(f"Recommendation cache backend write failed: {e}")
+
+    def _put_memory(self, key, value):
+        self._entries[key] = (value, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,330 @@
+# --- LLM Call Resilience ---
+# Wraps each Gemini request in a deadline, retries retryable upstream errors
+# with jittered backoff, optionally hedges slow requests with a second one, and
+# trips a circuit breaker after repeated failures so callers can answer with a
+# cheap fallback instead of waiting on an unhealthy upstream.
+import re
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import metrics
+from logs import get_logger, fields
+
+logger = get_logger("resilience")
+
+DEFAULT_DEADLINE_SECONDS = 30.0
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_BACKOFF_SECONDS = 0.5
+# Hedging is off by default (0); e.g. 95 sends a second request once the first
+# has taken longer than the p95 of recent successful calls
+DEFAULT_HEDGE_PERCENTILE = 0
+DEFAULT_HEDGE_MIN_SAMPLES = 20
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_RESET_SECONDS = 30.0
+DEFAULT_MAX_CONCURRENCY = 32
+LATENCY_WINDOW = 200
+
+# google.api_core exception class names and HTTP codes worth retrying. Quota
+# errors (429) are retryable too, but only after a back-off of seconds, so they
+# are left to the caller's rate limiter (see rate_limit.call_with_rate_limit)
+_QUOTA_ERROR_NAMES = {"ResourceExhausted", "TooManyRequests"}
+_RETRYABLE_ERROR_NAMES = {
+    "ServiceUnavailable", "DeadlineExceeded", "InternalServerError", "BadGateway", "GatewayTimeout", "Aborted",
+} | _QUOTA_ERROR_NAMES
+_QUOTA_CODE = 429
+_RETRYABLE_CODES = {_QUOTA_CODE, 500, 502, 503, 504}
+# Status codes only count where a status is reported: at the start of the message
+# ("503 Service Unavailable", as google.api_core formats errors), which wins, or
+# after "status"/"code"/"HTTP" - never as any number inside the text ("1500 tokens")
+_LEADING_STATUS_RE = re.compile(r'^\s*([1-5]\d\d)\b')
+_REPORTED_STATUS_RE = re.compile(r'\b(?:status(?: code)?|code|http)[\s:=]*([1-5]\d\d)\b', re.IGNORECASE)
+_QUOTA_MARKERS = ("resource exhausted", "resource has been exhausted")
+_RETRYABLE_MARKERS = ("service unavailable", "timed out", "deadline exceeded", "connection reset") + _QUOTA_MARKERS
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when no response arrived before the request deadline."""
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+
+def _message(error: Exception) -> str:
+    return str(getattr(error, "message", None) or error)
+
+
+def _reported_status(error: Exception):
+    """The HTTP status carried by an upstream error (its code, or one reported in the message), or None."""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    message = _message(error)
+    match = _LEADING_STATUS_RE.match(message) or _REPORTED_STATUS_RE.search(message)
+    return int(match.group(1)) if match else None
+
+
+def is_quota_error(error: Exception) -> bool:
+    """True for upstream quota/rate-limit errors (429, ResourceExhausted)."""
+    if type(error).__name__ in _QUOTA_ERROR_NAMES:
+        return True
+    status = _reported_status(error)
+    if status is not None:
+        return status == _QUOTA_CODE
+    return any(marker in _message(error).lower() for marker in _QUOTA_MARKERS)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """True for timeouts, connection errors, 429s and 5xx responses; False for e.g. invalid requests."""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if type(error).__name__ in _RETRYABLE_ERROR_NAMES:
+        return True
+    status = _reported_status(error)
+    if status is not None:
+        # Any other status (e.g. 400) is a rejected request, whatever the message says
+        return status in _RETRYABLE_CODES
+    return any(marker in _message(error).lower() for marker in _RETRYABLE_MARKERS)
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call durations."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, percent: float):
+        """Returns the nearest-rank percentile in seconds, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(round(percent / 100 * len(samples))) - 1))
+        return samples[index]
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failed calls. After reset_seconds
+    one trial call is let through (half-open); its outcome closes or re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = DEFAULT_FAILURE_THRESHOLD, reset_seconds: float = DEFAULT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Returns True if a call may go to the upstream now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_seconds:
+                # Let one trial call through; another follows if it never reports back
+                self.state = self.HALF_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit breaker closed.")
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                logger.warning("LLM circuit breaker opened.", extra=fields(
+                    failures=self.failures, reset_seconds=self.reset_seconds))
+
+
+class ResilientCaller:
+    """
+    Runs upstream calls under a deadline, retry, hedging and circuit breaker policy.
+    """
+
+    def __init__(self, deadline_seconds: float = DEFAULT_DEADLINE_SECONDS, max_retries: int = DEFAULT_MAX_RETRIES,
+                 backoff_seconds: float = DEFAULT_BACKOFF_SECONDS, hedge_percentile: float = DEFAULT_HEDGE_PERCENTILE,
+                 hedge_min_samples: int = DEFAULT_HEDGE_MIN_SAMPLES, breaker: CircuitBreaker = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Args:
+            deadline_seconds: Total time allowed per call, including retries and hedges.
+            max_retries: Retries after the first attempt, for retryable errors only.
+            backoff_seconds: Base delay, doubled per retry and jittered by +/-50%.
+            hedge_percentile: Latency percentile after which a second request is sent (0 disables hedging).
+            hedge_min_samples: Successful calls observed before hedging starts.
+            breaker: CircuitBreaker to use; a default one is created if omitted.
+            max_concurrency: Threads available for upstream requests. Requests abandoned at
+                             the deadline keep their thread until the upstream answers.
+        """
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+        self._lock = threading.Lock()
+
+    def call(self, func):
+        """
+        Calls func() (one upstream request) and returns its result.
+
+        Raises:
+            CircuitOpenError: If the breaker is open; func is not called.
+            LLMTimeoutError: If the deadline passed without a response.
+            Exception: The last upstream error once retries are exhausted, or
+                       immediately for non-retryable and quota errors.
+
+        Quota errors (see is_quota_error) are neither retried here nor counted as
+        breaker failures: the upstream is healthy, and waiting out the quota is
+        the rate limiter's job.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM circuit breaker is open.")
+        deadline = time.monotonic() + self.deadline_seconds
+        attempt = 0
+        while True:
+            try:
+                result = self._attempt(func, deadline)
+            except Exception as e:
+                if is_quota_error(e):
+                    raise
+                retryable = is_retryable_error(e)
+                remaining = deadline - time.monotonic()
+                if retryable and attempt < self.max_retries and remaining > 0:
+                    delay = min(self.backoff_seconds * (2 ** attempt) * random.uniform(0.5, 1.5), remaining)
+                    with self._lock:
+                        self.retries += 1
+                    metrics.LLM_RETRIES.inc()
+                    logger.warning(f"Retryable LLM error, retrying in {delay:.2f}s "
+                                   f"(attempt {attempt + 1}/{self.max_retries}): {e}")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                if retryable:
+                    self.breaker.record_failure()
+                else:
+                    # The upstream answered; the request itself was bad
+                    self.breaker.record_success()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def stream(self, func):
+        """
+        Calls func() (one streaming upstream request) and yields its chunks. The
+        request and every chunk are read on the caller's thread pool, so streams
+        share max_concurrency with call(), and the time spent waiting on the
+        upstream counts against deadline_seconds. Time the consumer spends
+        between chunks does not. Streams are not retried or hedged, and the
+        breaker is left to the caller, which knows whether anything was sent.
+
+        Raises:
+            LLMTimeoutError: If the upstream waits add up to more than the deadline.
+            Exception: Any error raised by func() or while reading a chunk.
+        """
+        remaining = self.deadline_seconds
+        sentinel = object()
+        response = None
+        while True:
+            started = time.monotonic()
+            if response is None:
+                future = self._executor.submit(func)
+            else:
+                future = self._executor.submit(next, response, sentinel)
+            done, _ = wait([future], timeout=max(0.0, remaining))
+            remaining -= time.monotonic() - started
+            if not done:
+                # The worker thread stays busy until the upstream answers
+                future.cancel()
+                raise LLMTimeoutError(f"LLM stream did not finish within {self.deadline_seconds:.1f}s.")
+            result = future.result()
+            if response is None:
+                response = iter(result)
+                continue
+            if result is sentinel:
+                return
+            yield result
+
+    def stats(self) -> dict:
+        with self._lock:
+            retries, hedges = self.retries, self.hedges
+        return {
+            "circuit_state": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "consecutive_failures": self.breaker.failures,
+            "retries": retries,
+            "hedges": hedges,
+            "latency_p50_seconds": self.latencies.percentile(50),
+            "latency_p95_seconds": self.latencies.percentile(95),
+        }
+
+    def _hedge_delay(self):
+        if not self.hedge_percentile or self.latencies.count() < self.hedge_min_samples:
+            return None
+        return self.latencies.percentile(self.hedge_percentile)
+
+    def _timed(self, func):
+        started = time.monotonic()
+        result = func()
+        self.latencies.observe(time.monotonic() - started)
+        return result
+
+    def _attempt(self, func, deadline: float):
+        pending = {self._executor.submit(self._timed, func)}
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None:
+            done, _ = wait(pending, timeout=max(0.0, min(hedge_delay, deadline - time.monotonic())))
+            if not done and time.monotonic() < deadline:
+                with self._lock:
+                    self.hedges += 1
+                metrics.LLM_HEDGES.inc()
+                pending.add(self._executor.submit(self._timed, func))
+
+        # The first successful response wins; the other one is abandoned
+        error = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        if error is not None and not pending:
+            raise error
+        raise LLMTimeoutError(f"No LLM response within {self.deadline_seconds:.1f}s.")
@@ -0,0 +1,438 @@
+"""
+Read-only columnar snapshot of the Benefits & Cost Sharing PUF.
+
+The PUF is a static yearly file, so instead of querying MongoDB the API can read
+a snapshot built once from the CSVs. Every string column is dictionary encoded
+(sorted dictionary, so code order is value order) and stored as a .npy array of
+codes; numeric columns are float .npy arrays. Rows are sorted by (StateCode,
+PlanId, file order), so each state and each plan is one contiguous row range.
+All arrays are opened memory-mapped: worker processes share the page cache and
+a lookup by state or plan only touches that range.
+
+Usage:
+    python api/snapshot.py build benefits-and-cost-sharing-puf.csv --out snapshot \\
+        --eligibility medicaid-and-chip-eligibility-levels.csv --dataset-version 2025
+
+Serve it with DATA_BACKEND=snapshot SNAPSHOT_PATH=snapshot (see api/datastore.py).
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+
+from filters import normalized_fields, COPAY_AMOUNT_FIELD, COINSURANCE_PERCENT_FIELD
+from ingest import read_chunks, DEFAULT_CHUNK_SIZE
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+ELIGIBILITY_FILE = "eligibility.json"
+
+NUMBER_COLUMNS = (COPAY_AMOUNT_FIELD, COINSURANCE_PERCENT_FIELD)
+# Columns every snapshot has; rows are unique on (PlanId, BenefitName)
+KEY_COLUMNS = ("StateCode", "PlanId", "BenefitName")
+
+_RANGE_OPERATORS = ('$gt', '$gte', '$lt', '$lte')
+
+
+class UnsupportedQueryError(ValueError):
+    """Raised for query operators the snapshot does not evaluate."""
+
+
+# --- Reading ---
+
+def _compare_numbers(values, operator: str, operand):
+    """Vectorized comparison with MongoDB semantics: missing (NaN) never matches."""
+    if operator == '$in':
+        numbers = [value for value in operand if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        return np.isin(values, numbers)
+    if not isinstance(operand, (int, float)) or isinstance(operand, bool):
+        return np.zeros(len(values), dtype=bool)
+    if operator == '$eq':
+        return values == operand
+    if operator == '$gt':
+        return values > operand
+    if operator == '$gte':
+        return values >= operand
+    if operator == '$lt':
+        return values < operand
+    if operator == '$lte':
+        return values <= operand
+    raise UnsupportedQueryError(f"Unsupported operator for a numeric field: {operator}")
+
+
+class StringColumn:
+    """Dictionary-encoded column: codes (-1 = missing) into a sorted UTF-8 dictionary."""
+
+    def __init__(self, codes, strings, offsets):
+        self.codes = codes
+        self._strings = strings
+        self._offsets = offsets
+        self._decoded = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def value(self, code: int) -> str:
+        value = self._decoded.get(code)
+        if value is None:
+            start, end = self._offsets[code], self._offsets[code + 1]
+            value = bytes(self._strings[start:end]).decode('utf-8')
+            self._decoded[code] = value
+        return value
+
+    def bound(self, value: str, right: bool = False) -> int:
+        """Binary search: the first code whose value is >= value (> value if right)."""
+        low, high = 0, len(self)
+        while low < high:
+            middle = (low + high) // 2
+            current = self.value(middle)
+            if current < value or (right and current == value):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, value) -> int:
+        """Returns the code for value, or -1 if it does not occur."""
+        if not isinstance(value, str):
+            return -1
+        code = self.bound(value)
+        return code if code < len(self) and self.value(code) == value else -1
+
+    def compare(self, operator: str, operand, rows):
+        codes = self.codes[rows]
+        if operator == '$eq':
+            code = self.find(operand)
+            return codes == code if code >= 0 else np.zeros(len(rows), dtype=bool)
+        if operator == '$in':
+            return np.isin(codes, [code for code in map(self.find, operand) if code >= 0])
+        if operator == '$regex':
+            # Evaluated once per distinct value rather than once per row
+            pattern = re.compile(operand)
+            return np.isin(codes, [code for code in range(len(self)) if pattern.search(self.value(code))])
+        if operator in _RANGE_OPERATORS:
+            if not isinstance(operand, str):
+                return np.zeros(len(rows), dtype=bool)
+            present = codes >= 0
+            if operator == '$gt':
+                return codes >= self.bound(operand, right=True)
+            if operator == '$gte':
+                return codes >= self.bound(operand)
+            if operator == '$lt':
+                return present & (codes < self.bound(operand))
+            return present & (codes < self.bound(operand, right=True))
+        raise UnsupportedQueryError(f"Unsupported operator for a string field: {operator}")
+
+
+class NumberColumn:
+    """Float column; NaN marks a missing value."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def compare(self, operator: str, operand, rows):
+        return _compare_numbers(self.values[rows], operator, operand)
+
+
+def _load_array(path: str):
+    # A plain ndarray view of the mapping skips np.memmap's per-access overhead
+    return np.load(path, mmap_mode='r').view(np.ndarray)
+
+
+def _load_strings(path: str):
+    # np.memmap cannot map an empty file
+    if not os.path.getsize(path):
+        return np.zeros(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode='r').view(np.ndarray)
+
+
+class Snapshot:
+    """
+    Memory-mapped reader for a snapshot directory written by build_snapshot().
+
+    select() evaluates the subset of the MongoDB query language produced by
+    filters.compile_filters and queries.keyset_query: equality, $in, $regex,
+    $gt/$gte/$lt/$lte, $and and $or. Each row's _id is its position.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as manifest_file:
+            self.manifest = json.load(manifest_file)
+        if self.manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported snapshot format {self.manifest.get('format')} in {path}.")
+        self.dataset_version = self.manifest.get('dataset_version')
+        self.rows = self.manifest['rows']
+        self.states = {state: tuple(bounds) for state, bounds in self.manifest['states'].items()}
+        self.columns = {}
+        for position, column in enumerate(self.manifest['columns']):
+            prefix = os.path.join(path, f"c{position}")
+            if column['kind'] == 'string':
+                self.columns[column['name']] = StringColumn(
+                    _load_array(prefix + ".codes.npy"), _load_strings(prefix + ".strings.bin"),
+                    _load_array(prefix + ".offsets.npy"))
+            else:
+                self.columns[column['name']] = NumberColumn(_load_array(prefix + ".values.npy"))
+        self.plan_starts = _load_array(os.path.join(path, "plan_starts.npy"))
+        self.plan_ends = _load_array(os.path.join(path, "plan_ends.npy"))
+
+    def state_range(self, state: str) -> tuple:
+        return self.states.get(state, (0, 0))
+
+    def plan_range(self, plan_id: str) -> tuple:
+        code = self.columns['PlanId'].find(plan_id)
+        return (int(self.plan_starts[code]), int(self.plan_ends[code])) if code >= 0 else (0, 0)
+
+    def documents(self, positions) -> list:
+        """Materializes rows as documents with the fields present in the CSV, one column at a time."""
+        documents = [{'_id': position} for position in np.asarray(positions).tolist()]
+        for name, column in self.columns.items():
+            if isinstance(column, StringColumn):
+                for document, code in zip(documents, column.codes[positions].tolist()):
+                    if code >= 0:
+                        document[name] = column.value(code)
+            else:
+                for document, value in zip(documents, column.values[positions].tolist()):
+                    if value == value:  # NaN marks a missing value
+                        document[name] = value
+        return documents
+
+    def candidate_range(self, query: dict) -> tuple:
+        """Narrows the scan to a state or plan row range using top-level equality conditions."""
+        start, end = 0, self.rows
+        for part in [query] + list(query.get('$and', [])):
+            if isinstance(part.get('StateCode'), str):
+                low, high = self.state_range(part['StateCode'])
+                start, end = max(start, low), min(end, high)
+            if isinstance(part.get('PlanId'), str):
+                low, high = self.plan_range(part['PlanId'])
+                start, end = max(start, low), min(end, high)
+        return start, max(start, end)
+
+    def select(self, query: dict):
+        """
+        Returns the positions of the rows matching query, in (PlanId, _id) order.
+
+        Raises:
+            UnsupportedQueryError: If query uses an operator not listed above.
+        """
+        start, end = self.candidate_range(query)
+        rows = np.arange(start, end)
+        rows = rows[self._mask(query, rows)]
+        if not any(low <= start and end <= high for low, high in self.states.values()):
+            # Rows from several states: PlanId order is not storage order
+            rows = rows[np.lexsort((rows, self.columns['PlanId'].codes[rows]))]
+        return rows
+
+    def _mask(self, query: dict, rows):
+        mask = np.ones(len(rows), dtype=bool)
+        for field, condition in query.items():
+            if field == '$and':
+                for part in condition:
+                    mask &= self._mask(part, rows)
+            elif field == '$or':
+                matched = np.zeros(len(rows), dtype=bool)
+                for part in condition:
+                    matched |= self._mask(part, rows)
+                mask &= matched
+            elif field.startswith('$'):
+                raise UnsupportedQueryError(f"Unsupported query operator: {field}")
+            else:
+                mask &= self._field_mask(field, condition, rows)
+        return mask
+
+    def _field_mask(self, field: str, condition, rows):
+        if isinstance(condition, dict) and condition and all(key.startswith('$') for key in condition):
+            conditions = condition
+        else:
+            conditions = {'$eq': condition}
+        mask = np.ones(len(rows), dtype=bool)
+        column = self.columns.get(field)
+        for operator, operand in conditions.items():
+            if field == '_id':
+                mask &= _compare_numbers(rows, operator, operand)
+            elif column is None:
+                # Field absent from the whole file: like MongoDB, no condition matches
+                mask &= False
+            else:
+                mask &= column.compare(operator, operand, rows)
+        return mask
+
+    def eligibility_rows(self) -> list:
+        path = os.path.join(self.path, ELIGIBILITY_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as eligibility_file:
+            return json.load(eligibility_file)
+
+
+def read_dataset_version(path: str):
+    """Reads the dataset version from a snapshot's manifest without opening its columns."""
+    with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as manifest_file:
+        return json.load(manifest_file).get('dataset_version')
+
+
+# --- Building ---
+
+def _code_dtype(size: int):
+    return np.int16 if size < np.iinfo(np.int16).max else np.int32
+
+
+def _write_strings(prefix: str, values: list):
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    with open(prefix + ".strings.bin", "wb") as strings_file:
+        strings_file.write(b"".join(encoded))
+    np.save(prefix + ".offsets.npy", offsets)
+
+
+def build_snapshot(path: str, out_dir: str, eligibility_path: str = None, dataset_version: str = None,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, encoding: str = "utf-8-sig") -> dict:
+    """
+    Builds a snapshot from the Benefits & Cost Sharing PUF (and optionally the
+    Medicaid/CHIP eligibility levels) into out_dir, replacing any previous one.
+
+    Like api/ingest.py, rows without PlanId or BenefitName are skipped, and a
+    repeated (PlanId, BenefitName) keeps the values of its last row at the
+    position of its first, so rows come back in the same order as from MongoDB.
+
+    Returns:
+        The snapshot manifest.
+    """
+    started = time.perf_counter()
+
+    # Pass 1: column names and the distinct values of every string column
+    names, distinct, total_rows = [], {}, 0
+    for chunk in read_chunks(path, chunk_size, encoding):
+        for row in chunk:
+            if not (row.get("PlanId") and row.get("BenefitName")):
+                continue
+            total_rows += 1
+            for name, value in row.items():
+                if name not in distinct:
+                    names.append(name)
+                    distinct[name] = set()
+                distinct[name].add(value)
+    for name in KEY_COLUMNS:
+        if name not in distinct:
+            names.append(name)
+            distinct[name] = set()
+    dictionaries = {name: sorted(values) for name, values in distinct.items()}
+    lookups = {name: {value: code for code, value in enumerate(values)} for name, values in dictionaries.items()}
+
+    # Pass 2: encode every row
+    codes = {name: np.full(total_rows, -1, dtype=np.int32) for name in names}
+    numbers = {name: np.full(total_rows, np.nan) for name in NUMBER_COLUMNS}
+    position = 0
+    for chunk in read_chunks(path, chunk_size, encoding):
+        for row in chunk:
+            if not (row.get("PlanId") and row.get("BenefitName")):
+                continue
+            for name, value in row.items():
+                codes[name][position] = lookups[name][value]
+            for name, value in normalized_fields(row).items():
+                numbers[name][position] = value
+            position += 1
+
+    # Find repeated (PlanId, BenefitName) rows, then sort by (StateCode, PlanId, file order)
+    state, plan, benefit = (codes[name] for name in KEY_COLUMNS)
+    by_key = np.lexsort((np.arange(total_rows), benefit, plan))
+    new_key = np.concatenate(([True], (plan[by_key][1:] != plan[by_key][:-1]) |
+                              (benefit[by_key][1:] != benefit[by_key][:-1])))
+    first = by_key[new_key]
+    last = by_key[np.append(np.flatnonzero(new_key)[1:] - 1, total_rows - 1)] if total_rows else first
+    order = last[np.lexsort((first, plan[last], state[last]))]
+    row_count = len(order)
+
+    # Write into a temporary directory, then swap it in; workers that still map
+    # the previous files keep reading them until they reopen
+    out_dir = os.path.abspath(out_dir)
+    build_dir = out_dir + ".building"
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    columns = []
+    for name in names:
+        prefix = os.path.join(build_dir, f"c{len(columns)}")
+        np.save(prefix + ".codes.npy", codes[name][order].astype(_code_dtype(len(dictionaries[name]))))
+        _write_strings(prefix, dictionaries[name])
+        columns.append({"name": name, "kind": "string", "distinct": len(dictionaries[name])})
+    for name in NUMBER_COLUMNS:
+        np.save(os.path.join(build_dir, f"c{len(columns)}.values.npy"), numbers[name][order])
+        columns.append({"name": name, "kind": "number"})
+
+    # Row ranges: StateCode in the manifest, PlanId as arrays indexed by PlanId code
+    state, plan = codes["StateCode"][order], codes["PlanId"][order]
+    states = {}
+    for code, value in enumerate(dictionaries["StateCode"]):
+        start, end = np.searchsorted(state, code, side='left'), np.searchsorted(state, code, side='right')
+        if end > start:
+            states[value] = [int(start), int(end)]
+    plan_starts = np.zeros(len(dictionaries["PlanId"]), dtype=np.int64)
+    plan_ends = np.zeros(len(dictionaries["PlanId"]), dtype=np.int64)
+    if row_count:
+        starts = np.flatnonzero(np.concatenate(([True], plan[1:] != plan[:-1])))
+        ends = np.append(starts[1:], row_count)
+        plan_starts[plan[starts]] = starts
+        plan_ends[plan[starts]] = ends
+    np.save(os.path.join(build_dir, "plan_starts.npy"), plan_starts)
+    np.save(os.path.join(build_dir, "plan_ends.npy"), plan_ends)
+
+    eligibility_rows = 0
+    if eligibility_path:
+        rows = [row for chunk in read_chunks(eligibility_path, chunk_size, encoding) for row in chunk if row.get("State")]
+        with open(os.path.join(build_dir, ELIGIBILITY_FILE), "w", encoding="utf-8") as eligibility_file:
+            json.dump(rows, eligibility_file)
+        eligibility_rows = len(rows)
+
+    manifest = {
+        "format": FORMAT_VERSION,
+        "dataset_version": dataset_version or datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "rows": row_count,
+        "eligibility_rows": eligibility_rows,
+        "columns": columns,
+        "states": states,
+    }
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+
+    previous_dir = out_dir + ".previous"
+    shutil.rmtree(previous_dir, ignore_errors=True)
+    if os.path.exists(out_dir):
+        os.rename(out_dir, previous_dir)
+    os.rename(build_dir, out_dir)
+    shutil.rmtree(previous_dir, ignore_errors=True)
+
+    print(f"Built snapshot of {row_count} rows ({len(states)} states, {len(dictionaries['PlanId'])} plans) "
+          f"in {time.perf_counter() - started:.1f}s: {out_dir}")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a columnar snapshot of the CMS public-use files.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="Build a snapshot from the Benefits & Cost Sharing PUF")
+    build_parser.add_argument("path")
+    build_parser.add_argument("--out", required=True, help="Snapshot directory (replaced if it exists)")
+    build_parser.add_argument("--eligibility", help="Medicaid/CHIP eligibility levels CSV")
+    build_parser.add_argument("--dataset-version", help="Version tag recorded in the manifest")
+    build_parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows read per chunk")
+    build_parser.add_argument("--encoding", default="utf-8-sig", help="CSV file encoding")
+
+    args = parser.parse_args(argv)
+    if args.command == "build":
+        build_snapshot(args.path, args.out, args.eligibility, args.dataset_version, args.chunk_size, args.encoding)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
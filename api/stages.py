@@ -0,0 +1,44 @@
+# --- Stage Timing ---
+# Lightweight timing spans around the hot-path stages of a request
+# (Mongo query, BSON -> JSON, prompt build, LLM call, parse/validate).
+# Consumers such as the benchmark harness register a sink to receive them.
+import time
+import threading
+from contextlib import contextmanager
+
+QUERY = "query"
+BSON_TO_JSON = "bson_to_json"
+PROMPT_BUILD = "prompt_build"
+LLM = "llm"
+PARSE_VALIDATE = "parse_validate"
+
+_sinks = []
+_sinks_lock = threading.Lock()
+
+
+def add_sink(sink):
+    """Registers sink(stage_name, seconds), called after every timed stage."""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_sink(sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def record(name: str, seconds: float):
+    """Reports a duration measured elsewhere to every sink."""
+    for sink in list(_sinks):
+        sink(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Times the enclosed block as stage name."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - started)
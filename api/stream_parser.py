@@ -0,0 +1,88 @@
+# --- Incremental ranked_plans Parser ---
+# Gemini streams its JSON answer in arbitrary text chunks. This parser finds the
+# "ranked_plans" array and returns each plan object as soon as its closing brace
+# arrives, so plans can be pushed to the client before generation finishes.
+import re
+import json
+
+_RANKED_PLANS_RE = re.compile(r'"ranked_plans"\s*:\s*\[')
+
+
+def clean_model_output(raw_text: str) -> str:
+    """Strips markdown code fences the model sometimes wraps around its JSON."""
+    return raw_text.strip().removeprefix("```json").removesuffix("```").strip()
+
+
+class RankedPlansStreamParser:
+    """
+    Feed text chunks in order with feed(); each call returns the (index, item)
+    pairs of ranked_plans objects completed by that chunk.
+    """
+
+    def __init__(self):
+        self.buffer = ''
+        self.items_found = 0
+        self.array_closed = False
+        self._pos = None  # Scan position inside the array, None until it is found
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = None
+
+    def feed(self, text: str) -> list:
+        """
+        Adds a chunk of model output.
+
+        Returns:
+            A list of (index, item) tuples. item is the decoded object, or the raw
+            text of the object if it was not valid JSON.
+        """
+        self.buffer += text
+        if self.array_closed:
+            return []
+        if self._pos is None:
+            match = _RANKED_PLANS_RE.search(self.buffer)
+            if not match:
+                return []
+            self._pos = match.end()
+
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in '{[':
+                if self._depth == 0 and char == '{':
+                    self._item_start = i
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    # The closing bracket of ranked_plans itself
+                    self.array_closed = True
+                    self._pos = i + 1
+                    return completed
+                self._depth -= 1
+                if self._depth == 0 and self._item_start is not None:
+                    raw_item = buffer[self._item_start:i + 1]
+                    try:
+                        item = json.loads(raw_item)
+                    except json.JSONDecodeError:
+                        item = raw_item
+                    completed.append((self.items_found, item))
+                    self.items_found += 1
+                    self._item_start = None
+        self._pos = len(buffer)
+        return completed
+
+    def result(self):
+        """Parses the complete buffered output. Raises json.JSONDecodeError if it is invalid."""
+        return json.loads(clean_model_output(self.buffer))
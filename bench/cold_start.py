@@ -0,0 +1,67 @@
+"""
+Cold start benchmark for the API.
+
+Starts a fresh Python process per run, imports api/index.py and serves one
+request through the Flask test client, reporting import time and time to first
+response. Nothing here needs MongoDB or Gemini to be reachable; /api/test and
+/api/health/live never touch them.
+
+Usage:
+    python bench/cold_start.py --runs 10 --path /api/test --output cold-start.json
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+from run_bench import summarize, git_commit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+API_DIR = os.path.join(os.path.dirname(BENCH_DIR), "api")
+
+# Runs in the child process; prints one JSON line with its timings
+CHILD_SCRIPT = """
+import sys, json, time
+started = time.perf_counter()
+sys.path.insert(0, {api_dir!r})
+import index
+imported = time.perf_counter()
+response = index.app.test_client().get({path!r})
+finished = time.perf_counter()
+print(json.dumps({{"import": imported - started, "first_response": finished - started, "status": response.status_code}}))
+"""
+
+
+def measure(path: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("MONGO_URI", "mongodb://localhost:27017")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    completed = subprocess.run([sys.executable, "-c", CHILD_SCRIPT.format(api_dir=API_DIR, path=path)],
+                               capture_output=True, text=True, env=env, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API cold start time.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--path", default="/api/test", help="Endpoint requested after import")
+    parser.add_argument("--output", help="Optional JSON results file")
+    args = parser.parse_args(argv)
+
+    samples = [measure(args.path) for _ in range(args.runs)]
+    report = {
+        "meta": {"git_commit": git_commit(), "params": vars(args)},
+        "status_codes": sorted({sample["status"] for sample in samples}),
+        "import": summarize([sample["import"] for sample in samples]),
+        "first_response": summarize([sample["first_response"] for sample in samples]),
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Local stand-in for the Gemini model used by api/agent.py.
+
+FakeGeminiModel implements the generate_content() surface the agent uses
+(candidates, prompt_feedback, .text and stream=True chunks) with configurable
+latency and error rate, and ranks the plan ids it finds in the prompt. It never
+touches the network, so benchmarks and load tests cost nothing and are repeatable.
+"""
+import re
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+
+DEFAULT_LATENCY_MS = 800
+DEFAULT_JITTER_MS = 200
+DEFAULT_SLOW_LATENCY_MS = 5000
+DEFAULT_RANKED_PLANS = 5
+DEFAULT_ERROR_MESSAGE = "503 Service Unavailable (fake upstream error)"
+STREAM_CHUNK_CHARS = 120
+
+# Matches the plan header lines written by prompt_encoder.encode_plans
+_PLAN_LINE_RE = re.compile(r'^\s*PLAN (\S+)', re.MULTILINE)
+
+
+class FakeResponse:
+    """Mimics a (non-streaming) GenerateContentResponse or one streamed chunk."""
+
+    def __init__(self, text: str):
+        self.text = text
+        part = SimpleNamespace(text=text)
+        self.candidates = [SimpleNamespace(content=SimpleNamespace(parts=[part]))]
+        self.prompt_feedback = SimpleNamespace(block_reason=None, safety_ratings=[])
+
+
+class FakeGeminiModel:
+    """
+    Drop-in replacement for genai.GenerativeModel in benchmarks.
+    """
+
+    def __init__(self, latency_ms: float = DEFAULT_LATENCY_MS, jitter_ms: float = DEFAULT_JITTER_MS,
+                 error_rate: float = 0.0, ranked_plans: int = DEFAULT_RANKED_PLANS, seed: int = None,
+                 slow_rate: float = 0.0, slow_latency_ms: float = DEFAULT_SLOW_LATENCY_MS,
+                 error_message: str = DEFAULT_ERROR_MESSAGE):
+        """
+        Args:
+            latency_ms: Mean time to produce a full response.
+            jitter_ms: Uniform +/- jitter applied to latency_ms.
+            error_rate: Fraction of calls (0-1) that raise an upstream-style error.
+            ranked_plans: Number of plans ranked in each response.
+            seed: Optional seed for repeatable latency and error sequences.
+            slow_rate: Fraction of calls that take slow_latency_ms instead, to simulate tail latency.
+            error_message: Message of the raised errors, e.g. "429 Resource has been exhausted"
+                           to simulate quota errors.
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.ranked_plans = ranked_plans
+        self.slow_rate = slow_rate
+        self.slow_latency_ms = slow_latency_ms
+        self.error_message = error_message
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, safety_settings=None, stream=False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            if self._random.random() < self.slow_rate:
+                delay = self.slow_latency_ms / 1000
+            fail = self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+
+        text = self._response_text(str(prompt))
+        if not stream:
+            time.sleep(delay)
+            if fail:
+                raise RuntimeError(self.error_message)
+            return FakeResponse(text)
+        return self._stream(text, delay, fail)
+
+    def _stream(self, text: str, delay: float, fail: bool):
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        for position, chunk in enumerate(chunks):
+            time.sleep(delay / len(chunks))
+            if fail and position >= len(chunks) // 2:
+                raise RuntimeError(self.error_message)
+            yield FakeResponse(chunk)
+
+    def _response_text(self, prompt: str) -> str:
+        plan_ids = _PLAN_LINE_RE.findall(prompt)[:self.ranked_plans]
+        ranked = [
+            {
+                "planId": plan_id,
+                "rank": rank,
+                "isBestPlan": rank == 1,
+                "justification": f"Benchmark ranking {rank} of {len(plan_ids)} for plan {plan_id}."
+            }
+            for rank, plan_id in enumerate(plan_ids, start=1)
+        ]
+        return json.dumps({"best_plan_id": plan_ids[0] if plan_ids else None, "ranked_plans": ranked})
+
+
+def install(model: FakeGeminiModel):
+    """Replaces the Gemini model used by api/agent.py. api/ must already be on sys.path."""
+    import agent
+    agent.GEMINI_MODEL = model
+    return model
@@ -0,0 +1,268 @@
+"""
+End-to-end benchmark for the API.
+
+Loads a synthetic PUF into a local MongoDB, replaces Gemini with the fake model
+from bench/fake_llm.py, then drives the endpoints in-process through the Flask
+test client and reports throughput, latency percentiles and per-stage timings
+(see api/stages.py). Results are written as JSON so runs can be compared.
+
+Usage:
+    python bench/run_bench.py --mongo-uri mongodb://localhost:27017 --scale 0.05 \\
+        --requests 200 --concurrency 8 --llm-latency-ms 800 --output bench-results.json
+
+Pass --skip-load to reuse data from a previous run, and --disable-caches to
+measure the uncached path (plan and recommendation caches sized to zero).
+With --data-backend snapshot the synthetic data is built into a columnar
+snapshot (see api/snapshot.py) instead, and MongoDB is not used at all.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, "api"))
+sys.path.insert(0, BENCH_DIR)
+
+import synthetic_puf
+import fake_llm
+
+AGES = [19, 24, 31, 38, 45, 52, 59, 63]
+INCOMES = [12000, 18500, 26000, 34000, 48000, 65000, 90000]
+
+
+class StageRecorder:
+    """stages sink that collects durations for the scenario currently running."""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, name: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def take(self) -> dict:
+        with self._lock:
+            samples, self.samples = self.samples, {}
+        return samples
+
+
+def summarize(seconds: list) -> dict:
+    """Latency summary in milliseconds."""
+    if not seconds:
+        return {"count": 0}
+    values = np.asarray(seconds) * 1000
+    return {
+        "count": int(values.size),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "max_ms": round(float(values.max()), 3),
+    }
+
+
+def random_profile(rng: random.Random, states: list) -> dict:
+    return {
+        "name": "Bench User",
+        "age": rng.choice(AGES),
+        "state": rng.choice(states),
+        "income": rng.choice(INCOMES),
+        "dependents": rng.choice([0, 0, 1, 2, 3]),
+        "dentalPlanRequired": rng.choice(["yes", "no"]),
+        "consentGiven": True,
+    }
+
+
+def build_scenarios(states: list):
+    """Returns {name: make_request(client, rng)}; each returns the response status code."""
+
+    def get_benefits(client, rng):
+        return client.get(f"/api/benefits_and_cost_sharing?state={rng.choice(states)}").status_code
+
+    def post_recommendation(client, rng):
+        # Skip the Medicaid short-circuit so every request exercises the LLM path
+        profile = dict(random_profile(rng, states), eligibilityCheck="off")
+        return client.post("/api/benefits_and_cost_sharing", json=profile).status_code
+
+    def stream_recommendation(client, rng):
+        profile = dict(random_profile(rng, states), eligibilityCheck="off")
+        response = client.post("/api/benefits_and_cost_sharing/stream", json=profile)
+        response.get_data()  # Drain the stream so the LLM stage completes
+        return response.status_code
+
+    def get_eligibility(client, rng):
+        return client.get(f"/api/medicaid_and_chip_eligibility?state={rng.choice(states)}").status_code
+
+    return {
+        "get_benefits": get_benefits,
+        "post_recommendation": post_recommendation,
+        "stream_recommendation": stream_recommendation,
+        "get_eligibility": get_eligibility,
+    }
+
+
+def run_scenario(app, make_request, requests: int, concurrency: int, seed: int) -> dict:
+    """Sends requests through concurrency worker threads and summarizes the results."""
+    latencies = []
+    status_codes = {}
+    lock = threading.Lock()
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        client = app.test_client()
+        started = time.perf_counter()
+        status = make_request(client, rng)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            status_codes[str(status)] = status_codes.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(requests)))
+    wall_seconds = time.perf_counter() - started
+
+    return {
+        "requests": requests,
+        "wall_seconds": round(wall_seconds, 3),
+        "throughput_rps": round(requests / max(wall_seconds, 1e-9), 2),
+        "status_codes": status_codes,
+        "latency": summarize(latencies),
+    }
+
+
+def load_data(uri: str, scale: float, seed: int, snapshot_path: str = None) -> dict:
+    """
+    Generates the synthetic files and ingests them into MongoDB, or builds them
+    into a snapshot at snapshot_path if given. Returns load statistics.
+    """
+    import ingest
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        puf_path = os.path.join(data_dir, "benefits.csv")
+        eligibility_path = os.path.join(data_dir, "eligibility.csv")
+        synthetic_puf.generate_puf(puf_path, scale, seed)
+        synthetic_puf.generate_eligibility(eligibility_path, seed)
+
+        started = time.perf_counter()
+        if snapshot_path:
+            import snapshot
+            manifest = snapshot.build_snapshot(puf_path, snapshot_path, eligibility_path,
+                                               dataset_version=f"bench-{scale}-{seed}", encoding="utf-8")
+            rows = manifest["rows"]
+        else:
+            client = ingest.connect(uri)
+            rows = ingest.ingest_benefits(client, puf_path, ingest.DEFAULT_CHUNK_SIZE, "utf-8",
+                                          dataset_version=f"bench-{scale}-{seed}")
+            ingest.ingest_eligibility(client, eligibility_path, ingest.DEFAULT_CHUNK_SIZE, "utf-8")
+        return {"rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=REPO_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API against a local MongoDB and a fake Gemini model.")
+    parser.add_argument("--mongo-uri", default=os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--scale", type=float, default=0.05, help="Synthetic PUF size as a fraction of the national file")
+    parser.add_argument("--skip-load", action="store_true", help="Reuse data already loaded into --mongo-uri")
+    parser.add_argument("--data-backend", choices=["mongo", "snapshot"], default="mongo")
+    parser.add_argument("--snapshot-path", default=os.path.join(tempfile.gettempdir(), "plans4you-bench-snapshot"),
+                        help="Snapshot directory used with --data-backend snapshot")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency-ms", type=float, default=fake_llm.DEFAULT_LATENCY_MS)
+    parser.add_argument("--llm-jitter-ms", type=float, default=fake_llm.DEFAULT_JITTER_MS)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Fraction of LLM calls that are slow")
+    parser.add_argument("--llm-slow-ms", type=float, default=fake_llm.DEFAULT_SLOW_LATENCY_MS)
+    parser.add_argument("--disable-caches", action="store_true", help="Size the plan and recommendation caches to zero")
+    parser.add_argument("--endpoints", help="Comma-separated subset of scenarios to run")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="bench-results.json")
+    args = parser.parse_args(argv)
+
+    # index.py reads its configuration at import time
+    os.environ["MONGO_URI"] = args.mongo_uri
+    os.environ["DATA_BACKEND"] = args.data_backend
+    os.environ["SNAPSHOT_PATH"] = args.snapshot_path
+    if args.disable_caches:
+        os.environ["PLAN_CACHE_MAX_BYTES"] = "0"
+        os.environ["RECOMMENDATION_CACHE_MAX_ENTRIES"] = "0"
+    os.environ.setdefault("LLM_REQUESTS_PER_MINUTE", "100000")
+
+    snapshot_path = args.snapshot_path if args.data_backend == "snapshot" else None
+    load_stats = None if args.skip_load else load_data(args.mongo_uri, args.scale, args.seed, snapshot_path)
+
+    import index
+    import stages
+
+    model = fake_llm.install(fake_llm.FakeGeminiModel(
+        latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+        error_rate=args.llm_error_rate, seed=args.seed,
+        slow_rate=args.llm_slow_rate, slow_latency_ms=args.llm_slow_ms))
+    recorder = StageRecorder()
+    stages.add_sink(recorder)
+
+    states = list(synthetic_puf.STATE_PLAN_COUNTS)
+    scenarios = build_scenarios(states)
+    selected = args.endpoints.split(",") if args.endpoints else list(scenarios)
+
+    results = {}
+    for name in selected:
+        if name not in scenarios:
+            parser.error(f"Unknown endpoint scenario '{name}'. Choose from: {', '.join(scenarios)}")
+        print(f"Running {name}: {args.requests} requests, concurrency {args.concurrency}...")
+        recorder.take()
+        result = run_scenario(index.app, scenarios[name], args.requests, args.concurrency, args.seed)
+        result["stages"] = {stage_name: summarize(samples) for stage_name, samples in recorder.take().items()}
+        results[name] = result
+        latency = result["latency"]
+        print(f"  {result['throughput_rps']} req/s, p50 {latency.get('p50_ms')} ms, "
+              f"p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms")
+    stages.remove_sink(recorder)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": vars(args),
+            "load": load_stats,
+            "llm_calls": model.calls,
+            "llm_errors": model.errors,
+        },
+        "endpoints": results,
+        "caches": {
+            "plan_cache": index.plan_cache.stats(),
+            "recommendation_cache": index.recommendation_cache.stats(),
+        },
+        "llm": index.llm_caller.stats(),
+    }
+    with open(args.output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2, default=str)
+    print(f"Wrote results to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
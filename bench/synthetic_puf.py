@@ -0,0 +1,151 @@
+"""
+Synthetic Benefits & Cost Sharing PUF and Medicaid/CHIP eligibility generator.
+
+Writes CSVs with the same columns as the CMS files, with per-state plan counts
+in proportion to a recent Marketplace release. --scale 1.0 produces roughly
+the full national row count (~1.3M rows).
+
+Usage:
+    python bench/synthetic_puf.py --out-dir /tmp/puf --scale 0.05
+"""
+import os
+import csv
+import random
+import argparse
+
+BUSINESS_YEAR = "2025"
+
+# Approximate number of plans (medical + stand-alone dental) per state
+STATE_PLAN_COUNTS = {
+    'TX': 1150, 'FL': 1050, 'GA': 640, 'NC': 470, 'OH': 430, 'AZ': 400, 'TN': 380,
+    'MI': 360, 'IN': 330, 'IL': 320, 'VA': 300, 'WI': 300, 'MO': 290, 'SC': 280,
+    'LA': 240, 'AL': 220, 'OK': 220, 'UT': 210, 'KS': 200, 'MS': 190, 'IA': 160,
+    'NE': 150, 'AR': 140, 'OR': 140, 'MT': 110, 'WV': 90, 'NH': 90, 'SD': 80,
+    'ND': 70, 'WY': 60, 'DE': 60, 'HI': 50, 'AK': 40,
+}
+
+MEDICAL_BENEFITS = [
+    "Primary Care Visit to Treat an Injury or Illness", "Specialist Visit",
+    "Other Practitioner Office Visit (Nurse, Physician Assistant)", "Outpatient Facility Fee (e.g.,  Ambulatory Surgery Center)",
+    "Outpatient Surgery Physician/Surgical Services", "Hospice Services", "Urgent Care Centers or Facilities",
+    "Home Health Care Services", "Emergency Room Services", "Emergency Transportation/Ambulance",
+    "Inpatient Hospital Services (e.g., Hospital Stay)", "Inpatient Physician and Surgical Services",
+    "Skilled Nursing Facility", "Prenatal and Postnatal Care", "Delivery and All Inpatient Services for Maternity Care",
+    "Mental/Behavioral Health Outpatient Services", "Mental/Behavioral Health Inpatient Services",
+    "Substance Abuse Disorder Outpatient Services", "Substance Abuse Disorder Inpatient Services",
+    "Generic Drugs", "Preferred Brand Drugs", "Non-Preferred Brand Drugs", "Specialty Drugs",
+    "Outpatient Rehabilitation Services", "Habilitation Services", "Chiropractic Care",
+    "Durable Medical Equipment", "Hearing Aids", "Imaging (CT/PET Scans, MRIs)",
+    "Preventive Care/Screening/Immunization", "Routine Foot Care", "Routine Eye Exam (Adult)",
+    "Routine Eye Exam for Children", "Eye Glasses for Children", "Laboratory Outpatient and Professional Services",
+    "X-rays and Diagnostic Imaging", "Well Baby Visits and Care", "Allergy Testing", "Chemotherapy",
+    "Radiation", "Diabetes Education", "Prosthetic Devices", "Infusion Therapy", "Treatment for Temporomandibular Joint Disorders",
+    "Nutritional Counseling", "Reconstructive Surgery", "Transplant", "Accidental Dental",
+    "Dialysis", "Bariatric Surgery", "Infertility Treatment", "Weight Loss Programs",
+    "Private-Duty Nursing", "Long-Term/Custodial Nursing Home Care", "Routine Dental Services (Adult)",
+    "Dental Check-Up for Children", "Basic Dental Care - Child", "Orthodontia - Child", "Major Dental Care - Child",
+]
+
+DENTAL_BENEFITS = [
+    "Routine Dental Services (Adult)", "Dental Check-Up for Children", "Basic Dental Care - Child",
+    "Orthodontia - Child", "Major Dental Care - Child", "Basic Dental Care - Adult",
+    "Orthodontia - Adult", "Major Dental Care - Adult", "Accidental Dental",
+]
+
+COPAY_VALUES = ["$0.00", "$10.00", "$25.00", "$40.00", "$60.00", "$75.00", "$250.00", "$500.00",
+                "No Charge", "No Charge after deductible", "$35.00 Copay after deductible", "Not Applicable"]
+COINS_VALUES = ["0.00%", "10.00%", "20.00%", "30.00%", "40.00%", "50.00%",
+                "20.00% Coinsurance after deductible", "No Charge", "Not Applicable"]
+EXPLANATIONS = ["", "", "", "Prior authorization required.", "Limited to in-network providers.",
+                "See plan brochure for details.", "Waiting period of 6 months applies."]
+LIMIT_UNITS = ["Visit(s) per Year", "Day(s) per Year", "Exam(s) per Year", "Item(s) per Year"]
+
+PUF_COLUMNS = [
+    "BusinessYear", "StateCode", "IssuerId", "SourceName", "ImportDate", "StandardComponentId",
+    "PlanId", "BenefitName", "CopayInnTier1", "CopayInnTier2", "CopayOutofNet", "CoinsInnTier1",
+    "CoinsInnTier2", "CoinsOutofNet", "IsEHB", "IsCovered", "QuantLimitOnSvc", "LimitQty",
+    "LimitUnit", "Exclusions", "Explanation", "EHBVarReason", "IsExclFromInnMOOP", "IsExclFromOonMOOP",
+]
+
+ELIGIBILITY_COLUMNS = [
+    "State", "Medicaid Ages 0-1", "Medicaid Ages 1-5", "Medicaid Ages 6-18", "Separate CHIP",
+    "Medicaid Pregnant Women", "Medicaid Parent/Caretaker", "Medicaid Expansion Adults",
+]
+
+
+def generate_puf(path: str, scale: float = 0.05, seed: int = 42) -> int:
+    """
+    Writes a synthetic Benefits & Cost Sharing PUF.
+
+    Returns:
+        The number of data rows written.
+    """
+    rng = random.Random(seed)
+    rows_written = 0
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(PUF_COLUMNS)
+        for state, plan_count in STATE_PLAN_COUNTS.items():
+            issuers = [f"{rng.randint(10000, 99999)}" for _ in range(max(2, plan_count // 60))]
+            for plan_number in range(max(1, int(plan_count * scale))):
+                issuer = rng.choice(issuers)
+                component_id = f"{issuer}{state}{plan_number:07d}"
+                plan_id = f"{component_id}-0{rng.randint(1, 6)}"
+                # About 1 in 5 plans is a stand-alone dental plan
+                is_dental_plan = rng.random() < 0.2
+                benefits = DENTAL_BENEFITS if is_dental_plan else MEDICAL_BENEFITS
+                for benefit in benefits:
+                    covered = rng.random() > 0.08
+                    limited = covered and rng.random() < 0.15
+                    writer.writerow([
+                        BUSINESS_YEAR, state, issuer, "HIOS", "2024-10-01", component_id, plan_id, benefit,
+                        rng.choice(COPAY_VALUES) if covered else "", "", "",
+                        rng.choice(COINS_VALUES) if covered else "", "", "",
+                        "Yes" if rng.random() < 0.7 else "", "Covered" if covered else "Not Covered",
+                        "Yes" if limited else "No", str(rng.choice([1, 2, 4, 12, 20, 30])) if limited else "",
+                        rng.choice(LIMIT_UNITS) if limited else "", "", rng.choice(EXPLANATIONS), "", "No", "No",
+                    ])
+                    rows_written += 1
+    return rows_written
+
+
+def generate_eligibility(path: str, seed: int = 42) -> int:
+    """
+    Writes a synthetic Medicaid/CHIP eligibility table, one row per state.
+
+    Returns:
+        The number of data rows written.
+    """
+    rng = random.Random(seed)
+    with open(path, "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(ELIGIBILITY_COLUMNS)
+        for state in STATE_PLAN_COUNTS:
+            expansion = rng.random() < 0.6
+            writer.writerow([
+                state, f"{rng.choice([144, 194, 213])}%", f"{rng.choice([144, 147, 162])}%",
+                f"{rng.choice([138, 149, 210])}%", f"{rng.choice([205, 215, 250])}%",
+                f"{rng.choice([138, 185, 200])}%", f"{rng.choice([17, 31, 52, 138])}%",
+                "138%" if expansion else "N/A",
+            ])
+    return len(STATE_PLAN_COUNTS)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic CMS public-use files.")
+    parser.add_argument("--out-dir", required=True)
+    parser.add_argument("--scale", type=float, default=0.05, help="Fraction of the national plan count")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    puf_path = os.path.join(args.out_dir, "benefits-and-cost-sharing-puf.csv")
+    eligibility_path = os.path.join(args.out_dir, "medicaid-and-chip-eligibility-levels.csv")
+    rows = generate_puf(puf_path, args.scale, args.seed)
+    generate_eligibility(eligibility_path, args.seed)
+    print(f"Wrote {rows} benefit rows to {puf_path}")
+    print(f"Wrote eligibility levels to {eligibility_path}")
+
+
+if __name__ == "__main__":
+    main()
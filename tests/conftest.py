@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+# The API modules import each other by bare name (e.g. "from filters import ..."),
+# as they do when Flask runs api/index.py; bench/ holds the fake Gemini model
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "api"))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures")
+
+
+@pytest.fixture(scope="session")
+def snapshot_path(tmp_path_factory):
+    """A snapshot built from tests/fixtures/benefits.csv."""
+    from snapshot import build_snapshot
+    path = str(tmp_path_factory.mktemp("snapshot") / "snapshot")
+    build_snapshot(os.path.join(FIXTURES, "benefits.csv"), path, dataset_version="test")
+    return path
+
+
+@pytest.fixture(scope="session")
+def index_module(snapshot_path):
+    """api/index.py serving the fixture snapshot, so no MongoDB is needed."""
+    os.environ["DATA_BACKEND"] = "snapshot"
+    os.environ["SNAPSHOT_PATH"] = snapshot_path
+    import index
+    return index
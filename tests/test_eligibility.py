@@ -0,0 +1,89 @@
+"""Tests for the Medicaid/CHIP eligibility index (api/eligibility.py)."""
+import pytest
+
+from eligibility import EligibilityIndex, parse_amount, poverty_line, CLEAR_ELIGIBILITY_MARGIN
+
+ROWS = [
+    {"State": "Texas", "Medicaid Expansion Adults": "N/A", "Parent/Caretaker": "15%",
+     "CHIP Ages 0-18": "201%", "Pregnant Women": "198%"},
+    {"State": "California", "Medicaid Expansion Adults": "138%", "Parent/Caretaker": "109%",
+     "CHIP Ages 0-18": "266%"},
+    {"State": "Alaska", "Medicaid Expansion Adults": "138%"},
+]
+
+
+@pytest.fixture
+def index():
+    return EligibilityIndex(loader=lambda: ROWS)
+
+
+@pytest.mark.parametrize("value, amount", [
+    ("138%", 138.0), ("$52,000", 52000.0), (52000, 52000.0), ("30-39", 30.0),
+    ("$40,000-$49,999", 40000.0), ("N/A", None), ("", None), (None, None), (0, 0.0),
+])
+def test_parse_amount(value, amount):
+    assert parse_amount(value) == amount
+
+
+@pytest.mark.parametrize("value", ["-3", -3, "-$3,000", "- 5", -0.5])
+def test_parse_amount_rejects_negatives(value):
+    with pytest.raises(ValueError):
+        parse_amount(value)
+
+
+def test_thresholds_by_household_size(index):
+    index.ensure_loaded()
+    assert index.thresholds["CA"]["adult"][1] == round(1.38 * 15650, 2)
+    assert index.thresholds["CA"]["adult"][3] == round(1.38 * (15650 + 2 * 5500), 2)
+    # Alaska has its own poverty guideline
+    assert index.thresholds["AK"]["adult"][2] == round(1.38 * poverty_line("AK", 2), 2)
+    # Pregnancy limits are not the adult limit; non-expansion states have none
+    assert index.thresholds["TX"]["adult"] == {} and index.thresholds["TX"]["child"][1] == round(2.01 * 15650, 2)
+
+
+def test_expansion_adult(index):
+    limit = round(1.38 * 15650, 2)
+    result = index.check({"state": "CA", "age": 30, "income": limit * CLEAR_ELIGIBILITY_MARGIN, "dependents": 0})
+    assert result["adultLikelyEligible"] and not result["medicareEligible"] and result["householdSize"] == 1
+    assert not index.check({"state": "California", "age": 30, "income": limit, "dependents": 0})["adultLikelyEligible"]
+
+
+def test_non_expansion_state_only_covers_parents(index):
+    assert index.check({"state": "TX", "age": 30, "income": "$1,000", "dependents": 0})["adultIncomeLimit"] is None
+    result = index.check({"state": "TX", "age": 30, "income": "$1,000", "dependents": "2"})
+    assert result["adultIncomeLimit"] == round(0.15 * poverty_line("TX", 3), 2)
+    assert result["adultLikelyEligible"] and result["childrenLikelyEligible"]
+
+
+@pytest.mark.parametrize("age", [65, "65", "70-79", 82])
+def test_medicare_age_is_not_medicaid_expansion(index, age):
+    result = index.check({"state": "CA", "age": age, "income": "$5,000", "dependents": 0})
+    assert result["medicareEligible"]
+    assert result["adultIncomeLimit"] is None and not result["adultLikelyEligible"]
+
+
+def test_unusable_profiles_skip_the_check(index):
+    assert index.check({"state": "ZZ", "age": 30, "income": 1000}) is None
+    assert index.check({"state": "CA", "age": 30, "income": "N/A"}) is None
+    assert index.check({"state": "CA", "age": 30, "income": "-3"}) is None
+    assert index.check({"state": "CA", "age": 30, "income": 1000, "dependents": "-3"}) is None
+
+
+def test_negative_form_values_are_rejected(index_module):
+    form = {"name": "A", "age": 30, "state": "TX", "income": "40000", "dentalPlanRequired": "no",
+            "consentGiven": True, "dependents": "0"}
+    assert index_module.validate_form_data(form) is None
+    assert index_module.validate_form_data(dict(form, dependents="-3")) == "dependents must not be negative"
+    assert index_module.validate_form_data(dict(form, income="-$1")) == "income must not be negative"
+
+
+def test_failed_first_load_is_retried_later():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        raise RuntimeError("database down")
+    index = EligibilityIndex(loader, retry_seconds=60)
+    assert index.check({"state": "CA", "income": 1000}) is None
+    assert index.check({"state": "CA", "income": 1000}) is None
+    assert len(calls) == 1
@@ -0,0 +1,77 @@
+"""Tests for the benefit row filter compiler (api/filters.py)."""
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from filters import (
+    compile_filters, filter_shape, recommended_index, explain_summary, normalized_fields,
+    InvalidFilterError, DENTAL_BENEFITS,
+)
+
+
+def test_no_filters():
+    assert compile_filters({}) == {}
+    assert compile_filters({"state": " ", "issuer": ""}) == {}
+
+
+def test_equality_filters():
+    assert compile_filters({"state": " tx ", "issuer": "111", "coveredOnly": "true"}) == {
+        "StateCode": "TX", "IssuerId": "111", "IsCovered": "Covered"}
+    assert compile_filters({"coveredOnly": "0"}) == {}
+
+
+def test_repeated_and_comma_separated_values():
+    args = MultiDict([("issuer", "1, 2"), ("issuer", "3"), ("benefit", "A, B"), ("benefit", "C")])
+    # Benefit names may contain commas, so they are only split on repetition
+    assert compile_filters(args) == {"IssuerId": {"$in": ["1", "2", "3"]}, "BenefitName": {"$in": ["A, B", "C"]}}
+
+
+def test_component_prefix_is_an_anchored_regex():
+    assert compile_filters({"component": "111TX"}) == {"StandardComponentId": {"$regex": "^111TX"}}
+    with pytest.raises(InvalidFilterError):
+        compile_filters({"component": ".*"})
+
+
+def test_dental_filter_intersects_benefits():
+    assert compile_filters({"dentalRequired": "YES"}) == {"BenefitName": {"$in": DENTAL_BENEFITS}}
+    assert compile_filters({"dentalRequired": "yes", "benefit": "Accidental Dental"}) == {
+        "BenefitName": {"$in": ["Accidental Dental"]}}
+    assert compile_filters({"dentalRequired": "yes", "benefit": "Specialist Visit"}) == {"BenefitName": {"$in": []}}
+    assert compile_filters({"dentalRequired": "no", "benefit": "Specialist Visit"}) == {
+        "BenefitName": "Specialist Visit"}
+
+
+def test_ranges():
+    assert compile_filters({"minCopay": "10", "maxCopay": "25.5", "maxCoinsurance": "20"}) == {
+        "CopayInnTier1Amount": {"$gte": 10.0, "$lte": 25.5},
+        "CoinsInnTier1Percent": {"$lte": 20.0},
+    }
+    with pytest.raises(InvalidFilterError, match="maxCopay"):
+        compile_filters({"maxCopay": "ten"})
+
+
+def test_normalized_fields():
+    assert normalized_fields({"CopayInnTier1": "$25.00 Copay after deductible", "CoinsInnTier1": "20.00%"}) == {
+        "CopayInnTier1Amount": 25.0, "CoinsInnTier1Percent": 20.0}
+    assert normalized_fields({"CopayInnTier1": "", "CoinsInnTier1": None}) == {}
+
+
+def test_recommended_index_is_equality_sort_range():
+    query = compile_filters({"maxCopay": "25", "state": "TX", "benefit": "X", "coveredOnly": "1"})
+    assert filter_shape(query) == {"equality": ["StateCode", "BenefitName", "IsCovered"],
+                                   "range": ["CopayInnTier1Amount"]}
+    assert [field for field, _ in recommended_index(query)] == [
+        "StateCode", "BenefitName", "IsCovered", "PlanId", "_id", "CopayInnTier1Amount"]
+
+
+def test_explain_summary():
+    explain = {
+        "queryPlanner": {"winningPlan": {"stage": "FETCH", "inputStage": {
+            "stage": "IXSCAN", "indexName": "StateCode_1_PlanId_1__id_1"}}},
+        "executionStats": {"nReturned": 3, "totalKeysExamined": 3, "totalDocsExamined": 3,
+                           "executionTimeMillis": 0},
+    }
+    summary = explain_summary(explain, {"StateCode": "TX"})
+    assert summary["winningPlan"] == {"stages": ["FETCH", "IXSCAN"], "indexes": ["StateCode_1_PlanId_1__id_1"],
+                                      "collectionScan": False, "inMemorySort": False}
+    assert summary["recommendedIndex"] == ["StateCode", "PlanId", "_id"]
+    assert summary["executionStats"]["nReturned"] == 3
@@ -0,0 +1,79 @@
+"""Tests for ETags, 304 answers and response compression (api/http_cache.py)."""
+import gzip
+import json
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import http_cache
+
+
+@pytest.fixture(autouse=True)
+def gzip_only(monkeypatch):
+    # Brotli is optional; pin the supported encodings so results don't depend on it
+    monkeypatch.setattr(http_cache, "brotli", None)
+
+
+def test_etag_ignores_parameter_order():
+    tag = http_cache.make_etag("v1", "/api/x", MultiDict([("state", "TX"), ("issuer", "1")]))
+    assert tag == http_cache.make_etag("v1", "/api/x", MultiDict([("issuer", "1"), ("state", "TX")]))
+    assert tag != http_cache.make_etag("v2", "/api/x", MultiDict([("state", "TX"), ("issuer", "1")]))
+    assert tag != http_cache.make_etag("v1", "/api/x", MultiDict([("state", "FL"), ("issuer", "1")]))
+
+
+@pytest.mark.parametrize("header, encoding", [
+    ("gzip, deflate, br", "gzip"),
+    ("gzip;q=0", None),
+    ("identity", None),
+    ("*", "gzip"),
+    ("*;q=0.5, gzip;q=0", None),
+    ("GZIP;q=0.1", "gzip"),
+    ("gzip;q=abc", None),
+    ("", None),
+    (None, None),
+])
+def test_choose_encoding(header, encoding):
+    assert http_cache.choose_encoding(header) == encoding
+
+
+@pytest.fixture
+def client(index_module, monkeypatch):
+    monkeypatch.setattr(index_module, "COMPRESS_MIN_BYTES", 0)
+    return index_module.app.test_client()
+
+
+URL = "/api/benefits_and_cost_sharing?state=TX"
+
+
+def test_compressed_response_has_its_own_etag(client):
+    plain = client.get(URL, headers={"Accept-Encoding": "identity"})
+    compressed = client.get(URL, headers={"Accept-Encoding": "gzip"})
+    assert plain.status_code == compressed.status_code == 200
+    assert "Content-Encoding" not in plain.headers and compressed.headers["Content-Encoding"] == "gzip"
+    assert compressed.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+
+
+def test_matching_etags_are_not_modified(client):
+    plain_tag = client.get(URL, headers={"Accept-Encoding": "identity"}).headers["ETag"]
+    gzip_tag = client.get(URL, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    response = client.get(URL, headers={"If-None-Match": plain_tag, "Accept-Encoding": "gzip"})
+    assert response.status_code == 304 and response.headers["ETag"] == plain_tag
+    response = client.get(URL, headers={"If-None-Match": gzip_tag, "Accept-Encoding": "gzip"})
+    assert response.status_code == 304 and response.headers["ETag"] == gzip_tag
+    response = client.get(URL, headers={"If-None-Match": f'"other", {gzip_tag}', "Accept-Encoding": "gzip"})
+    assert response.status_code == 304
+
+
+def test_variant_for_an_encoding_no_longer_accepted_is_refetched(client):
+    gzip_tag = client.get(URL, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+    response = client.get(URL, headers={"If-None-Match": gzip_tag, "Accept-Encoding": "identity"})
+    assert response.status_code == 200 and "Content-Encoding" not in response.headers
+
+
+def test_other_queries_do_not_match(client):
+    tag = client.get(URL, headers={"Accept-Encoding": "identity"}).headers["ETag"]
+    response = client.get("/api/benefits_and_cost_sharing?state=FL", headers={"If-None-Match": tag})
+    assert response.status_code == 200
@@ -0,0 +1,75 @@
+"""Tests for the background recommendation jobs (api/jobs.py)."""
+import threading
+import time
+
+import pytest
+
+from jobs import JobManager, SqliteJobStore, QueueFullError
+
+
+def wait_for(manager, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job and job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.005)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_job_result():
+    manager = JobManager(max_workers=1)
+    job = wait_for(manager, manager.submit(lambda plan: ({"best_plan_id": plan}, 200), "A-01"))
+    assert job["status"] == "done" and job["result"] == {"best_plan_id": "A-01"} and job["httpStatus"] == 200
+
+
+def test_failed_jobs():
+    manager = JobManager(max_workers=1)
+    assert wait_for(manager, manager.submit(lambda: ({"error": "bad"}, 400)))["status"] == "failed"
+
+    def boom():
+        raise RuntimeError("boom")
+    job = wait_for(manager, manager.submit(boom))
+    assert job["status"] == "failed" and job["httpStatus"] == 500 and job["result"]["details"] == "boom"
+
+
+def test_queue_depth_is_bounded():
+    release = threading.Event()
+    manager = JobManager(max_workers=1, max_queue_depth=2)
+    job_ids = [manager.submit(lambda: (release.wait(5), ({}, 200))[1]) for _ in range(2)]
+    with pytest.raises(QueueFullError):
+        manager.submit(lambda: ({}, 200))
+    assert manager.stats()["pending"] == 2
+    release.set()
+    for job_id in job_ids:
+        wait_for(manager, job_id)
+    assert manager.stats()["pending"] == 0
+    manager.submit(lambda: ({}, 200))
+
+
+def test_finished_jobs_expire():
+    manager = JobManager(max_workers=1, ttl_seconds=0.05)
+    job_id = manager.submit(lambda: ({}, 200))
+    wait_for(manager, job_id)
+    time.sleep(0.06)
+    assert manager.get(job_id) is None and manager.get("unknown") is None
+
+
+def test_store_shares_jobs_between_managers(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    worker_a = JobManager(max_workers=1, store=SqliteJobStore(path))
+    worker_b = JobManager(max_workers=1, store=SqliteJobStore(path))
+    job_id = worker_a.submit(lambda: ({"best_plan_id": "A-01"}, 200))
+    wait_for(worker_a, job_id)
+    job = worker_b.get(job_id)
+    assert job["status"] == "done" and job["result"] == {"best_plan_id": "A-01"}
+    assert worker_b.get("unknown") is None
+
+
+def test_store_expires_jobs(tmp_path):
+    store = SqliteJobStore(str(tmp_path / "jobs.db"))
+    store.put({"jobId": "old", "status": "done", "finishedAt": time.time() - 60})
+    store.put({"jobId": "queued", "status": "queued", "finishedAt": None})
+    assert JobManager(store=store, ttl_seconds=30).get("old") is None
+    store.delete_finished_before(time.time() - 30)
+    assert store.get("old") is None and store.get("queued")["status"] == "queued"
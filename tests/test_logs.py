@@ -0,0 +1,41 @@
+"""Tests for the structured logging setup (api/logs.py)."""
+import json
+import logging
+
+import pytest
+
+import logs
+
+
+@pytest.fixture
+def fresh_logs(monkeypatch):
+    """Undoes configure() so a test can run it again."""
+    root = logging.getLogger(logs.ROOT_LOGGER)
+    handlers, level = list(root.handlers), root.level
+    monkeypatch.setattr(logs, "_configured", False)
+    yield logs
+    root.handlers, root.level = handlers, level
+
+
+def test_configure_reads_the_dotenv_file(fresh_logs, monkeypatch):
+    # Nothing has loaded .env yet when the first module asks for a logger
+    monkeypatch.delenv("LOG_LEVEL", raising=False)
+    monkeypatch.setattr(logs, "load_dotenv", lambda: monkeypatch.setenv("LOG_LEVEL", "debug"))
+    assert logs.get_logger("test").isEnabledFor(logging.DEBUG)
+    assert logging.getLogger(logs.ROOT_LOGGER).level == logging.DEBUG
+
+
+def test_configure_runs_once(fresh_logs, monkeypatch):
+    monkeypatch.setattr(logs, "load_dotenv", lambda: None)
+    monkeypatch.setenv("LOG_LEVEL", "WARNING")
+    logs.configure()
+    monkeypatch.setenv("LOG_LEVEL", "DEBUG")
+    logs.configure()
+    assert logging.getLogger(logs.ROOT_LOGGER).level == logging.WARNING
+
+
+def test_json_lines_carry_fields():
+    record = logging.LogRecord("plans4you.test", logging.INFO, __file__, 1, "Loaded %s plans.", (3,), None)
+    record.fields = {"state": "TX"}
+    entry = json.loads(logs.JsonFormatter().format(record))
+    assert entry["message"] == "Loaded 3 plans." and entry["state"] == "TX" and entry["level"] == "INFO"
@@ -0,0 +1,45 @@
+"""Tests for the keyset pagination cursors (api/queries.py)."""
+import base64
+
+import pytest
+from bson import ObjectId, json_util
+
+from queries import encode_cursor, decode_cursor, keyset_query, InvalidCursorError
+
+
+def token(payload):
+    return base64.urlsafe_b64encode(json_util.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_round_trip():
+    object_id = ObjectId()
+    assert decode_cursor(encode_cursor({'PlanId': '111TX001-01', '_id': object_id})) == {
+        'p': '111TX001-01', 'i': object_id}
+    assert decode_cursor(encode_cursor({'PlanId': '111TX001-01', '_id': 7})) == {'p': '111TX001-01', 'i': 7}
+    assert keyset_query({'StateCode': 'TX'}, encode_cursor({'PlanId': 'A', '_id': 7})) == {'$and': [
+        {'StateCode': 'TX'},
+        {'$or': [{'PlanId': {'$gt': 'A'}}, {'PlanId': 'A', '_id': {'$gt': 7}}]},
+    ]}
+
+
+@pytest.mark.parametrize("cursor", [
+    token({'i': 5}),
+    token({'p': 'A'}),
+    token({'p': None, 'i': 5}),
+    token({'p': 5, 'i': 5}),
+    token({'p': 'A', 'i': '5'}),
+    token({'p': 'A', 'i': True}),
+    token({'p': 'A', 'i': {'$gt': ''}}),
+    token(['A', 5]),
+    'not base64!',
+    base64.urlsafe_b64encode(b'{not json').decode('ascii'),
+])
+def test_crafted_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        keyset_query({}, cursor)
+
+
+def test_crafted_cursor_is_a_bad_request(index_module):
+    response = index_module.app.test_client().get(
+        '/api/benefits_and_cost_sharing', query_string={'state': 'TX', 'cursor': token({'i': 5})})
+    assert response.status_code == 400 and 'cursor' in response.get_json()['error']
@@ -0,0 +1,84 @@
+"""Tests for the deterministic pre-ranker (api/ranker.py)."""
+import numpy as np
+
+from ranker import PlanSet, PlanMatrix, score_plans, top_k_plans, local_recommendation
+from plan_cache import PlanCache
+
+
+def benefit(name, copay="", coins="", covered="Covered", limit=""):
+    return {"BenefitName": name, "CopayInnTier1": copay, "CoinsInnTier1": coins, "IsCovered": covered,
+            "LimitQty": limit}
+
+
+PLANS = [
+    {"PlanId": "C-01", "benefits": [benefit("Primary Care Visit", "$50.00"),
+                                    benefit("Specialist Visit", "$80.00 Copay after deductible")]},
+    {"PlanId": "A-01", "benefits": [benefit("Primary Care Visit", "$10.00"),
+                                    benefit("Specialist Visit", coins="20.00%")]},
+    {"PlanId": "B-01", "benefits": [benefit("Primary Care Visit", "No Charge"),
+                                    benefit("Specialist Visit", covered="Not Covered")]},
+    {"PlanId": "D-01", "benefits": [benefit("Primary Care Visit", "$10.00"),
+                                    benefit("Specialist Visit", coins="20.00%"),
+                                    benefit("Routine Dental Services (Adult)", "$5.00", limit="2")]},
+]
+PROFILE = {"age": "30-39", "dependents": "0", "dentalPlanRequired": "no"}
+
+
+def test_scores():
+    scores, coverage = score_plans(PROFILE, PLANS)
+    # Weights: primary care 1, specialist 1, adult dental 0.25 (not wanted)
+    expected_cost = np.array([
+        [50, 80 + 75, 500],
+        [10, 0.2 * 200, 500],
+        [0, 500, 500],
+        [10, 0.2 * 200, 5 + 10],
+    ])
+    np.testing.assert_allclose(scores, expected_cost @ [1, 1, 0.25] / 2.25)
+    np.testing.assert_allclose(coverage, [2 / 3, 2 / 3, 1 / 3, 1])
+
+
+def test_top_k_is_best_first_with_plan_id_ties():
+    assert [plan["PlanId"] for plan in top_k_plans(PROFILE, PLANS, 3)] == ["D-01", "A-01", "C-01"]
+    tied = [dict(plan, PlanId=plan_id) for plan_id, plan in (("Z-01", PLANS[1]), ("Y-01", PLANS[1]))]
+    assert [plan["PlanId"] for plan in top_k_plans(PROFILE, tied)] == ["Y-01", "Z-01"]
+
+
+def test_plan_set_reuses_its_matrix(monkeypatch):
+    plan_set = PlanSet(PLANS)
+    assert plan_set == PLANS and isinstance(plan_set.matrix, PlanMatrix)
+
+    def fail(plans):
+        raise AssertionError("PlanMatrix rebuilt for a PlanSet")
+    monkeypatch.setattr("ranker.PlanMatrix", fail)
+    for profile in (PROFILE, dict(PROFILE, dentalPlanRequired="yes"), dict(PROFILE, age="60-69")):
+        assert top_k_plans(profile, plan_set, 4)
+    assert local_recommendation(PROFILE, plan_set)["best_plan_id"] == "D-01"
+
+
+def test_plan_set_matches_a_fresh_ranking():
+    plan_set = PlanSet(PLANS)
+    for profile in (PROFILE, dict(PROFILE, dentalPlanRequired="yes"), dict(PROFILE, age="60-69", dependents="3")):
+        assert top_k_plans(profile, plan_set, 4) == top_k_plans(profile, list(PLANS), 4)
+        np.testing.assert_allclose(score_plans(profile, plan_set)[0], score_plans(profile, list(PLANS))[0])
+
+
+def test_plan_cache_keeps_the_plan_set():
+    cache = PlanCache()
+    loads = []
+    load = lambda: loads.append(1) or PlanSet(PLANS)
+    first = cache.get_or_load(("plans", "TX", "all"), load)
+    assert cache.get_or_load(("plans", "TX", "all"), load) is first and len(loads) == 1
+    # The matrices count towards the memory budget
+    assert cache.stats()["bytes"] > first.matrix.nbytes
+
+
+def test_fetch_plans_returns_a_cached_plan_set(index_module):
+    form = {"state": "TX", "dentalPlanRequired": "no"}
+    plans = index_module.fetch_plans(form)
+    assert isinstance(plans, PlanSet) and index_module.fetch_plans(form) is plans
+    assert [plan["PlanId"] for plan in plans] == ["111TX001-01", "111TX001-02", "333TX002-01"]
+
+
+def test_empty():
+    assert top_k_plans(PROFILE, []) == []
+    assert "error" in local_recommendation(PROFILE, PlanSet([]))
@@ -0,0 +1,97 @@
+"""Tests for the batch LLM rate limiter (api/rate_limit.py) and run_batch under a quota storm."""
+import time
+
+import pytest
+
+from fake_llm import FakeGeminiModel
+from rate_limit import RateLimiter, call_with_rate_limit
+from resilience import ResilientCaller, CircuitBreaker
+
+QUOTA_MESSAGE = "429 Resource has been exhausted (e.g. check quota)."
+
+
+class Upstream:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def unlimited():
+    return RateLimiter(requests_per_minute=60_000_000)
+
+
+def test_quota_errors_are_retried():
+    upstream = Upstream(RuntimeError(QUOTA_MESSAGE), RuntimeError(QUOTA_MESSAGE))
+    assert call_with_rate_limit(upstream, unlimited(), max_retries=3, backoff_seconds=0.001) == "ok"
+    assert upstream.calls == 3
+
+
+def test_quota_error_is_raised_after_max_retries():
+    upstream = Upstream(*[RuntimeError(QUOTA_MESSAGE)] * 5)
+    with pytest.raises(RuntimeError, match="429"):
+        call_with_rate_limit(upstream, unlimited(), max_retries=2, backoff_seconds=0.001)
+    assert upstream.calls == 3
+
+
+@pytest.mark.parametrize("message", [
+    "503 Service Unavailable",
+    "400 Invalid argument: request id 429-1f2e",
+    "Prompt of 4290 tokens is too long",
+])
+def test_other_errors_are_not_retried(message):
+    upstream = Upstream(RuntimeError(message))
+    with pytest.raises(RuntimeError):
+        call_with_rate_limit(upstream, unlimited(), max_retries=3, backoff_seconds=0.001)
+    assert upstream.calls == 1
+
+
+def test_limiter_paces_calls_after_the_burst():
+    limiter = RateLimiter(requests_per_minute=1200, burst=2)  # one token per 50 ms
+    started = time.monotonic()
+    for _ in range(4):
+        limiter.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+PROFILES = [
+    {"name": f"user {i}", "age": 20 + 10 * (i % 6), "income": 30000 + 20000 * (i // 6), "state": "TX",
+     "dentalPlanRequired": "no", "consentGiven": True}
+    for i in range(12)
+]
+
+
+@pytest.fixture
+def quota_storm(index_module, monkeypatch):
+    import agent
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0, error_rate=1.0, error_message=QUOTA_MESSAGE)
+    monkeypatch.setattr(agent, "GEMINI_MODEL", model)
+    monkeypatch.setattr(agent, "llm_caller", ResilientCaller(
+        backoff_seconds=0.001, breaker=CircuitBreaker(failure_threshold=5, reset_seconds=60)))
+    monkeypatch.setattr(index_module, "llm_rate_limiter", unlimited())
+    monkeypatch.setattr(index_module, "LLM_RATE_LIMIT_MAX_RETRIES", 2)
+    monkeypatch.setattr(index_module, "LLM_RATE_LIMIT_BACKOFF_SECONDS", 0.001)
+    return model
+
+
+def test_batch_quota_storm_backs_off_without_opening_the_breaker(index_module, quota_storm):
+    import agent
+    payload, status = index_module.run_batch(PROFILES)
+    assert status == 200
+    assert payload["summary"] == {"total": 12, "succeeded": 0, "degraded": 12, "failed": 0}
+    assert {result["analysis"]["fallback_reason"] for result in payload["results"]} == {"rate_limited"}
+    # Every profile's call went through the rate limiter's back-off (1 + 2 retries), and only there
+    assert quota_storm.calls == 12 * 3
+    assert agent.llm_caller.breaker.state == CircuitBreaker.CLOSED and agent.llm_caller.retries == 0
+
+    # Once the quota is back, the same batch succeeds (fallbacks are never cached)
+    quota_storm.error_rate = 0.0
+    payload, _ = index_module.run_batch(PROFILES)
+    assert payload["status"] == "success" and payload["summary"]["succeeded"] == 12
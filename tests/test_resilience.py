@@ -0,0 +1,182 @@
+"""Tests for the LLM call resilience layer (api/resilience.py), driven by bench/fake_llm.py."""
+import time
+
+import pytest
+
+from fake_llm import FakeGeminiModel
+from resilience import (
+    ResilientCaller, CircuitBreaker, CircuitOpenError, LLMTimeoutError, is_retryable_error, is_quota_error,
+)
+
+QUOTA_MESSAGE = "429 Resource has been exhausted (e.g. check quota)."
+
+
+class ResourceExhausted(Exception):
+    """Stands in for google.api_core.exceptions.ResourceExhausted, matched by name."""
+
+
+class CodedError(Exception):
+    def __init__(self, code):
+        super().__init__(f"upstream error {code}")
+        self.code = code
+
+
+@pytest.mark.parametrize("error, retryable", [
+    (RuntimeError("503 Service Unavailable"), True),
+    (RuntimeError("500 Internal error encountered."), True),
+    (RuntimeError(QUOTA_MESSAGE), True),
+    (RuntimeError("Upstream returned status code 502"), True),
+    (RuntimeError("HTTP 504 from proxy"), True),
+    (RuntimeError("The read operation timed out"), True),
+    (LLMTimeoutError("No LLM response within 30.0s."), True),
+    (ConnectionResetError("Connection reset by peer"), True),
+    (ResourceExhausted("quota"), True),
+    (CodedError(503), True),
+    (CodedError(400), False),
+    (RuntimeError("400 Request payload size exceeds the limit: 1500 tokens, code 503"), False),
+    (RuntimeError("400 Invalid argument: prompt has 1500 tokens"), False),
+    (RuntimeError("Request 5029 failed validation"), False),
+    (RuntimeError("Prompt of 4290 tokens is too long"), False),
+    (ValueError("Invalid JSON"), False),
+    (CircuitOpenError("LLM circuit breaker is open."), False),
+])
+def test_is_retryable_error(error, retryable):
+    assert is_retryable_error(error) is retryable
+
+
+@pytest.mark.parametrize("error, quota", [
+    (RuntimeError(QUOTA_MESSAGE), True),
+    (RuntimeError("status code 429"), True),
+    (ResourceExhausted("anything"), True),
+    (CodedError(429), True),
+    (RuntimeError("Resource has been exhausted"), True),
+    (RuntimeError("503 Service Unavailable"), False),
+    (RuntimeError("Request id 429-abc failed"), False),
+    (RuntimeError("Prompt of 4290 tokens is too long"), False),
+    (CodedError(503), False),
+])
+def test_is_quota_error(error, quota):
+    assert is_quota_error(error) is quota
+
+
+def caller(**kwargs):
+    options = dict(deadline_seconds=5, max_retries=2, backoff_seconds=0.001,
+                   breaker=CircuitBreaker(failure_threshold=3, reset_seconds=0.05))
+    options.update(kwargs)
+    return ResilientCaller(**options)
+
+
+def test_success_needs_one_call():
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0)
+    llm = caller()
+    assert "ranked_plans" in llm.call(lambda: model.generate_content("PLAN A-01")).text
+    assert model.calls == 1 and llm.retries == 0
+
+
+def test_retryable_errors_are_retried_then_raised():
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0, error_rate=1.0)
+    llm = caller(max_retries=2)
+    with pytest.raises(RuntimeError, match="503"):
+        llm.call(lambda: model.generate_content("PLAN A-01"))
+    assert model.calls == 3 and llm.retries == 2
+    # One failed call is one breaker failure, however many attempts it took
+    assert llm.breaker.failures == 1
+
+
+def test_non_retryable_errors_are_not_retried():
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0, error_rate=1.0, error_message="400 Invalid argument")
+    llm = caller()
+    with pytest.raises(RuntimeError, match="400"):
+        llm.call(lambda: model.generate_content("PLAN A-01"))
+    assert model.calls == 1 and llm.breaker.failures == 0
+
+
+def test_quota_errors_skip_retries_and_the_breaker():
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0, error_rate=1.0, error_message=QUOTA_MESSAGE)
+    llm = caller(breaker=CircuitBreaker(failure_threshold=2, reset_seconds=60))
+    for _ in range(10):
+        with pytest.raises(RuntimeError, match="429"):
+            llm.call(lambda: model.generate_content("PLAN A-01"))
+    assert model.calls == 10 and llm.retries == 0
+    assert llm.breaker.state == CircuitBreaker.CLOSED and llm.breaker.failures == 0
+
+
+def test_breaker_opens_and_half_opens():
+    model = FakeGeminiModel(latency_ms=0, jitter_ms=0, error_rate=1.0)
+    llm = caller(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_seconds=0.05))
+    call = lambda: llm.call(lambda: model.generate_content("PLAN A-01"))
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            call()
+    assert llm.breaker.state == CircuitBreaker.OPEN
+
+    # While open, the upstream is not called
+    with pytest.raises(CircuitOpenError):
+        call()
+    assert model.calls == 2
+
+    # After reset_seconds one trial goes through; a failure re-opens at once
+    time.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        call()
+    assert model.calls == 3 and llm.breaker.state == CircuitBreaker.OPEN and llm.breaker.opened == 2
+
+    # A successful trial closes it
+    time.sleep(0.06)
+    model.error_rate = 0.0
+    call()
+    assert llm.breaker.state == CircuitBreaker.CLOSED and llm.breaker.failures == 0
+
+
+def test_slow_request_is_hedged():
+    fast = FakeGeminiModel(latency_ms=10, jitter_ms=0)
+    slow = FakeGeminiModel(latency_ms=10, jitter_ms=0, slow_rate=1.0, slow_latency_ms=2000)
+    llm = caller(hedge_percentile=50, hedge_min_samples=3)
+    for _ in range(3):
+        llm.call(lambda: fast.generate_content("PLAN A-01"))
+
+    # The first attempt is slow; the hedge, sent after ~p50 (10 ms), answers first
+    models = iter([slow, fast])
+    started = time.monotonic()
+    llm.call(lambda: next(models).generate_content("PLAN A-01"))
+    assert time.monotonic() - started < 1.0
+    assert llm.hedges == 1 and slow.calls == 1 and fast.calls == 4
+
+
+def test_deadline():
+    slow = FakeGeminiModel(latency_ms=500, jitter_ms=0)
+    llm = caller(deadline_seconds=0.05)
+    with pytest.raises(LLMTimeoutError):
+        llm.call(lambda: slow.generate_content("PLAN A-01"))
+
+
+PLANS = [{"PlanId": "11111TX0000001-01", "IssuerId": "11111", "StandardComponentId": "11111TX0000001",
+          "benefits": [{"BenefitName": "Primary Care Visit", "CopayInnTier1": "$25.00", "IsCovered": "Covered"}]}]
+PROFILE = {"age": "30-39", "income": "$40,000-$49,999", "state": "TX", "dentalPlanRequired": "no"}
+
+
+@pytest.fixture
+def agent_module(monkeypatch):
+    import agent
+    monkeypatch.setattr(agent, "GEMINI_MODEL", FakeGeminiModel(latency_ms=0, jitter_ms=0))
+    monkeypatch.setattr(agent, "llm_caller", caller(breaker=CircuitBreaker(failure_threshold=1, reset_seconds=60)))
+    return agent
+
+
+def test_open_breaker_reaches_callers_that_opt_out_of_the_fallback(agent_module):
+    agent_module.llm_caller.breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        agent_module.decisionAgent(PROFILE, PLANS, fallback_on_error=False)
+    result = agent_module.decisionAgent(PROFILE, PLANS, fallback_on_error=True)
+    assert result["fallback"] and result["fallback_reason"] == "circuit_open"
+    assert agent_module.GEMINI_MODEL.calls == 0
+
+
+def test_quota_errors_do_not_open_the_breaker(agent_module):
+    agent_module.GEMINI_MODEL.error_rate = 1.0
+    agent_module.GEMINI_MODEL.error_message = QUOTA_MESSAGE
+    for _ in range(3):
+        result = agent_module.decisionAgent(PROFILE, PLANS, fallback_on_error=True)
+        assert result["fallback_reason"] == "rate_limited"
+    assert agent_module.llm_caller.breaker.state == CircuitBreaker.CLOSED
+    assert agent_module.GEMINI_MODEL.calls == 3
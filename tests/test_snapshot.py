@@ -0,0 +1,100 @@
+"""
+Parity tests for the snapshot query evaluator (api/snapshot.py).
+
+tests/fixtures/benefits.csv is small enough to derive the MongoDB results by
+hand: rows come back in (PlanId, _id) order, where _id follows the first file
+occurrence of each (PlanId, BenefitName), and a repeated row keeps its last
+values. The file deliberately lists plans out of order, repeats one row and
+has a row without a PlanId, which api/ingest.py skips.
+"""
+import pytest
+
+from datastore import SnapshotDataStore
+from filters import compile_filters
+from queries import keyset_query, encode_cursor
+
+
+@pytest.fixture(scope="module")
+def data_store(snapshot_path):
+    return SnapshotDataStore(snapshot_path)
+
+
+def pages(data_store, args, page_size):
+    """Pages through the rows matching args the way GET /api/benefits_and_cost_sharing does."""
+    query = compile_filters(args)
+    token, result = None, []
+    while True:
+        rows = data_store.find_rows(keyset_query(query, token), page_size + 1)
+        result.append([(row["PlanId"], row["BenefitName"]) for row in rows[:page_size]])
+        if len(rows) <= page_size:
+            return result
+        token = encode_cursor(rows[page_size - 1])
+
+
+def test_state_pages(data_store):
+    assert pages(data_store, {"state": "tx"}, 3) == [
+        [("111TX001-01", "Primary Care Visit"), ("111TX001-01", "Specialist Visit"),
+         ("111TX001-01", "Accidental Dental")],
+        [("111TX001-02", "Specialist Visit"), ("111TX001-02", "Primary Care Visit"),
+         ("333TX002-01", "Routine Dental Services (Adult)")],
+        [("333TX002-01", "Primary Care Visit")],
+    ]
+
+
+def test_pages_across_states_follow_plan_id(data_store):
+    assert pages(data_store, {}, 4) == [
+        [("111TX001-01", "Primary Care Visit"), ("111TX001-01", "Specialist Visit"),
+         ("111TX001-01", "Accidental Dental"), ("111TX001-02", "Specialist Visit")],
+        [("111TX001-02", "Primary Care Visit"), ("222FL001-01", "Primary Care Visit"),
+         ("222FL001-01", "Basic Dental Care - Child"), ("333TX002-01", "Routine Dental Services (Adult)")],
+        [("333TX002-01", "Primary Care Visit")],
+    ]
+
+
+def test_filtered_pages(data_store):
+    assert pages(data_store, {"state": "TX", "maxCopay": "25"}, 2) == [
+        [("111TX001-01", "Primary Care Visit"), ("111TX001-01", "Specialist Visit")],
+        [("333TX002-01", "Routine Dental Services (Adult)")],
+    ]
+    assert pages(data_store, {"issuer": "111,222", "coveredOnly": "1", "minCoinsurance": "10"}, 10) == [
+        [("111TX001-01", "Specialist Visit"), ("111TX001-02", "Specialist Visit"),
+         ("111TX001-02", "Primary Care Visit"), ("222FL001-01", "Basic Dental Care - Child")],
+    ]
+    assert pages(data_store, {"state": "FL", "component": "111"}, 10) == [[]]
+
+
+def test_repeated_row_keeps_last_values(data_store):
+    rows = data_store.find_rows(compile_filters({"state": "TX", "benefit": "Primary Care Visit"}), 10)
+    assert [(row["PlanId"], row["CopayInnTier1"], row["CopayInnTier1Amount"]) for row in rows] == [
+        ("111TX001-01", "$20.00", 20.0),
+        ("111TX001-02", "$35.00", 35.0),
+        ("333TX002-01", "$40.00", 40.0),
+    ]
+
+
+def test_plan_summaries(data_store):
+    query = compile_filters({"state": "TX", "dentalRequired": "yes"})
+    expected = [
+        {
+            "PlanId": "111TX001-01", "IssuerId": "111", "StandardComponentId": "111TX001",
+            "benefits": [{"BenefitName": "Accidental Dental", "CoinsInnTier1": "30.00%",
+                          "IsCovered": "Not Covered", "QuantLimitOnSvc": "No"}],
+        },
+        {
+            "PlanId": "333TX002-01", "IssuerId": "333", "StandardComponentId": "333TX002",
+            "benefits": [{"BenefitName": "Routine Dental Services (Adult)", "CopayInnTier1": "$15.00",
+                          "CoinsInnTier1": "50.00%", "IsCovered": "Covered", "QuantLimitOnSvc": "Yes",
+                          "LimitQty": "2", "LimitUnit": "Visit(s) per Year", "Explanation": "Cleanings only."}],
+        },
+    ]
+    assert data_store.plan_summaries(query, None) == expected
+    assert data_store.plan_summaries(query, 1) == expected[:1]
+
+
+def test_plan_summaries_keep_benefit_order(data_store):
+    summaries = data_store.plan_summaries(compile_filters({"state": "TX"}), None)
+    assert [(plan["PlanId"], [benefit["BenefitName"] for benefit in plan["benefits"]]) for plan in summaries] == [
+        ("111TX001-01", ["Primary Care Visit", "Specialist Visit", "Accidental Dental"]),
+        ("111TX001-02", ["Specialist Visit", "Primary Care Visit"]),
+        ("333TX002-01", ["Routine Dental Services (Adult)", "Primary Care Visit"]),
+    ]
@@ -0,0 +1,59 @@
+"""Tests for the incremental ranked_plans parser (api/stream_parser.py)."""
+import json
+
+import pytest
+
+from stream_parser import RankedPlansStreamParser, clean_model_output
+
+OUTPUT = json.dumps({
+    "best_plan_id": "A-01",
+    "ranked_plans": [
+        {"planId": "A-01", "rank": 1, "justification": "Lowest copays {and} \"braces\" in text ]"},
+        {"planId": "B-01", "rank": 2, "justification": "Covers dental", "tags": ["x", {"y": 1}]},
+    ],
+    "summary": "done",
+}, indent=2)
+
+
+def items(parser, chunks):
+    found = []
+    for chunk in chunks:
+        found.extend(parser.feed(chunk))
+    return found
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 17, len(OUTPUT)])
+def test_items_are_returned_as_they_complete(chunk_size):
+    parser = RankedPlansStreamParser()
+    chunks = ["```json\n"] + [OUTPUT[i:i + chunk_size] for i in range(0, len(OUTPUT), chunk_size)] + ["\n```"]
+    expected = json.loads(OUTPUT)
+    assert items(parser, chunks) == list(enumerate(expected["ranked_plans"]))
+    assert parser.array_closed and parser.result() == expected
+
+
+def test_item_is_returned_by_the_chunk_that_closes_it():
+    parser = RankedPlansStreamParser()
+    assert parser.feed('{"ranked_plans": [{"planId": "A-01", ') == []
+    assert parser.feed('"rank": 1}, {"planId"') == [(0, {"planId": "A-01", "rank": 1})]
+    assert parser.feed(': "B-01"}]') == [(1, {"planId": "B-01"})]
+    # Text after the array is buffered but not scanned
+    assert parser.feed(', "x": [{"planId": "C-01"}]}') == []
+    assert parser.items_found == 2
+
+
+def test_invalid_item_is_returned_as_text():
+    parser = RankedPlansStreamParser()
+    assert parser.feed('{"ranked_plans": [{planId: A-01}]}') == [(0, "{planId: A-01}")]
+    with pytest.raises(json.JSONDecodeError):
+        parser.result()
+
+
+def test_output_without_ranked_plans():
+    parser = RankedPlansStreamParser()
+    assert items(parser, ['{"error": ', '"blocked"}']) == []
+    assert parser.result() == {"error": "blocked"}
+
+
+def test_clean_model_output():
+    assert clean_model_output(' ```json\n{"a": 1}\n``` ') == '{"a": 1}'
+    assert clean_model_output('{"a": 1}') == '{"a": 1}'